@@ -1,6 +1,10 @@
 import argparse
+import subprocess
+import sys
+from collections import defaultdict
 from pathlib import Path
 import PyInstaller.__main__ as pymain
+from rules_artifact import ARTIFACT_NAME, build_artifact
 
 print("BVB Checker Build Script\n" + "="*40)
 
@@ -8,6 +12,30 @@ ROOT = Path(__file__).parent.resolve()
 ENTRYPOINT = ROOT / "bvb_main_app.py"                 # ← Startskript DEINES Repos
 CSV_FILE  = ROOT / "diagnoseliste_extracted.csv"      # ← CSV im Repo-Root
 RUNTIME_HOOK = ROOT / "pyi_runtime_hook_chdir.py"     # ← Pfade im Onefile-Build fixen
+JSON_FILE = ROOT / "rules.json"
+STATIC_DIR = ROOT / "static"                           # ← Oberfläche (index.html, CSS, JS)
+ARTIFACT = ROOT / "build" / ARTIFACT_NAME              # ← vorkompilierte Diagnoseliste (ohne pandas ladbar)
+IMPORT_BUDGET_MS = 1500                                # ← Obergrenze für den Import von bvb_main_app
+FORBIDDEN_AT_STARTUP = ("pandas", "numpy")             # ← dürfen beim Serverstart nicht geladen werden
+
+def import_time_report(module="bvb_main_app", top=15):
+    """Import module in a fresh interpreter with -X importtime; return (total_ms, {package: ms})."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr)
+        raise SystemExit(f"Import von {module} fehlgeschlagen")
+    per_package = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, _, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        per_package[name.split(".")[0]] += int(self_us) / 1000.0
+    total_ms = sum(per_package.values())
+    print(f"Import-Zeit {module}: {total_ms:.0f} ms")
+    for name, ms in sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    return total_ms, dict(per_package)
 
 def main():
     p = argparse.ArgumentParser()
@@ -16,6 +44,9 @@ def main():
     g.add_argument("--onefolder", action="store_true", help="Folder build")
     p.add_argument("--name", default="BVBChecker")
     p.add_argument("--noconsole", action="store_true")
+    p.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                   help=f"Build abbrechen, wenn der Import länger dauert (Standard: {IMPORT_BUDGET_MS} ms)")
+    p.add_argument("--skip-import-check", action="store_true")
     args = p.parse_args()
 
     onefile = True if (args.onefile or not args.onefolder) else False
@@ -30,6 +61,16 @@ def main():
         print("Fehlende Pflichtdateien:\n  - " + "\n  - ".join(missing))
         raise SystemExit(1)
 
+    if not args.skip_import_check:
+        total_ms, per_package = import_time_report()
+        forbidden = [m for m in FORBIDDEN_AT_STARTUP if m in per_package]
+        if forbidden:
+            print(f"Startzeit-Regression: {', '.join(forbidden)} wird beim Start importiert")
+            raise SystemExit(1)
+        if total_ms > args.import_budget_ms:
+            print(f"Startzeit-Regression: {total_ms:.0f} ms > Budget {args.import_budget_ms:.0f} ms")
+            raise SystemExit(1)
+
     py_args = [
         str(ENTRYPOINT),
         f"--name={args.name}",
@@ -39,13 +80,23 @@ def main():
         "--hidden-import=uvicorn",
         "--hidden-import=uvicorn.lifespan.on",
         "--hidden-import=uvicorn.logging",
+        # pandas/numpy braucht nur evaluate_cohort und die Notebooks, nicht der Server
+        "--exclude-module=pandas",
+        "--exclude-module=numpy",
         ("--noconsole" if args.noconsole else "--console"),
     ]
     if onefile:
         py_args.append("--onefile")
+    # Oberfläche; komprimiert wird beim Start (bvb_static), nicht hier
+    py_args.append(f"--add-data={STATIC_DIR};static")
     if CSV_FILE.exists():
         # CSV neben die EXE legen
         py_args.append(f"--add-data={CSV_FILE};.")
+        # Binärartefakt nach data/, wo load_rules es vor der CSV sucht
+        ARTIFACT.parent.mkdir(parents=True, exist_ok=True)
+        summary = build_artifact(str(CSV_FILE), str(ARTIFACT), str(JSON_FILE) if JSON_FILE.exists() else None)
+        print(f"Regelartefakt: {ARTIFACT} ({summary['rules']} Regeln, {summary['bytes']} Bytes)")
+        py_args.append(f"--add-data={ARTIFACT};data")
 
     print("PyInstaller args:")
     for a in py_args:
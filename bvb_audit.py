@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Prüfprotokoll
+Hält fest, was /check geantwortet hat und gegen welche Listenversion
+(source_version), etwa für Rückfragen der Krankenkasse. Der Request-Pfad
+legt nur einen Eintrag in eine begrenzte Warteschlange; ein Hintergrund-
+Thread schreibt gesammelt in eine lokale SQLite-Datenbank (WAL). Ist die
+Warteschlange voll, wird der Eintrag verworfen und gezählt statt die
+Antwort zu verzögern. Beim Beenden wird der Rest geschrieben.
+
+Gespeichert werden nur ICDs, Datumsangaben und Ergebnis – keine Namen
+oder Patienten-IDs. Das Protokoll ist aus, solange AUDIT_DB nicht gesetzt ist.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Anzahl Einträge je Transaktion bzw. höchstens so lange bleibt ein Eintrag ungeschrieben
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+DB_NAME = "bvb_audit.sqlite3"
+
+def default_db_path(app_name: str = "BVBChecker") -> str:
+    """Persistent location: next to the EXE when frozen, otherwise the user's data directory."""
+    if getattr(sys, "frozen", False):
+        # Nicht ins Arbeitsverzeichnis: der Runtime-Hook wechselt nach _MEIPASS, das beim Beenden gelöscht wird
+        return os.path.join(os.path.dirname(os.path.abspath(sys.executable)), DB_NAME)
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        return os.path.join(base, app_name, DB_NAME)
+    base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, app_name.lower(), DB_NAME)
+
+def resolve_db_path(value: Optional[str]) -> str:
+    """AUDIT_DB setting -> absolute path; unset or empty = off (""), "default" = default_db_path()."""
+    if not value:
+        return ""
+    if value == "default":
+        return default_db_path()
+    value = os.path.expanduser(value)
+    if not os.path.isabs(value):
+        # Relativ zur EXE bzw. zum Startverzeichnis, nie zu _MEIPASS
+        base = os.path.dirname(os.path.abspath(sys.executable)) if getattr(sys, "frozen", False) else os.getcwd()
+        value = os.path.join(base, value)
+    return os.path.abspath(value)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    mode TEXT NOT NULL,
+    icds TEXT NOT NULL,
+    acute_event_date TEXT,
+    as_of TEXT,
+    source_version TEXT NOT NULL,
+    eligible INTEGER NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checks_ts ON checks (ts);
+CREATE TABLE IF NOT EXISTS check_icds (
+    check_id INTEGER NOT NULL REFERENCES checks (id),
+    icd TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS check_icds_icd_ts ON check_icds (icd, ts);
+"""
+
+class AuditLog:
+    """Write-behind log of /check answers in SQLite.
+
+    record() only enqueues (never blocks); a daemon thread inserts in
+    batches. flush() waits until everything enqueued so far is on disk,
+    stop() flushes and ends the writer.
+    """
+
+    def __init__(self, path: str, maxsize: int = 10000, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+
+    # ----------------- Writer -----------------
+
+    def _connect(self):
+        # sqlite3 wird erst geladen, wenn das Protokoll aktiv ist (AUDIT_DB)
+        import sqlite3
+        conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: nach Absturz höchstens die letzten Transaktionen weg, nie eine kaputte Datei
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self) -> None:
+        """Create the database if needed and start the writer thread (after fork, once per process)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, markers = [], []
+            item = first
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(conn, batch)
+            for marker in markers:
+                marker.set()
+        conn.close()
+
+    def _write(self, conn, batch: List[Tuple[float, str, Dict[str, Any]]]) -> None:
+        import sqlite3
+        rows, icd_rows = [], []
+        for ts, mode, entry in batch:
+            rows.append((ts, mode, " ".join(entry["icds"]), entry.get("acute_event_date"), entry.get("as_of"),
+                         entry["source_version"], int(entry["eligible"]),
+                         json.dumps(entry["response"], ensure_ascii=False, separators=(",", ":"), default=str)))
+        try:
+            with conn:
+                cur = conn.cursor()
+                for row, (ts, _, entry) in zip(rows, batch):
+                    cur.execute("INSERT INTO checks (ts, mode, icds, acute_event_date, as_of, source_version, "
+                                "eligible, response) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+                    check_id = cur.lastrowid
+                    icd_rows.extend((check_id, icd, ts) for icd in entry["icds"])
+                cur.executemany("INSERT INTO check_icds (check_id, icd, ts) VALUES (?, ?, ?)", icd_rows)
+        except sqlite3.Error as e:
+            self.errors += len(batch)
+            print(f"⚠️ Prüfprotokoll: {len(batch)} Einträge nicht geschrieben: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    # ----------------- Request path -----------------
+
+    def record(self, mode: str, icds: List[str], source_version: str, eligible: bool, response: Dict[str, Any],
+               acute_event_date: Optional[date] = None, as_of: Optional[date] = None) -> bool:
+        """Enqueue one answer; False (and counted) if the log is off or the queue is full."""
+        if self._thread is None:
+            return False
+        entry = {
+            "icds": icds,
+            "source_version": source_version,
+            "eligible": eligible,
+            # Wird erst im Writer serialisiert; response darf danach nicht mehr verändert werden
+            "response": response,
+            "acute_event_date": acute_event_date.isoformat() if acute_event_date else None,
+            "as_of": as_of.isoformat() if as_of else None,
+        }
+        try:
+            self._queue.put_nowait((time.time(), mode, entry))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything enqueued so far is written."""
+        if not self.running:
+            return False
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write what is left and end the writer thread."""
+        if not self.running:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("⚠️ Prüfprotokoll: Warteschlange voll beim Beenden")
+            return
+        self._thread.join(timeout)
+        pending = self._queue.qsize()
+        if pending:
+            print(f"⚠️ Prüfprotokoll: {pending} Einträge beim Beenden nicht geschrieben")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.running,
+            "path": self.path,
+            "pending": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    # ----------------- Query -----------------
+
+    def query(self, start: Optional[date] = None, end: Optional[date] = None, icd: Optional[str] = None,
+              limit: int = 100, before: Optional[Tuple[float, int]] = None
+              ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, int]]]:
+        """Entries from start to end (local dates, inclusive), optionally with icd; newest first.
+
+        Returns the records and the (ts, id) cursor for the next page (None on the last page).
+        """
+        where, params = [], []
+        column = "i.ts" if icd else "c.ts"
+        if start is not None:
+            where.append(f"{column} >= ?")
+            params.append(_day_start(start))
+        if end is not None:
+            where.append(f"{column} < ?")
+            params.append(_day_start(end + timedelta(days=1)))
+        if before is not None:
+            # Sortierung und Cursor über (ts, id): mehrere Worker schreiben verzahnt, id allein ist nicht zeitlich geordnet
+            where.append(f"({column}, c.id) < (?, ?)")
+            params.extend(before)
+        if icd:
+            # Über den Index (icd, ts); ein Code kommt je Prüfung nur einmal vor
+            sql = "SELECT c.* FROM check_icds i JOIN checks c ON c.id = i.check_id WHERE i.icd = ?"
+            params.insert(0, icd)
+            if where:
+                sql += " AND " + " AND ".join(where)
+        else:
+            sql = "SELECT c.* FROM checks c" + (" WHERE " + " AND ".join(where) if where else "")
+        sql += " ORDER BY c.ts DESC, c.id DESC LIMIT ?"
+        params.append(limit)
+        import sqlite3
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10.0)
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        cursor = (rows[-1]["ts"], rows[-1]["id"]) if len(rows) == limit else None
+        return [{
+            "id": row["id"],
+            "ts": datetime.fromtimestamp(row["ts"]).astimezone().isoformat(timespec="milliseconds"),
+            "mode": row["mode"],
+            "icds": row["icds"].split(),
+            "acute_event_date": row["acute_event_date"],
+            "as_of": row["as_of"],
+            "source_version": row["source_version"],
+            "eligible": bool(row["eligible"]),
+            "response": json.loads(row["response"]),
+        } for row in rows], cursor
+
+def format_cursor(cursor: Optional[Tuple[float, int]]) -> Optional[str]:
+    # repr: ts kommt unverändert (bitgenau) zurück
+    return None if cursor is None else f"{cursor[0]!r}:{cursor[1]}"
+
+def parse_cursor(text: str) -> Tuple[float, int]:
+    ts, sep, check_id = text.partition(":")
+    if not sep:
+        raise ValueError(f"Ungültiger Cursor: {text}")
+    return float(ts), int(check_id)
+
+def _day_start(day: date) -> float:
+    # Lokale Mitternacht: "Juli" heißt für die Praxis Ortszeit
+    return datetime(day.year, day.month, day.day).timestamp()
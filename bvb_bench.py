@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Benchmarks
+Synthetische Kohorten aus der Diagnoseliste und Durchsatzmessungen.
+
+Aufruf:
+    python bvb_bench.py parallel --patients 500000 --workers 1 2 4 8 16
+    python bvb_bench.py check-rule
+    python bvb_bench.py memory --results 1000000
+    python bvb_bench.py cohort --patients 1000000
+    python bvb_bench.py normalize --tokens 500
+    python bvb_bench.py load --url http://127.0.0.1:8000 --connections 16 --seconds 20
+    python bvb_bench.py suite -o bench_results.json --baseline bench_baseline.json
+"""
+
+import argparse
+import contextlib
+import csv
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import bvb_bulk
+from rule_engine import (
+    IcdIndex, PatientContext, RuleRow, check_compiled, check_rule, compile_rule, evaluate_cohort, evaluate_patient,
+    icd_neighbors, normalize_icds, parse_icds,
+)
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagnoseliste_extracted.csv")
+
+# ----------------- Synthetic data -----------------
+
+def listed_icds(csv_path: str = DEFAULT_CSV) -> List[str]:
+    with open(csv_path, encoding="utf-8") as f:
+        return [row["icd"].strip().upper() for row in csv.DictReader(f) if row.get("icd")]
+
+# Anzahl ICDs pro Patient (1..8) – Häufigkeiten wie in einem typischen Praxisquartal
+ICD_COUNT_WEIGHTS = (35, 30, 18, 9, 4, 2, 1, 1)
+# Häufige Praxisdiagnosen, die nicht in der Diagnoseliste stehen
+UNLISTED_ICDS = ["M54.5", "J06.9", "I10.90", "E11.90", "Z00.0", "K21.9", "M54.16", "F32.9", "E78.0", "M17.1"]
+# Fester Stichtag, damit Kohorten und Ergebnisse reproduzierbar sind
+REFERENCE_DATE = date(2025, 10, 1)
+
+def synthetic_patients(n: int, csv_path: str = DEFAULT_CSV, seed: int = 42, hit_ratio: float = 0.7,
+                       today: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+    """n synthetic patients: 1-8 ICDs (mostly 1-3), hit_ratio listed codes, 60% with an acute date.
+
+    Acute events are skewed towards the recent past (exponential, mean ~6 months,
+    capped at 3 years), so both sides of the usual 12-month windows occur.
+    """
+    rng = random.Random(seed)
+    codes = listed_icds(csv_path)
+    today = today or date.today()
+    counts = range(1, len(ICD_COUNT_WEIGHTS) + 1)
+    for i in range(n):
+        k = rng.choices(counts, ICD_COUNT_WEIGHTS)[0]
+        icds = [rng.choice(codes) if rng.random() < hit_ratio else rng.choice(UNLISTED_ICDS) for _ in range(k)]
+        row = {"patient_id": f"P{i:07d}", "icds": ", ".join(icds)}
+        if rng.random() < 0.6:
+            days = min(int(rng.expovariate(1 / 180)), 3 * 365)
+            row["acute_event_date"] = (today - timedelta(days=days)).isoformat()
+        yield row
+
+def write_cohort(path: str, n: int, csv_path: str = DEFAULT_CSV, seed: int = 42) -> None:
+    """Write n synthetic patients as NDJSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        for row in synthetic_patients(n, csv_path, seed):
+            f.write(json.dumps(row) + "\n")
+
+def load_index(rules_path: Optional[str] = None) -> IcdIndex:
+    from bvb_main_app import load_rules
+    with contextlib.redirect_stdout(io.StringIO()):
+        return load_rules(rules_path or DEFAULT_CSV)
+
+# ----------------- Benchmarks -----------------
+
+def bench_parallel(patients: int, workers: List[int], chunk_size: int, rules_path: Optional[str]) -> None:
+    """Throughput of bvb_bulk for each worker count (output goes to /dev/null)."""
+    # Ein Pfad für beide Zweige: die Worker sollen dieselbe Liste laden wie der Lauf mit n=1
+    rules_path = rules_path or DEFAULT_CSV
+    print(f"CPU-Kerne: {os.cpu_count()}, Patienten: {patients:,}, Chunk: {chunk_size}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cohort = os.path.join(tmp, "cohort.ndjson")
+        write_cohort(cohort, patients)
+        baseline = None
+        print(f"{'workers':>8} {'sekunden':>10} {'patienten/s':>12} {'speedup':>8}")
+        for n in workers:
+            with open(cohort, encoding="utf-8") as inp, open(os.devnull, "w", encoding="utf-8") as out:
+                started = time.perf_counter()
+                if n == 1:
+                    bvb_bulk.run_bulk(inp, out, load_index(rules_path), "ndjson", "ndjson")
+                else:
+                    bvb_bulk.run_bulk_parallel(inp, out, rules_path, "ndjson", "ndjson", n, chunk_size=chunk_size)
+                seconds = time.perf_counter() - started
+            rate = patients / seconds
+            baseline = baseline or rate
+            print(f"{n:>8} {seconds:>10.2f} {rate:>12,.0f} {rate / baseline:>7.2f}x")
+
+def bench_check_rule(number: int) -> None:
+    """Per-call cost of check_rule vs. check_compiled on representative rules."""
+    today = date.today()
+    rules = {
+        "einfach": RuleRow("I63.9", "Hirninfarkt, nicht näher bezeichnet", "ZN", "BVB", False, "",
+                           None, "Längstens 1 Jahr nach Akutereignis", "", "2025-07-01"),
+        "zweit-ICD+frist": RuleRow("G81.1", "Spastische Hemiparese", "ZN", "LHB", True, "I69.3",
+                                   12, "", "", "2025-07-01"),
+        "nicht gelistet": RuleRow("C00", "-", "", "NONE", False, "", None, "", "", "2025-07-01"),
+    }
+    ctx = PatientContext(icds=["I63.9", "G81.1"], acute_event_date=today - timedelta(days=90))
+    print(f"{'regel':<16} {'check_rule':>12} {'compiled':>12} {'faktor':>8}")
+    for name, rule in rules.items():
+        compiled = compile_rule(rule)
+        old = min(timeit.repeat(lambda: check_rule(rule, ctx, today), number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: check_compiled(compiled, ctx, today), number=number, repeat=5)) / number
+        print(f"{name:<16} {old * 1e9:>10.0f}ns {new * 1e9:>10.0f}ns {old / new:>7.2f}x")
+
+@dataclass
+class _LegacyResult:
+    """EligibilityResult as it was before slots/bitmask (dict + list per result)."""
+    icd: str
+    eligible: bool
+    kind: Optional[str]
+    conditions_met: Dict[str, bool]
+    missing: List[str]
+    explain: str
+    source_version: str
+
+def _measure_retained(build) -> int:
+    tracemalloc.start()
+    try:
+        keep = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del keep
+    return size
+
+def bench_memory(n_results: int) -> None:
+    """Retained memory of n results, legacy layout vs. slotted results."""
+    today = date.today()
+    rules = IcdIndex({
+        "I63.9": RuleRow("I63.9", "Hirninfarkt", "ZN", "BVB", False, "", None, "", "", "2025-07-01"),
+        "G81.1": RuleRow("G81.1", "Spastische Hemiparese", "ZN", "LHB", True, "I69.3", 12, "", "", "2025-07-01"),
+    })
+    ctxs = [PatientContext(icds=["I63.9", "G81.1", "X99.9"], acute_event_date=today - timedelta(days=30)),
+            PatientContext(icds=["G81.1"])]
+
+    def build_new():
+        out = []
+        while len(out) < n_results:
+            out.extend(evaluate_patient(ctxs[len(out) % 2], rules, today))
+        return out
+
+    def build_legacy():
+        return [_LegacyResult(r.icd, r.eligible, r.kind, r.conditions_met, list(r.missing), r.explain, r.source_version)
+                for r in build_new()]
+
+    new = _measure_retained(build_new)
+    legacy = _measure_retained(build_legacy)
+    per_million = 1_000_000 / n_results
+    print(f"Ergebnisse: {n_results:,}")
+    print(f"  vorher (dict/list): {legacy * per_million / 2**20:8.1f} MiB pro Mio. ({legacy / n_results:.0f} B/Ergebnis)")
+    print(f"  slots/bitmask:      {new * per_million / 2**20:8.1f} MiB pro Mio. ({new / n_results:.0f} B/Ergebnis)")
+    print(f"  Ersparnis:          {(legacy - new) * per_million / 2**20:8.1f} MiB pro Mio. ({1 - new / legacy:.0%})")
+
+def bench_cohort(patients: int, rules_path: Optional[str]) -> None:
+    """evaluate_patient loop vs. evaluate_cohort on the same cohort; checks identical results."""
+    import pandas as pd
+
+    rules = load_index(rules_path)
+    today = date.today()
+    ids, ctxs = [], []
+    for row in synthetic_patients(patients):
+        acute = row.get("acute_event_date")
+        ids.append(row["patient_id"])
+        ctxs.append(PatientContext(normalize_icds(row["icds"]), date.fromisoformat(acute) if acute else None))
+    cohort = pd.DataFrame({
+        "patient_id": [pid for pid, ctx in zip(ids, ctxs) for _ in ctx.icds],
+        "icd": [icd for ctx in ctxs for icd in ctx.icds],
+        "acute_event_date": [ctx.acute_event_date for ctx in ctxs for _ in ctx.icds],
+    })
+
+    started = time.perf_counter()
+    expected = [r for ctx in ctxs for r in evaluate_patient(ctx, rules, today)]
+    loop_s = time.perf_counter() - started
+    started = time.perf_counter()
+    result = evaluate_cohort(cohort, rules, today)
+    vec_s = time.perf_counter() - started
+
+    def na(value):
+        return None if value is pd.NA else bool(value)
+
+    mismatches = 0
+    for r, row in zip(expected, result.itertuples(index=False)):
+        conds = r.conditions_met
+        want = (r.icd, r.eligible, r.kind, conds.get("second_icd_present"), conds.get("acute_window_ok"),
+                r.secondary_icd, r.explain, r.source_version)
+        got = (row.icd, bool(row.eligible), row.kind, na(row.second_icd_present), na(row.acute_window_ok),
+               row.secondary_icd, row.explain, row.source_version)
+        mismatches += want != got
+    print(f"Patienten: {patients:,}, Zeilen: {len(result):,}")
+    print(f"  evaluate_patient-Schleife: {loop_s:8.2f}s")
+    print(f"  evaluate_cohort:           {vec_s:8.2f}s ({loop_s / vec_s:.1f}x)")
+    print(f"  Abweichungen:              {mismatches}")
+
+def _legacy_normalize_icds(s: str) -> List[str]:
+    """normalize_icds before the precompiled tokenizer (pattern parsed per call, no validation)."""
+    toks = re.split(r"[,\s;]+", (s or "").strip())
+    return [t.upper() for t in toks if t]
+
+def synthetic_paste(n_tokens: int, seed: int = 42) -> str:
+    """Free text as pasted from a PVS into the UI textarea: codes with suffixes, repeats and words."""
+    rng = random.Random(seed)
+    codes = listed_icds()
+    words = ["Diagnosen:", "Z.n.", "Hirninfarkt", "li.", "re.", "Verdacht", "-", "(Dauerdiagnose)"]
+    parts = []
+    for _ in range(n_tokens):
+        roll = rng.random()
+        code = rng.choice(codes)
+        if roll < 0.5:
+            parts.append(code + rng.choice(["", "", "G", " G", " V", "GR", " L", " B", "*"]))
+        elif roll < 0.7:
+            parts.append(code.replace(".", "").lower())
+        else:
+            parts.append(rng.choice(words))
+    return rng.choice([", ", "; ", " ", "\n"]).join(parts)
+
+def bench_normalize(n_tokens: int, number: int) -> None:
+    """One long paste: legacy split vs. tokenizer, alone and including the evaluation of the codes."""
+    text = synthetic_paste(n_tokens)
+    rules = load_index()
+    today = date.today()
+    codes, invalid = parse_icds(text)
+    legacy = _legacy_normalize_icds(text)
+
+    def per_call(fn) -> float:
+        return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+    old = per_call(lambda: _legacy_normalize_icds(text))
+    new = per_call(lambda: parse_icds(text))
+    old_total = per_call(lambda: evaluate_patient(PatientContext(_legacy_normalize_icds(text)), rules, today))
+    new_total = per_call(lambda: evaluate_patient(PatientContext(parse_icds(text)[0]), rules, today))
+    print(f"Eingabe: {len(text):,} Zeichen, {n_tokens} Tokens")
+    print(f"{'':<10} {'normalisieren':>14} {'+ prüfen':>12} {'codes':>6} {'ungültig':>9}")
+    print(f"{'vorher':<10} {old * 1e6:>12.1f}µs {old_total * 1e6:>10.1f}µs {len(legacy):>6} {'-':>9}")
+    print(f"{'jetzt':<10} {new * 1e6:>12.1f}µs {new_total * 1e6:>10.1f}µs {len(codes):>6} {len(invalid):>9}")
+    print(f"Gesamt: {old_total / new_total:.2f}x")
+
+def bench_load(url: str, connections: int, seconds: float, patients: int) -> None:
+    """POST /check from several keep-alive connections against a running server; RPS and latency percentiles."""
+    target = urlsplit(url)
+    bodies = [json.dumps({"icds": row["icds"], "acute_event_date": row.get("acute_event_date")}).encode()
+              for row in synthetic_patients(patients)]
+    headers = {"Content-Type": "application/json"}
+    latencies: List[List[float]] = [[] for _ in range(connections)]
+    errors = [0] * connections
+    deadline = time.perf_counter() + seconds
+
+    def client(slot: int) -> None:
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        i = slot
+        while time.perf_counter() < deadline:
+            body = bodies[i % len(bodies)]
+            i += connections
+            started = time.perf_counter()
+            conn.request("POST", "/check", body, headers)
+            response = conn.getresponse()
+            response.read()
+            latencies[slot].append(time.perf_counter() - started)
+            errors[slot] += response.status != 200
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(connections)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    samples = sorted(x for per_conn in latencies for x in per_conn)
+    if not samples:
+        print("Keine Antworten erhalten")
+        return
+
+    def pct(p: float) -> float:
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    print(f"{url}/check, {connections} Verbindungen, {elapsed:.1f}s")
+    print(f"  Anfragen:  {len(samples):,} ({sum(errors)} Fehler)")
+    print(f"  Durchsatz: {len(samples) / elapsed:,.0f} req/s")
+    print(f"  Latenz:    p50 {pct(0.50):.2f}ms, p90 {pct(0.90):.2f}ms, p99 {pct(0.99):.2f}ms")
+
+# ----------------- Suite -----------------
+
+SUITE_VERSION = 1
+# Abweichung (min-Zeit), ab der ein Fall als langsamer gilt
+DEFAULT_THRESHOLD = 0.15
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _time_case(fn: Callable[[], Any], ops: int, repeat: int, number: int = 1) -> Dict[str, Any]:
+    """µs per operation; fn() performs ops operations and runs number times per repetition."""
+    times = [t / (number * ops) * 1e6 for t in timeit.repeat(fn, number=number, repeat=repeat)]
+    return {"unit": "us", "min": round(min(times), 4), "median": round(statistics.median(times), 4), "ops": ops * number}
+
+def _http_check_case(bodies: List[Dict[str, Any]], repeat: int) -> Optional[Dict[str, Any]]:
+    """POST /check through the ASGI app in-process (httpx.ASGITransport), no network involved."""
+    try:
+        import httpx
+    except ImportError:
+        print("⚠️ httpx nicht installiert – /check-Fall übersprungen")
+        return None
+    import asyncio
+    import bvb_main_app
+
+    async def run_once() -> float:
+        bvb_main_app.result_cache.clear()
+        transport = httpx.ASGITransport(app=bvb_main_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            for body in bodies:
+                response = await client.post("/check", json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/check antwortet {response.status_code}: {response.text[:200]}")
+            return time.perf_counter() - started
+
+    times = [asyncio.run(run_once()) / len(bodies) * 1e6 for _ in range(repeat)]
+    return {"unit": "us", "min": round(min(times), 4), "median": round(statistics.median(times), 4), "ops": len(bodies)}
+
+def run_suite(patients: int, repeat: int, seed: int = 42) -> Dict[str, Any]:
+    """Run every case on one synthetic cohort; returns the JSON document (meta + results)."""
+    from bvb_main_app import build_rules
+    from rules_artifact import rules_from_csv
+    from bvb_search import SearchIndex
+    from rule_engine import SuggestIndex
+
+    index = load_index()
+    plain_rules = dict(index.items())
+    rows = list(synthetic_patients(patients, seed=seed, today=REFERENCE_DATE))
+    texts = [row["icds"] for row in rows]
+    ctxs = [PatientContext(normalize_icds(row["icds"]),
+                           date.fromisoformat(row["acute_event_date"]) if row.get("acute_event_date") else None)
+            for row in rows]
+    codes = [icd for ctx in ctxs for icd in ctx.icds]
+    code_list = list(index)
+    today = REFERENCE_DATE
+    rule = index["I63.9"]
+    compiled = compile_rule(rule)
+    sample_ctx = PatientContext(["I63.9", "G81.1"], REFERENCE_DATE - timedelta(days=90))
+    results: Dict[str, Any] = {}
+
+    def case(name: str, fn: Callable[[], Any], ops: int, number: int = 1, quiet: bool = False) -> None:
+        # quiet: Ausgaben von fn (z.B. load_rules) verwerfen
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            results[name] = _time_case(fn, ops, repeat, number)
+        r = results[name]
+        print(f"  {name:<32} {r['min']:>12.3f}µs (Median {r['median']:.3f}µs)")
+
+    print(f"Kohorte: {patients:,} Patienten, {len(codes):,} ICDs, Stichtag {REFERENCE_DATE}")
+    case("check_rule", lambda: check_rule(rule, sample_ctx, today), 1, number=20_000)
+    case("check_compiled", lambda: check_compiled(compiled, sample_ctx, today), 1, number=20_000)
+    case("evaluate_patient.index", lambda: [evaluate_patient(c, index, today) for c in ctxs], len(ctxs))
+    case("evaluate_patient.dict", lambda: [evaluate_patient(c, plain_rules, today) for c in ctxs], len(ctxs))
+    case("normalize_icds", lambda: [normalize_icds(t) for t in texts], len(texts))
+    case("icd_neighbors.index", lambda: [icd_neighbors(c, index) for c in codes], len(codes))
+    case("icd_neighbors.list", lambda: [icd_neighbors(c, code_list) for c in codes[:2000]], min(len(codes), 2000))
+    typos = ["I36.9", "G53", "G81", "I63.99", "M4796", "X99"]
+    # ohne den Merkspeicher von IcdIndex.suggest: Kosten des ersten Auftretens
+    suggester = SuggestIndex(code for code in index if "-" not in code)
+    case("suggest", lambda: [suggester.suggest(c) for c in typos], len(typos), number=200)
+    search = SearchIndex(index)
+    queries = ["h", "hemi", "hemipar", "schlag", "multiple skl", "I63", "parese"]
+    case("search", lambda: [search.search(q, 10) for q in queries], len(queries), number=200)
+    case("rules_from_csv", lambda: rules_from_csv(DEFAULT_CSV), 1, number=20)
+    case("load_rules", lambda: build_rules(DEFAULT_CSV), 1, number=20, quiet=True)
+    bodies = [{"icds": row["icds"], "acute_event_date": row.get("acute_event_date")} for row in rows[:2000]]
+    http = _http_check_case(bodies, repeat)
+    if http is not None:
+        results["http_check"] = http
+        print(f"  {'http_check':<32} {http['min']:>12.3f}µs (Median {http['median']:.3f}µs)")
+
+    return {
+        "suite_version": SUITE_VERSION,
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "patients": patients,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print current vs. baseline (min times) and return the cases that got slower than threshold."""
+    regressions = []
+    base = baseline.get("results", {})
+    print(f"Vergleich mit Baseline {baseline.get('meta', {}).get('git_rev') or '?'} "
+          f"({baseline.get('meta', {}).get('created', '?')}), Schwelle +{threshold:.0%}")
+    print(f"  {'fall':<32} {'baseline':>12} {'aktuell':>12} {'änderung':>9}")
+    for name, result in current["results"].items():
+        if name not in base:
+            print(f"  {name:<32} {'-':>12} {result['min']:>10.3f}µs {'neu':>9}")
+            continue
+        change = result["min"] / base[name]["min"] - 1 if base[name]["min"] else 0.0
+        flag = " ❌" if change > threshold else (" ✅" if change < -threshold else "")
+        print(f"  {name:<32} {base[name]['min']:>10.3f}µs {result['min']:>10.3f}µs {change:>+8.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def bench_suite(patients: int, repeat: int, output: Optional[str], baseline_path: Optional[str],
+                threshold: float) -> int:
+    current = run_suite(patients, repeat)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"💾 Ergebnisse gespeichert: {output}")
+    if not baseline_path:
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"⚠️ Keine Baseline unter {baseline_path} – mit 'make bench-baseline' anlegen")
+        return 0
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("suite_version") != SUITE_VERSION:
+        print("⚠️ Baseline stammt von einer anderen Suite-Version – Vergleich übersprungen")
+        return 0
+    regressions = compare_results(current, baseline, threshold)
+    if regressions:
+        print(f"❌ Langsamer als Baseline: {', '.join(regressions)}")
+        return 1
+    print("✅ Keine Regression")
+    return 0
+
+# ----------------- CLI -----------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmarks für den BVB Checker")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    par = sub.add_parser("parallel", help="Skalierung der Bulk-Prüfung über Worker-Prozesse")
+    par.add_argument("--patients", type=int, default=200_000)
+    par.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    par.add_argument("--chunk-size", type=int, default=5000)
+    par.add_argument("--rules", help="Pfad zur Diagnoseliste (Standard: eingebettete CSV)")
+
+    cr = sub.add_parser("check-rule", help="Kosten pro Aufruf: check_rule vs. vorkompilierte Regeln")
+    cr.add_argument("--number", type=int, default=100_000)
+
+    mem = sub.add_parser("memory", help="Speicherbedarf der Ergebnisobjekte")
+    mem.add_argument("--results", type=int, default=200_000)
+
+    co = sub.add_parser("cohort", help="Vektorisierte Kohortenauswertung vs. Schleife")
+    co.add_argument("--patients", type=int, default=200_000)
+    co.add_argument("--rules", help="Pfad zur Diagnoseliste (Standard: diagnoseliste_extracted.csv)")
+
+    no = sub.add_parser("normalize", help="ICD-Eingabe normalisieren: alter Split vs. Tokenizer")
+    no.add_argument("--tokens", type=int, default=500)
+    no.add_argument("--number", type=int, default=2000)
+
+    lo = sub.add_parser("load", help="Lasttest gegen einen laufenden Server (POST /check)")
+    lo.add_argument("--url", default="http://127.0.0.1:8000")
+    lo.add_argument("--connections", type=int, default=16)
+    lo.add_argument("--seconds", type=float, default=20.0)
+    lo.add_argument("--patients", type=int, default=10_000, help="Anzahl verschiedener Anfragen")
+
+    su = sub.add_parser("suite", help="Reproduzierbare Benchmark-Suite mit JSON-Ergebnis und Baseline-Vergleich")
+    su.add_argument("--patients", type=int, default=5000)
+    su.add_argument("--repeat", type=int, default=5)
+    su.add_argument("-o", "--output", help="Ergebnisse als JSON speichern")
+    su.add_argument("--baseline", help="JSON einer früheren Messung zum Vergleich")
+    su.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Zulässige Verlangsamung je Fall (0.15 = 15%%)")
+
+    args = p.parse_args(argv)
+    if args.cmd == "parallel":
+        bench_parallel(args.patients, args.workers, args.chunk_size, args.rules)
+    elif args.cmd == "check-rule":
+        bench_check_rule(args.number)
+    elif args.cmd == "memory":
+        bench_memory(args.results)
+    elif args.cmd == "cohort":
+        bench_cohort(args.patients, args.rules)
+    elif args.cmd == "normalize":
+        bench_normalize(args.tokens, args.number)
+    elif args.cmd == "load":
+        bench_load(args.url.rstrip("/"), args.connections, args.seconds, args.patients)
+    elif args.cmd == "suite":
+        return bench_suite(args.patients, args.repeat, args.output, args.baseline, args.threshold)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
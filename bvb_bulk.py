@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Bulk-Prüfung
+Streamt NDJSON/CSV-Zeilen (patient_id, icds, acute_event_date) durch
+evaluate_patient und schreibt die Ergebnisse sofort wieder heraus.
+Der Speicherbedarf bleibt dabei unabhängig von der Eingabegröße konstant.
+
+Aufruf:
+    python bvb_bulk.py quartal.ndjson -o ergebnisse.ndjson
+    python bvb_bulk.py quartal.csv -o ergebnisse.csv
+    python bvb_bulk.py jahresaudit.ndjson -o ergebnisse.ndjson --workers 16
+    cat quartal.ndjson | python bvb_bulk.py - --format ndjson > ergebnisse.ndjson
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+import time
+from collections import deque
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from rule_engine import EligibilityResult, PatientContext, RuleRow, evaluate_patient, normalize_icds
+
+FORMATS = ("ndjson", "csv")
+CSV_OUTPUT_FIELDS = ["patient_id", "icd", "eligible", "kind", "missing", "source_version", "secondary_icd",
+                     "suggestions", "explain", "error"]
+
+# (patient_id, PatientContext | None, Fehlermeldung | None)
+ParsedRow = Tuple[Any, Optional[PatientContext], Optional[str]]
+# (patient_id, Ergebnisse, Fehlermeldung | None)
+EvaluatedRow = Tuple[Any, List[EligibilityResult], Optional[str]]
+
+# ----------------- Input -----------------
+
+def guess_format(path: str, default: str = "ndjson") -> str:
+    """Pick the format from the file extension (.csv, .ndjson/.jsonl)."""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return default
+
+def csv_in_quotes(line: str, in_quotes: bool = False) -> bool:
+    """Whether a CSV record is still inside a quoted field after this line (default dialect)."""
+    if '"' not in line:
+        return in_quotes
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if in_quotes:
+            if c == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif c == '"' and field_start:
+            in_quotes = True
+        # Wie csv: nur am Feldanfang öffnet ein Anführungszeichen, sonst ist es Text
+        field_start = not in_quotes and c == ","
+        i += 1
+    return in_quotes
+
+class RowParser:
+    """Turns input lines into row dicts; keeps the CSV header between calls.
+
+    CSV goes through one csv.reader for the whole input. Lines are buffered until the
+    record is complete, so quoted fields may contain newlines.
+    """
+
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unbekanntes Format: {fmt}")
+        self.fmt = fmt
+        self.header: Optional[List[str]] = None
+        self.line_no = 0
+        # Zeile, in der der zuletzt gelesene Datensatz beginnt
+        self.record_line_no = 0
+        self._pending: deque = deque()
+        self._in_quotes = False
+        # Der Reader wird nur angestoßen, wenn ein vollständiger Datensatz gepuffert ist
+        self._reader = csv.reader(iter(self._pending.popleft, None))
+
+    def feed(self, line: str) -> Optional[Dict[str, Any]]:
+        """Parse one line; returns None for blank lines, the CSV header and unfinished records."""
+        self.line_no += 1
+        line = line.rstrip("\r\n")
+        if not self._pending:
+            if not line.strip():
+                return None
+            self.record_line_no = self.line_no
+        if self.fmt == "ndjson":
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Zeile ist kein JSON-Objekt")
+            return row
+        self._pending.append(line + "\n")
+        self._in_quotes = csv_in_quotes(line, self._in_quotes)
+        if self._in_quotes:
+            return None
+        try:
+            values = next(self._reader)
+        finally:
+            self._pending.clear()
+        if self.header is None:
+            self.header = [h.strip() for h in values]
+            return None
+        return dict(zip(self.header, values))
+
+    @property
+    def unfinished(self) -> bool:
+        """True if the input ended inside a quoted CSV field."""
+        return bool(self._pending)
+
+def parse_row(row: Dict[str, Any]) -> PatientContext:
+    """Build a PatientContext from a row dict (ICDs as string or list)."""
+    icds = row.get("icds", "")
+    if isinstance(icds, list):
+        icds = " ".join(str(i) for i in icds)
+    acute_event_date = None
+    if row.get("acute_event_date"):
+        acute_event_date = date.fromisoformat(str(row["acute_event_date"]).strip())
+    return PatientContext(icds=normalize_icds(icds), acute_event_date=acute_event_date)
+
+def read_row(parser: RowParser, line: str) -> Optional[ParsedRow]:
+    """Parse one input line into (patient_id, ctx, error); None if there is nothing to check."""
+    try:
+        row = parser.feed(line)
+        if row is None:
+            return None
+    except (ValueError, csv.Error) as e:
+        return f"line:{parser.record_line_no}", None, f"Zeile {parser.record_line_no}: {e}"
+    patient_id = row.get("patient_id", f"line:{parser.record_line_no}")
+    try:
+        return patient_id, parse_row(row), None
+    except (TypeError, ValueError) as e:
+        return patient_id, None, f"Zeile {parser.record_line_no}: {e}"
+
+def read_tail(parser: RowParser) -> Optional[ParsedRow]:
+    """Error row for a record left open at the end of the input (None if there is none)."""
+    if not parser.unfinished:
+        return None
+    return f"line:{parser.record_line_no}", None, f"Zeile {parser.record_line_no}: Anführungszeichen nicht geschlossen"
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[ParsedRow]:
+    """Lazily parse input lines into (patient_id, ctx, error) tuples."""
+    parser = RowParser(fmt)
+    for line in lines:
+        parsed = read_row(parser, line)
+        if parsed is not None:
+            yield parsed
+    tail = read_tail(parser)
+    if tail is not None:
+        yield tail
+
+# ----------------- Evaluation -----------------
+
+def evaluate_row(parsed: ParsedRow, rules_by_icd: Dict[str, RuleRow], today: date) -> EvaluatedRow:
+    patient_id, ctx, error = parsed
+    if ctx is None:
+        return patient_id, [], error
+    return patient_id, evaluate_patient(ctx, rules_by_icd, today), None
+
+def evaluate_rows(rows: Iterable[ParsedRow], rules_by_icd: Dict[str, RuleRow], today: date) -> Iterator[EvaluatedRow]:
+    """Evaluate each parsed row as it arrives."""
+    for parsed in rows:
+        yield evaluate_row(parsed, rules_by_icd, today)
+
+# ----------------- Output -----------------
+
+def result_dict(r: EligibilityResult) -> Dict[str, Any]:
+    return {
+        "icd": r.icd,
+        "eligible": r.eligible,
+        "kind": r.kind,
+        "explain": r.explain,
+        "conditions_met": r.conditions_met,
+        "missing": r.missing,
+        "source_version": r.source_version,
+        "secondary_icd": r.secondary_icd,
+        "suggestions": r.suggestions,
+    }
+
+class NdjsonWriter:
+    """One JSON line per patient."""
+    media_type = "application/x-ndjson"
+
+    def header(self) -> str:
+        return ""
+
+    def row(self, item: EvaluatedRow) -> str:
+        patient_id, results, error = item
+        record: Dict[str, Any] = {"patient_id": patient_id}
+        if error:
+            record["error"] = error
+        else:
+            record["eligible"] = any(r.eligible for r in results)
+            record["results"] = [result_dict(r) for r in results]
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+class CsvWriter:
+    """One CSV row per (patient, ICD), header first."""
+    media_type = "text/csv"
+
+    def __init__(self):
+        self._buf = io.StringIO()
+        self._writer = csv.DictWriter(self._buf, fieldnames=CSV_OUTPUT_FIELDS)
+
+    def _drain(self) -> str:
+        text = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return text
+
+    def header(self) -> str:
+        self._writer.writeheader()
+        return self._drain()
+
+    def row(self, item: EvaluatedRow) -> str:
+        patient_id, results, error = item
+        if error:
+            self._writer.writerow({"patient_id": patient_id, "error": error})
+        for r in results:
+            self._writer.writerow({
+                "patient_id": patient_id,
+                "icd": r.icd,
+                "eligible": r.eligible,
+                "kind": r.kind or "",
+                "missing": "; ".join(r.missing),
+                "source_version": r.source_version,
+                "secondary_icd": r.secondary_icd or "",
+                "suggestions": " ".join(r.suggestions),
+                "explain": r.explain,
+            })
+        return self._drain()
+
+def make_writer(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+    return NdjsonWriter() if fmt == "ndjson" else CsvWriter()
+
+def format_results(evaluated: Iterable[EvaluatedRow], fmt: str) -> Iterator[str]:
+    writer = make_writer(fmt)
+    yield writer.header()
+    for item in evaluated:
+        yield writer.row(item)
+
+def run_bulk(inp: TextIO, out: TextIO, rules_by_icd: Dict[str, RuleRow], in_fmt: str, out_fmt: str,
+             today: Optional[date] = None) -> Dict[str, Any]:
+    """Stream inp through the pipeline into out; returns simple counters."""
+    stats = {"patients": 0, "errors": 0}
+
+    def counted(evaluated):
+        for item in evaluated:
+            stats["patients"] += 1
+            if item[2]:
+                stats["errors"] += 1
+            yield item
+
+    started = time.perf_counter()
+    evaluated = evaluate_rows(read_rows(inp, in_fmt), rules_by_icd, today or date.today())
+    for chunk in format_results(counted(evaluated), out_fmt):
+        out.write(chunk)
+    out.flush()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+# ----------------- Parallel execution -----------------
+
+# Pro Worker-Prozess einmal geladen (initializer), nicht pro Aufgabe gepickelt
+_worker_rules: Dict[str, RuleRow] = {}
+_worker_today: Optional[date] = None
+
+def _init_worker(rules_path: Optional[str], today: date) -> None:
+    global _worker_rules, _worker_today
+    from bvb_main_app import load_rules
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_rules = load_rules(rules_path)
+    _worker_today = today
+
+def _process_chunk(task: Tuple[str, Optional[List[str]], int, List[str], str]) -> Tuple[str, int, int]:
+    """Parse, evaluate and format one chunk of raw lines inside a worker."""
+    in_fmt, header, first_line_no, lines, out_fmt = task
+    parser = RowParser(in_fmt)
+    parser.header = header
+    parser.line_no = first_line_no
+    writer = make_writer(out_fmt)
+    out: List[str] = []
+    patients = errors = 0
+    parsed_rows = [read_row(parser, line) for line in lines]
+    parsed_rows.append(read_tail(parser))
+    for parsed in parsed_rows:
+        if parsed is None:
+            continue
+        item = evaluate_row(parsed, _worker_rules, _worker_today)
+        patients += 1
+        if item[2]:
+            errors += 1
+        out.append(writer.row(item))
+    return "".join(out), patients, errors
+
+def iter_chunks(lines: Iterable[str], fmt: str, chunk_size: int) -> Iterator[Tuple[Optional[List[str]], int, List[str]]]:
+    """Split input lines into (csv_header, line_no_before_chunk, lines) chunks at record boundaries."""
+    it = iter(lines)
+    header: Optional[List[str]] = None
+    line_no = 0
+    if fmt == "csv":
+        parser = RowParser(fmt)
+        for line in it:
+            parser.feed(line)
+            if parser.header is not None:
+                break
+        header, line_no = parser.header, parser.line_no
+    chunk: List[str] = []
+    in_quotes = False
+    for line in it:
+        chunk.append(line)
+        # Nie mitten in einem mehrzeiligen CSV-Datensatz schneiden
+        if fmt == "csv":
+            in_quotes = csv_in_quotes(line, in_quotes)
+        if len(chunk) >= chunk_size and not in_quotes:
+            yield header, line_no, chunk
+            line_no += len(chunk)
+            chunk = []
+    if chunk:
+        yield header, line_no, chunk
+
+def run_bulk_parallel(inp: TextIO, out: TextIO, rules_path: Optional[str], in_fmt: str, out_fmt: str,
+                      workers: int, chunk_size: int = 5000, today: Optional[date] = None) -> Dict[str, Any]:
+    """Like run_bulk, but chunks are evaluated on a process pool; output keeps input order."""
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    from bvb_main_app import default_csv_path
+
+    # Einmal auflösen: alle Worker laden dieselbe Datei, und ein Fehler kann sie benennen
+    rules_path = rules_path or default_csv_path()
+    stats = {"patients": 0, "errors": 0}
+    # Nur begrenzt viele Chunks gleichzeitig unterwegs, damit der Speicher flach bleibt
+    max_in_flight = workers * 2
+
+    def drain(future):
+        text, patients, errors = future.result()
+        out.write(text)
+        stats["patients"] += patients
+        stats["errors"] += errors
+
+    started = time.perf_counter()
+    out.write(make_writer(out_fmt).header())
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(rules_path, today or date.today())) as pool:
+            pending = deque()
+            for header, line_no, lines in iter_chunks(inp, in_fmt, chunk_size):
+                pending.append(pool.submit(_process_chunk, (in_fmt, header, line_no, lines, out_fmt)))
+                if len(pending) >= max_in_flight:
+                    drain(pending.popleft())
+            while pending:
+                drain(pending.popleft())
+    except BrokenProcessPool as e:
+        # Meist scheitert schon der initializer (Liste fehlt/ungültig); die Ursache steht im Worker-Traceback
+        raise BrokenProcessPool(f"Worker-Prozess abgebrochen, Diagnoseliste: {rules_path}") from e
+    out.flush()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+# ----------------- CLI -----------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="BVB/LHB-Bulk-Prüfung für NDJSON/CSV-Dateien")
+    p.add_argument("input", help="Eingabedatei oder '-' für stdin")
+    p.add_argument("-o", "--output", default="-", help="Ausgabedatei oder '-' für stdout")
+    p.add_argument("--format", choices=FORMATS, help="Eingabeformat (Standard: aus Dateiendung)")
+    p.add_argument("--output-format", choices=FORMATS, help="Ausgabeformat (Standard: wie Eingabe)")
+    p.add_argument("--rules", help="Pfad zur Diagnoseliste (Standard: eingebettete CSV)")
+    p.add_argument("--today", type=date.fromisoformat, help="Stichtag (YYYY-MM-DD) statt heute")
+    p.add_argument("--workers", type=int, default=1, help="Anzahl Worker-Prozesse (Standard: 1)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="Zeilen pro Worker-Aufgabe")
+    args = p.parse_args(argv)
+    if args.workers < 1 or args.chunk_size < 1:
+        p.error("--workers und --chunk-size müssen >= 1 sein")
+
+    in_fmt = args.format or guess_format(args.input)
+    out_fmt = args.output_format or (guess_format(args.output, in_fmt) if args.output != "-" else in_fmt)
+
+    from bvb_main_app import load_rules
+    # Ladeausgaben nach stderr, damit stdout als Ergebnisstrom sauber bleibt
+    with contextlib.redirect_stdout(sys.stderr):
+        rules_by_icd = load_rules(args.rules)
+
+    inp = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        if args.workers > 1:
+            stats = run_bulk_parallel(inp, out, args.rules, in_fmt, out_fmt, args.workers,
+                                      chunk_size=args.chunk_size, today=args.today)
+        else:
+            stats = run_bulk(inp, out, rules_by_icd, in_fmt, out_fmt, today=args.today)
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+
+    rate = stats["patients"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    print(f"✅ {stats['patients']} Patienten geprüft ({stats['errors']} fehlerhafte Zeilen) "
+          f"in {stats['seconds']:.2f}s – {rate:,.0f} Patienten/s", file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diagnoseliste aus dem KBV-PDF extrahieren
+Liest heilmittel-diagnoseliste.pdf seitenweise in mehreren Prozessen, legt
+das Ergebnis jeder Seite unter dem SHA-256 ihres Inhalts im Seiten-Cache ab
+und schreibt die CSV im Schema von load_rules. Bei einer neuen KBV-Ausgabe
+werden nur geänderte Seiten neu geparst; der Vergleich mit der bisherigen
+Liste zeigt neue, entfallene und geänderte ICDs.
+
+Die Tabelle wird über die x-Position der Textstücke in Spalten zerlegt
+(1./2. ICD-10, Diagnose, Diagnosegruppen, Hinweis). Einträge mit einer
+Frist ("längstens 1 Jahr nach Akutereignis") werden wie in der bisherigen
+CSV als BVB übernommen, alle übrigen als LHB; das Ergebnis vor dem Einsatz
+anhand des Vergleichs prüfen.
+
+Benötigt pypdf (pip install pypdf); der Server selbst braucht es nicht.
+
+Aufruf:
+    python bvb_extract.py heilmittel-diagnoseliste.pdf -o diagnoseliste_extracted.csv
+    python bvb_extract.py neu.pdf -o neu.csv --previous data/diagnoseliste_corrected.csv --diff-json diff.json
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from pypdf import PdfReader  # nur für die Extraktion nötig
+except ImportError:
+    PdfReader = None
+
+from rules_artifact import rules_from_csv
+
+# Bei Änderungen an parse_page erhöhen: macht den Seiten-Cache ungültig
+PARSER_VERSION = 3
+DEFAULT_CACHE_DIR = ".bvb_extract_cache"
+CSV_FIELDS = ("icd", "title", "group", "eligibility", "requires_second_icd", "second_icd_hint",
+              "acute_window_months", "notes", "source_url", "source_version")
+# Felder, die der Vergleich mit der Vorversion betrachtet (source_* ändern sich bei jeder Ausgabe)
+COMPARED_FIELDS = ("title", "group", "eligibility", "requires_second_icd", "second_icd_hint",
+                   "acute_window_months", "notes")
+
+# Spaltengrenzen (x in pt) der Tabelle "Langfristiger Heilmittelbedarf / Besonderer Verordnungsbedarf"
+ICD_COLUMN_MAX = 80.0
+TITLE_COLUMN_MAX = 270.0
+HINT_COLUMN_MIN = 460.0
+FOOTER_MAX_Y = 40.0
+# Zeilenabstand innerhalb einer Zelle (~10.2pt); größere Abstände beginnen eine neue Zeile
+LINE_GAP = 11.5
+GLUED_X = 0.0           # x für aus der Hinweis-Spalte abgetrennte Zeilen
+
+# Kreuz-Stern-Kennzeichen (G73.6*) wird beim Schreiben entfernt
+_ICD = r"[A-Z]\d{2}(?:\.\d{1,2})?-?[*†!]?"
+# Bereichszeile "C00-C97" (im PDF als "C00-" und "C97" untereinander); IcdIndex kennt Bereichsschlüssel
+_RANGE = r"[A-Z]\d{2}(?:\.\d{1,2})?-[A-Z]\d{2}(?:\.\d{1,2})?"
+_RANGE_START_RE = re.compile(r"^[A-Z]\d{2}(?:\.\d{1,2})?-$")
+_RANGE_END_RE = re.compile(r"^[A-Z]\d{2}(?:\.\d{1,2})?$")
+_BARE_ICD_RE = re.compile(rf"^{_ICD}$")
+_ROW_RE = re.compile(rf"^({_RANGE}|{_ICD})(?:\s+({_ICD}))?\s+(.*)$")
+# Diagnosegruppen/Heilmittelbereiche: ZN, ZN/SO3, EN1/EN2, SC/ST1/SP1/
+_GROUP_RE = re.compile(r"^(?:[A-Z]{2,3}\d?/?)+$")
+# Im Hinweis-Text angeklebte Folgezeile: "bei ErwachsenenM41.5- Sonstige ..."
+_GLUED_ROW_RE = re.compile(rf"(?<=[a-zäöüß])(?={_ICD}\s)")
+_WINDOW_RE = re.compile(r"längstens\s+(\d+|einem|ein)\s+(Jahre?n?|Monate?n?)", re.IGNORECASE)
+_STAND_RE = re.compile(r"STAND\s+(\d{1,2})\.\s*([A-ZÄÖÜ]+)\s+(\d{4})")
+MONTHS = {"JANUAR": 1, "FEBRUAR": 2, "MÄRZ": 3, "APRIL": 4, "MAI": 5, "JUNI": 6, "JULI": 7,
+          "AUGUST": 8, "SEPTEMBER": 9, "OKTOBER": 10, "NOVEMBER": 11, "DEZEMBER": 12}
+
+# ----------------- Page parsing -----------------
+
+def _split_groups(tokens: List[str]) -> Tuple[List[str], List[str], List[str]]:
+    """title tokens, group tokens, hint tokens of one table line."""
+    for i, token in enumerate(tokens):
+        if _GROUP_RE.match(token):
+            j = i
+            while j < len(tokens) and _GROUP_RE.match(tokens[j]):
+                j += 1
+            return tokens[:i], tokens[i:j], tokens[j:]
+    return tokens, [], []
+
+def _is_heading(text: str) -> bool:
+    letters = [c for c in text if c.isalpha()]
+    return len(letters) > 3 and text == text.upper()
+
+def _new_block(continued: bool = False) -> Dict[str, Any]:
+    return {"continued": continued, "groups": [], "hint": [], "rows": []}
+
+def parse_page(fragments: Iterable[Tuple[float, float, str]]) -> Dict[str, Any]:
+    """Rows of one page from its text fragments (x, y, text) in content order.
+
+    Returns {"kind", "version", "blocks"}; kind is "bedarf" for pages of the
+    LHB/BVB table, None for everything else. A block is one table cell group:
+    rows sharing Diagnosegruppen and Hinweis. "continued" marks a block that
+    started on the previous page.
+    """
+    fragments = [(x, y, " ".join(text.split())) for x, y, text in fragments if text.strip()]
+    full_text = " ".join(text for _, _, text in fragments)
+    result: Dict[str, Any] = {"kind": None, "version": None, "blocks": []}
+    m = _STAND_RE.search(full_text.upper())
+    if m and m.group(2) in MONTHS:
+        result["version"] = f"{int(m.group(3)):04d}-{MONTHS[m.group(2)]:02d}-{int(m.group(1)):02d}"
+    if not any(text.startswith("DIAGNOSEGRUPPE") for _, _, text in fragments):
+        return result
+    result["kind"] = "bedarf"
+
+    blocks: List[Dict[str, Any]] = []
+    block: Optional[Dict[str, Any]] = None
+    row: Optional[Dict[str, Any]] = None   # letzte Zeile, solange ihr Titel weiterlaufen kann
+    last_y = None                          # y der letzten Zeile in der Diagnose-Spalte
+    in_header = True
+
+    def start_block(continued: bool = False) -> Dict[str, Any]:
+        new = _new_block(continued)
+        blocks.append(new)
+        return new
+
+    def add_groups(target: Dict[str, Any], groups: List[str]) -> None:
+        target["groups"].extend(groups)
+        # "SC/ST1/SP1/" am Zeilenende: die Zelle läuft in der nächsten Zeile weiter
+        target["open"] = groups[-1].endswith("/")
+
+    pending = list(fragments)
+    while pending:
+        x, y, text = pending.pop(0)
+        if in_header:
+            # Tabellenkopf endet mit "SPEZIFIKATION"
+            in_header = not text.startswith("SPEZIFIKATION")
+            continue
+        if y < FOOTER_MAX_Y:
+            continue
+
+        if x < ICD_COLUMN_MAX:
+            m = _ROW_RE.match(text)
+            if m is None and _RANGE_START_RE.match(text) and pending and pending[0][0] < ICD_COLUMN_MAX \
+                    and _RANGE_END_RE.match(pending[0][2]):
+                # Titel, Gruppen und Hinweis stehen auf Höhe des Bereichsanfangs
+                end = pending.pop(0)[2]
+                k = next((k for k, f in enumerate(pending) if f[0] < TITLE_COLUMN_MAX and abs(f[1] - y) < 1.5), None)
+                rest = pending.pop(k)[2] if k is not None else ""
+                pending.insert(0, (x, y, f"{text}{end} {rest}"))
+                continue
+            if m is None and _BARE_ICD_RE.match(text):
+                # Code allein ("G35.2-"), Titel im eigenen Fragment auf gleicher Höhe
+                k = next((k for k, f in enumerate(pending)
+                          if ICD_COLUMN_MAX <= f[0] < TITLE_COLUMN_MAX and abs(f[1] - y) < 1.5), None)
+                if k is not None:
+                    pending.insert(0, (x, y, f"{text} {pending.pop(k)[2]}"))
+                    continue
+            if m is None:
+                if _is_heading(text):
+                    # Abschnittsüberschrift (KRANKHEITEN DER ...) beendet den Block
+                    block, row = None, None
+                continue
+            icd, second, rest = m.groups()
+            title, groups, hint = _split_groups(rest.split())
+            if block is None or (groups and not block.get("open")):
+                block = start_block(continued=not groups and not blocks)
+            if groups:
+                add_groups(block, groups)
+            block["hint"].extend(hint)
+            row = {"icd": icd, "second_icd": second or "", "title": [" ".join(title)], "y": y,
+                   # angeklebte Zeile: y stammt aus der Hinweis-Zeile davor, die echte Zeile liegt tiefer
+                   "gap": 2 * LINE_GAP if x == GLUED_X else LINE_GAP}
+            block["rows"].append(row)
+            last_y = y
+        elif x < TITLE_COLUMN_MAX:
+            if row is not None and last_y is not None and 0 < last_y - y <= row["gap"]:
+                row["title"].append(text)
+            else:
+                # Zwischenüberschrift ("Bösartige Neubildung des Gehirns:") gehört zur Zelle
+                row = None
+            last_y = y
+        elif x < HINT_COLUMN_MIN:
+            _, groups, hint = _split_groups(text.split())
+            if not groups:
+                hint = text.split()
+            if block is None:
+                block = start_block(continued=not groups and not blocks)
+            elif groups and not block.get("open"):
+                # Neue Gruppen: auf Höhe einer Zeile des Blocks beginnt dort ein neuer Block
+                rows = block["rows"]
+                i = next((i for i, r in enumerate(rows) if abs(r["y"] - y) < 1.5), None)
+                if i == 0:
+                    # erste Zeile der Seite hat eigene Gruppen: kein Übertrag von der Vorseite
+                    block["continued"] = False
+                elif i is not None:
+                    moved = rows[i:]
+                    del rows[i:]
+                    block = start_block()
+                    block["rows"].extend(moved)
+                elif rows or block["groups"]:
+                    block = start_block()
+            if groups:
+                add_groups(block, groups)
+            block["hint"].extend(hint)
+        else:
+            parts = _GLUED_ROW_RE.split(text, maxsplit=1)
+            if len(parts) == 2:
+                text = parts[0]
+                pending.insert(0, (GLUED_X, y, parts[1]))
+            if block is None:
+                block = start_block(continued=not blocks)
+            block["hint"].append(text)
+
+    for b in blocks:
+        b.pop("open", None)
+        for r in b["rows"]:
+            r["title"] = _join_lines(r["title"])
+            del r["y"], r["gap"]
+    result["blocks"] = [b for b in blocks if b["rows"] or b["continued"]]
+    return result
+
+def _join_lines(parts: List[str]) -> str:
+    """Join wrapped cell lines, undoing hyphenation ("Re-" + "paratursystem")."""
+    out = ""
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if out.endswith("-") and part[:1].islower():
+            out = out[:-1] + part
+        elif out.endswith("-") and out[-2:-1].isalpha():
+            # Bindestrich-Wort über den Umbruch ("Foix-" + "Alajouanine")
+            out += part
+        else:
+            out = f"{out} {part}" if out else part
+    return out
+
+def acute_window_months(hint: str) -> Optional[int]:
+    m = _WINDOW_RE.search(hint)
+    if m is None:
+        return None
+    number = 1 if m.group(1).lower().startswith("ein") else int(m.group(1))
+    return number * 12 if m.group(2).lower().startswith("jahr") else number
+
+# ----------------- PDF access -----------------
+
+def require_pypdf() -> None:
+    if PdfReader is None:
+        raise RuntimeError("pypdf fehlt – für die Extraktion installieren: pip install pypdf")
+
+def page_fragments(page) -> List[Tuple[float, float, str]]:
+    fragments: List[Tuple[float, float, str]] = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if text.strip():
+            fragments.append((round(tm[4], 1), round(tm[5], 1), text))
+
+    page.extract_text(visitor_text=visit)
+    return fragments
+
+def page_key(page) -> str:
+    """Cache key: parser version + the page's raw content stream."""
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    return hashlib.sha256(f"{PARSER_VERSION}:".encode() + data).hexdigest()
+
+_worker_reader = None
+
+def _init_worker(pdf_path: str) -> None:
+    global _worker_reader
+    _worker_reader = PdfReader(pdf_path)
+
+def _parse_page_worker(index: int) -> Tuple[int, Dict[str, Any]]:
+    return index, parse_page(page_fragments(_worker_reader.pages[index]))
+
+class PageCache:
+    """Parsed pages as JSON files named after their content hash."""
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        tmp = self._path(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+
+def parse_pdf(pdf_path: str, cache: PageCache, jobs: int = 0) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Parsed result of every page; only pages missing from the cache are parsed (in parallel)."""
+    require_pypdf()
+    reader = PdfReader(pdf_path)
+    keys = [page_key(page) for page in reader.pages]
+    pages: List[Optional[Dict[str, Any]]] = [cache.get(key) for key in keys]
+    todo = [i for i, page in enumerate(pages) if page is None]
+    jobs = min(jobs or os.cpu_count() or 1, len(todo))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(pdf_path,)) as pool:
+            for index, result in pool.map(_parse_page_worker, todo, chunksize=max(1, len(todo) // (jobs * 4))):
+                pages[index] = result
+                cache.put(keys[index], result)
+    else:
+        for index in todo:
+            pages[index] = parse_page(page_fragments(reader.pages[index]))
+            cache.put(keys[index], pages[index])
+    return pages, {"pages": len(pages), "parsed": len(todo), "cached": len(pages) - len(todo), "jobs": max(jobs, 1)}
+
+# ----------------- Rows -----------------
+
+def rows_from_pages(pages: List[Dict[str, Any]], source_url: str, version: Optional[str] = None) -> Tuple[List[Dict[str, str]], List[str]]:
+    """CSV rows (load_rules schema) from the parsed pages, plus warnings."""
+    version = version or next((p["version"] for p in pages if p.get("version")), "")
+    rows: Dict[str, Dict[str, Any]] = {}
+    warnings: List[str] = []
+    previous: Optional[Dict[str, Any]] = None
+    for page_no, page in enumerate(pages, start=1):
+        if page.get("kind") != "bedarf":
+            previous = None
+            continue
+        for block in page["blocks"]:
+            if block["continued"] and previous is not None:
+                # Block läuft von der Vorseite weiter: Gruppen und Hinweis übernehmen
+                block = {**block, "groups": previous["groups"] + block["groups"],
+                         "hint": previous["hint"] + block["hint"]}
+            previous = block
+            hint = _join_lines(block["hint"])
+            window = acute_window_months(hint)
+            group = block["groups"][0].rstrip("/") if block["groups"] else ""
+            for r in block["rows"]:
+                icd = r["icd"].rstrip("*†!").rstrip("-")
+                row = rows.get(icd)
+                if row is not None:
+                    # Gleicher Primär-ICD mit anderem Zweit-ICD (M47.9- G99.2 / G55.2)
+                    if r["second_icd"] and r["second_icd"] not in row["second"]:
+                        row["second"].append(r["second_icd"])
+                    else:
+                        warnings.append(f"S. {page_no}: {icd} mehrfach gelistet, erster Eintrag gilt")
+                    continue
+                rows[icd] = {
+                    "icd": icd,
+                    "title": r["title"],
+                    "group": group,
+                    "eligibility": "BVB" if window is not None else "LHB",
+                    "second": [r["second_icd"]] if r["second_icd"] else [],
+                    "acute_window_months": "" if window is None else str(window),
+                    "notes": hint[:1].upper() + hint[1:],
+                    "source_url": source_url,
+                    "source_version": version,
+                }
+    out = []
+    for row in rows.values():
+        second = row.pop("second")
+        row["requires_second_icd"] = str(bool(second))
+        row["second_icd_hint"] = ", ".join(s.rstrip("*†!").rstrip("-") for s in second)
+        out.append({field: row[field] for field in CSV_FIELDS})
+    return out, warnings
+
+def write_csv(rows: List[Dict[str, str]], path: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+def read_csv(path: str) -> Dict[str, Dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return {(row.get("icd") or "").strip().upper(): row for row in csv.DictReader(f)}
+
+# ----------------- Diff -----------------
+
+def _normalized(field: str, value: Optional[str]) -> str:
+    value = " ".join((value or "").split())
+    if field == "requires_second_icd":
+        return str(value.lower() in ("true", "1", "yes"))
+    if field == "acute_window_months" and value:
+        try:
+            return str(int(float(value)))
+        except ValueError:
+            return value
+    return value
+
+def diff_rules(old: Dict[str, Dict[str, str]], new: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    """Added/removed ICDs and per-field changes between two lists."""
+    changed: Dict[str, Dict[str, List[str]]] = {}
+    for icd in sorted(old.keys() & new.keys()):
+        fields = {}
+        for field in COMPARED_FIELDS:
+            before, after = _normalized(field, old[icd].get(field)), _normalized(field, new[icd].get(field))
+            if before != after:
+                fields[field] = [before, after]
+        if fields:
+            changed[icd] = fields
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": changed,
+    }
+
+def print_diff(diff: Dict[str, Any], limit: int = 20) -> None:
+    print(f"📋 Vergleich: {len(diff['added'])} neu, {len(diff['removed'])} entfallen, {len(diff['changed'])} geändert")
+    for label, icds in (("+", diff["added"]), ("-", diff["removed"])):
+        for icd in icds[:limit]:
+            print(f"  {label} {icd}")
+        if len(icds) > limit:
+            print(f"  {label} … {len(icds) - limit} weitere")
+    for icd, fields in list(diff["changed"].items())[:limit]:
+        for field, (before, after) in fields.items():
+            print(f"  ~ {icd} {field}: {before!r} → {after!r}")
+    if len(diff["changed"]) > limit:
+        print(f"  ~ … {len(diff['changed']) - limit} weitere")
+
+# ----------------- CLI -----------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Diagnoseliste-CSV aus dem KBV-PDF erzeugen")
+    p.add_argument("pdf", help="KBV-Diagnoseliste (PDF)")
+    p.add_argument("-o", "--output", required=True, help="Ziel-CSV (Schema von load_rules)")
+    p.add_argument("--previous", help="Bisherige CSV für den Vergleich (Standard: vorhandene Ziel-CSV)")
+    p.add_argument("--diff-json", help="Vergleich zusätzlich als JSON speichern")
+    p.add_argument("--version", help="Stand der Liste (Standard: vom Titelblatt, z.B. 2025-07-01)")
+    p.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Seiten-Cache (nach Inhalts-Hash)")
+    p.add_argument("--no-cache", action="store_true", help="Alle Seiten neu parsen, nichts speichern")
+    p.add_argument("--jobs", type=int, default=0, help="Parallele Prozesse (Standard: CPU-Kerne)")
+    args = p.parse_args(argv)
+
+    if PdfReader is None:
+        print("❌ pypdf fehlt – für die Extraktion installieren: pip install pypdf", file=sys.stderr)
+        return 2
+    previous_path = args.previous or (args.output if os.path.exists(args.output) else None)
+    old = read_csv(previous_path) if previous_path else None
+
+    started = time.perf_counter()
+    pages, stats = parse_pdf(args.pdf, PageCache(None if args.no_cache else args.cache_dir), args.jobs)
+    rows, warnings = rows_from_pages(pages, f"local-file:{os.path.basename(args.pdf)}", args.version)
+    if not rows:
+        print("❌ Keine Einträge gefunden – ist das die KBV-Diagnoseliste?", file=sys.stderr)
+        return 1
+    write_csv(rows, args.output)
+    # Gegenprobe: die CSV muss sich so laden lassen wie im Server
+    loaded = rules_from_csv(args.output)
+    elapsed = time.perf_counter() - started
+
+    kinds = {"BVB": 0, "LHB": 0}
+    for row in rows:
+        kinds[row["eligibility"]] += 1
+    print(f"✅ {len(loaded)} ICDs nach {args.output} (Stand {rows[0]['source_version'] or 'unbekannt'}): "
+          f"BVB={kinds['BVB']}, LHB={kinds['LHB']}")
+    print(f"📄 {stats['pages']} Seiten, {stats['parsed']} geparst ({stats['jobs']} Prozesse), "
+          f"{stats['cached']} aus dem Cache – {elapsed:.2f}s")
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+
+    if old is not None:
+        diff = diff_rules(old, {row["icd"]: row for row in rows})
+        print(f"Vorversion: {previous_path}")
+        print_diff(diff)
+        if args.diff_json:
+            with open(args.diff_json, "w", encoding="utf-8") as f:
+                json.dump({"previous": previous_path, "output": args.output, **diff}, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,18 +7,22 @@ Standalone FastAPI Application mit eingebetteter Diagnoseliste
 
 import os
 import sys
-from pathlib import Path
 from datetime import date
-from typing import List, Dict, Any
-import pandas as pd
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from typing import List, Dict, Any, Optional, Union
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-import webbrowser
+try:
+    import orjson  # schnellerer JSON-Encoder, falls installiert
+except ImportError:
+    orjson = None
+import json
 import threading
 import time
+from dataclasses import asdict
+# uvicorn und webbrowser werden erst in run_server() importiert;
+# der Request-Pfad selbst kommt ohne pandas/numpy aus (nur Standardbibliothek).
 
 # PyInstaller compatibility
 def get_resource_path(relative_path):
@@ -32,7 +36,27 @@ def get_resource_path(relative_path):
 
 # Import rule engine
 sys.path.append(get_resource_path("."))
-from rule_engine import RuleRow, PatientContext, evaluate_patient, normalize_icds
+from rule_engine import (
+    RuleRow, PatientContext, IcdIndex, RuleStore, ResultCache, decode_conditions, evaluate_patient, evaluate_patients,
+    normalize_icds, parse_icds, result_cache_key,
+)
+import bvb_bulk
+from bvb_static import Asset, StaticBundle, make_asset, response_parts
+from bvb_audit import AuditLog, format_cursor, parse_cursor, resolve_db_path
+from bvb_metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, ProfileSort, Registry, SamplingProfiler, snapshot,
+)
+from bvb_models import AuditResponse, CheckRequest, CheckResponse, KbvCheckResponse, SearchResponse
+from rules_artifact import ARTIFACT_NAME, ArtifactError, file_sha256, load_artifact, load_artifact_json, rules_from_csv
+from rules_json import KbvRuleIndex, PatientProfile, load_rules_json, match_patient
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available (several times faster for large results)"""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
 
 app = FastAPI(
     title="BVB Checker",
@@ -49,337 +73,763 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ----------------- Metriken -----------------
+
+metrics = Registry()
+HTTP_REQUESTS = metrics.counter("bvb_http_requests_total", "HTTP-Anfragen nach Pfad, Methode und Status",
+                                ("path", "method", "status"))
+HTTP_DURATION = metrics.histogram("bvb_http_request_duration_seconds", "Dauer der HTTP-Anfragen", ("path",))
+CHECK_STAGE = metrics.histogram("bvb_check_stage_seconds",
+                                "Dauer der Schritte von /check (parse, normalize, evaluate, serialize)", ("stage",))
+RULE_RELOADS = metrics.counter("bvb_rules_reloads_total", "Neuladen der Diagnoseliste nach Ergebnis", ("result",))
+# Stichproben-Profiler für evaluate_patient, zur Laufzeit über /admin/profile schaltbar
+profiler = SamplingProfiler()
+PROFILE_EVERY = int(os.environ.get("PROFILE_EVERY", "0"))
+
+app.add_middleware(MetricsMiddleware, requests=HTTP_REQUESTS, duration=HTTP_DURATION,
+                   known_paths=lambda: [route.path for route in app.routes])
+
 # Globale Variables
-rules_dict: Dict[str, RuleRow] = {}
+# rules_dict/rules_info werden nie verändert, sondern bei einem Reload komplett ersetzt
+# (Copy-on-Write): laufende Requests arbeiten mit ihrer bisherigen Referenz weiter.
+rules_dict: IcdIndex = IcdIndex({})
+rules_info: Dict[str, Any] = {}
+# Alle Listenversionen (data/versions/*.csv + aktuelle Liste) für Prüfungen zum Verordnungsdatum
+rules_store: RuleStore = RuleStore()
+# Regeln aus rules.json (Alter, Geschlecht, Heilmittelbereich, Zweit-ICDs) für /check mit "patient"
+kbv_rules: KbvRuleIndex = KbvRuleIndex([])
+# Volltextsuche über Titel, Gruppe und Hinweis der aktuellen Liste für /search (bvb_search.SearchIndex;
+# erst in build_rules importiert)
+search_index = None
+_reload_lock = threading.Lock()
 
-def load_rules():
-    """Load and parse the embedded diagnosis list"""
-    global rules_dict
-    
+# Sekunden zwischen zwei Prüfungen von ./data auf eine neue Diagnoseliste (0 = aus)
+RULES_WATCH_INTERVAL = float(os.environ.get("RULES_WATCH_INTERVAL", "0"))
+# Optionales Token für /admin/*; ohne Token nur von localhost erreichbar
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+VALID_ELIGIBILITY = {"BVB", "LHB", "NONE"}
+
+# Anzahl zwischengespeicherter /check-Antworten (LRU, 0 = aus); wird bei jedem Reload geleert
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "10000"))
+result_cache = ResultCache(RESULT_CACHE_SIZE)
+
+# Prüfprotokoll der /check-Antworten (SQLite); geschrieben im Hintergrund. Nur wenn AUDIT_DB gesetzt ist:
+# Pfad, oder "default" = neben der EXE bzw. im Benutzer-Datenordner, nie im Arbeitsverzeichnis
+AUDIT_DB = resolve_db_path(os.environ.get("AUDIT_DB"))
+# Wartende Einträge höchstens; darüber wird verworfen (gezählt in /health) statt /check zu bremsen
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+audit_log = AuditLog(AUDIT_DB, AUDIT_QUEUE_SIZE)
+
+# Oberfläche aus static/ (komprimiert, mit ETag) und /rules-Export je geladener Liste
+static_bundle = None
+_rules_export = (None, None)
+
+# PID des Supervisors, wenn dieser Prozess ein Worker von bvb_server.py ist (sonst None)
+supervisor_pid = None
+
+# Obergrenze für /check/batch (ein Quartal einer großen Praxis passt hinein)
+MAX_BATCH_PATIENTS = 100_000
+
+def read_rules_artifact(csv_path: str):
+    """Load the precompiled artifact next to csv_path, or None if absent/stale"""
+    artifact_path = os.path.join(os.path.dirname(csv_path), ARTIFACT_NAME)
+    if not os.path.exists(artifact_path):
+        return None
     try:
-        # Eingebettete CSV laden
-        csv_path = get_resource_path("data/diagnoseliste_corrected.csv")
-        
+        # Liegt die CSV daneben, muss das Artefakt aus genau dieser CSV gebaut sein
+        expected = file_sha256(csv_path) if os.path.exists(csv_path) else None
+        return load_artifact(artifact_path, expected)
+    except ArtifactError as e:
+        print(f"⚠️ Artefakt ignoriert ({artifact_path}): {e}")
+        return None
+
+def default_csv_path():
+    return get_resource_path("data/diagnoseliste_corrected.csv")
+
+def versions_dir(csv_path: str):
+    """Folder with earlier list versions, one CSV per version"""
+    return os.path.join(os.path.dirname(csv_path), "versions")
+
+def version_files(csv_path: str):
+    folder = versions_dir(csv_path)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(".csv"))
+
+def rules_json_path(csv_path: str):
+    """rules.json to load: RULES_JSON, next to the CSV, or in the app folder (None if absent)"""
+    candidates = [os.environ.get("RULES_JSON", ""),
+                  os.path.join(os.path.dirname(csv_path), "rules.json"),
+                  get_resource_path("rules.json")]
+    return next((p for p in candidates if p and os.path.exists(p)), None)
+
+def build_kbv_rules(csv_path: str):
+    """KBV rules from rules.json, or from the copy embedded in the artifact"""
+    path = rules_json_path(csv_path)
+    if path is not None:
+        return KbvRuleIndex(load_rules_json(path)), path
+    artifact_path = os.path.join(os.path.dirname(csv_path), ARTIFACT_NAME)
+    if os.path.exists(artifact_path):
+        try:
+            return KbvRuleIndex(load_artifact_json(artifact_path)), artifact_path
+        except ArtifactError:
+            pass
+    return KbvRuleIndex([]), None
+
+def validate_rules(rules: Dict[str, RuleRow]):
+    """Reject lists that must not replace a working one"""
+    if not rules:
+        raise ValueError("Diagnoseliste ist leer")
+    for icd, rule in rules.items():
+        if not icd:
+            raise ValueError("Eintrag ohne ICD-Code")
+        if rule.eligibility not in VALID_ELIGIBILITY:
+            raise ValueError(f"{icd}: unbekannte eligibility '{rule.eligibility}'")
+
+def build_rules(csv_path: str):
+    """Load, validate and index a list without touching the active one"""
+    started = time.perf_counter()
+    rules, source = read_rules_artifact(csv_path), "Artefakt"
+    if rules is None:
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"Diagnoseliste nicht gefunden: {csv_path}")
+        rules, source = rules_from_csv(csv_path), "CSV"
+    validate_rules(rules)
+
+    # Zulässige Zweit-ICDs aus rules.json ergänzen Einträge, deren second_icd_hint keine Codes nennt
+    kbv, kbv_path = build_kbv_rules(csv_path)
+    secondary = kbv.secondary_index()
+
+    # Ältere Versionen zuerst, die aktuelle Liste zuletzt (ersetzt eine gleich datierte ältere Kopie)
+    store = RuleStore()
+    for path in version_files(csv_path):
+        old_rules = rules_from_csv(path)
+        validate_rules(old_rules)
+        store.add(old_rules, secondary=secondary)
+    index = store.add(rules, secondary=secondary)
+    # Titel aus rules.json ("... nach Schlaganfall") sind für die Suche mit ihren Primär-ICDs verknüpft
+    from bvb_search import SearchIndex
+    search = SearchIndex(index, related=lambda icd: [rule.title for rule in kbv.candidates(icd)])
+
+    stats = {"BVB": 0, "LHB": 0, "NONE": 0}
+    for rule in index.values():
+        stats[rule.eligibility] = stats.get(rule.eligibility, 0) + 1
+    info = {
+        "version": index.version,
+        "source": source,
+        "path": csv_path,
+        "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rules_loaded": len(index),
+        "distribution": stats,
+        "versions": [{"valid_from": start.isoformat(), "version": version} for start, version in store.versions()],
+        "loaded_at_ts": time.time(),
+        "rules_json": {"path": kbv_path, "rules": len(kbv), "placeholders": kbv.skipped,
+                       "kbv_version_date": kbv.version},
+        "search": {"rules": len(search), "terms": search.terms},
+        "load_seconds": round(time.perf_counter() - started, 6),
+    }
+    return index, info, store, kbv, search
+
+def load_rules(csv_path=None):
+    """Load the embedded diagnosis list: precompiled artifact first, CSV as fallback"""
+    global rules_dict, rules_info, rules_store, kbv_rules, search_index
+    
+    try:
+        # Eingebettete Diagnoseliste laden
+        index, info, store, kbv, search = build_rules(csv_path or default_csv_path())
+        # Atomarer Austausch der Referenzen
+        rules_dict, rules_info, rules_store, kbv_rules, search_index = index, info, store, kbv, search
+        result_cache.clear()
             
-        df = pd.read_csv(csv_path)
-        
-        # Data cleaning
-        df = df.fillna("")
-        df["requires_second_icd"] = df["requires_second_icd"].astype(str).str.lower().isin(["true", "1", "yes"])
-        df["acute_window_months"] = pd.to_numeric(df["acute_window_months"], errors="coerce")
-        
-        # Build rules dictionary
-        rules_dict = {}
-        for _, row in df.iterrows():
-            rule = RuleRow(
-                icd=str(row["icd"]).upper().strip(),
-                title=str(row.get("title", "")),
-                group=str(row.get("group", "")),
-                eligibility=str(row.get("eligibility", "NONE")).upper(),
-                requires_second_icd=bool(row.get("requires_second_icd", False)),
-                second_icd_hint=str(row.get("second_icd_hint", "")),
-                acute_window_months=row.get("acute_window_months") if pd.notna(row.get("acute_window_months")) else None,
-                notes=str(row.get("notes", "")),
-                source_url=str(row.get("source_url", "")),
-                source_version=str(row.get("source_version", "2025-07-01"))
-            )
-            rules_dict[rule.icd] = rule
-            
-        print(f"✅ Diagnoseliste geladen: {len(rules_dict)} ICDs")
+        print(f"✅ Diagnoseliste geladen: {len(rules_dict)} ICDs ({info['source']}, Stand {info['version']})")
         
         # Statistics
-        stats = {"BVB": 0, "LHB": 0, "NONE": 0}
-        for rule in rules_dict.values():
-            stats[rule.eligibility] = stats.get(rule.eligibility, 0) + 1
+        stats = info["distribution"]
         print(f"📊 Verteilung: BVB={stats['BVB']}, LHB={stats['LHB']}, NONE={stats['NONE']}")
+        kbv_info = info["rules_json"]
+        if kbv_info["path"]:
+            print(f"📋 rules.json: {kbv_info['rules']} Regeln, {kbv_info['placeholders']} Platzhalter ohne Primär-ICD")
+        return rules_dict
         
     except Exception as e:
         print(f"❌ Fehler beim Laden der Diagnoseliste: {e}")
         raise
 
+def reload_rules(csv_path=None):
+    """Load a new list in the background and swap it in; the old list stays active on error"""
+    with _reload_lock:
+        previous = rules_info.get("version")
+        try:
+            load_rules(csv_path or rules_info.get("path"))
+        except Exception:
+            RULE_RELOADS.inc("failed")
+            raise
+        RULE_RELOADS.inc("ok")
+        print(f"🔄 Diagnoseliste neu geladen: {previous} → {rules_info['version']}")
+        return rules_info
+
+class RulesWatcher:
+    """Polls the CSV/artifact in ./data and reloads when they change"""
+
+    def __init__(self, interval: float, on_change=None):
+        self.interval = interval
+        self.on_change = on_change or reload_rules
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _signature(self):
+        path = rules_info.get("path") or default_csv_path()
+        sig = []
+        kbv_path = rules_json_path(path)
+        extra = [kbv_path] if kbv_path else []
+        for p in [path, os.path.join(os.path.dirname(path), ARTIFACT_NAME)] + extra + version_files(path):
+            try:
+                st = os.stat(p)
+                sig.append((p, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((p, None, None))
+        return tuple(sig)
+
+    def _run(self):
+        last = self._signature()
+        pending = None
+        while not self._stop.wait(self.interval):
+            current = self._signature()
+            if current == last:
+                pending = None
+                continue
+            # Erst neu laden, wenn die Datei über zwei Prüfungen stabil ist (Kopiervorgang fertig)
+            if current != pending:
+                pending = current
+                continue
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"⚠️ Neue Diagnoseliste verworfen, alte bleibt aktiv: {e}")
+            last, pending = current, None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="rules-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+rules_watcher = None
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application"""
-    load_rules()
+    global rules_watcher
+    # Bereits vor dem Start (bzw. vor dem Fork der Worker) geladen? Dann nicht erneut parsen
+    if not rules_info:
+        load_rules()
+    if PROFILE_EVERY > 0:
+        profiler.start(PROFILE_EVERY)
+    # Oberfläche einmal komprimieren statt beim ersten Aufruf
+    static_assets()
+    # Je Prozess ein Writer (nach dem fork); mehrere Worker teilen sich die Datei über WAL
+    if AUDIT_DB:
+        try:
+            audit_log.start()
+        except Exception as e:
+            print(f"⚠️ Prüfprotokoll {AUDIT_DB} nicht verfügbar: {e}")
+    # Unter bvb_server.py überwacht der Supervisor ./data und signalisiert die Worker
+    if RULES_WATCH_INTERVAL > 0 and supervisor_pid is None:
+        rules_watcher = RulesWatcher(RULES_WATCH_INTERVAL)
+        rules_watcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if rules_watcher is not None:
+        rules_watcher.stop()
+    audit_log.stop()
+
+def require_admin(request: Request):
+    if ADMIN_TOKEN:
+        if request.headers.get("x-admin-token") != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail="Admin-Token fehlt oder ist falsch")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Nur lokal oder mit ADMIN_TOKEN erlaubt")
+
+@app.post("/admin/reload")
+async def admin_reload(request: Request):
+    """Reload the diagnosis list without restart; requests keep running meanwhile"""
+    require_admin(request)
+    if supervisor_pid is not None:
+        # Unter bvb_server.py lädt der Supervisor und signalisiert danach alle Worker, auch diesen;
+        # selbst zu laden hieße, die Liste in diesem Worker doppelt zu laden
+        import signal
+        os.kill(supervisor_pid, signal.SIGHUP)
+        return {"status": "reload_requested", "rules_version": rules_info.get("version")}
+    try:
+        info = await run_in_threadpool(reload_rules)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Neue Diagnoseliste verworfen, alte bleibt aktiv: {e}")
+    return {"status": "reloaded", **info}
+
+def static_assets() -> StaticBundle:
+    """UI files, read and compressed once per process"""
+    global static_bundle
+    if static_bundle is None:
+        static_bundle = StaticBundle(get_resource_path("static"))
+    return static_bundle
+
+def asset_response(asset: Asset, request: Request) -> Response:
+    status, body, headers = response_parts(asset, request.headers)
+    return Response(body, status_code=status, headers=headers)
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """Main UI page"""
-    html_content = '''
-    <!DOCTYPE html>
-    <html lang="de">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>BVB Checker - Heilmittel Verordnungsbedarf</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh; padding: 20px;
-            }
-            .container { 
-                max-width: 800px; margin: 0 auto; 
-                background: white; border-radius: 12px; 
-                box-shadow: 0 20px 40px rgba(0,0,0,0.1); 
-                overflow: hidden;
-            }
-            .header { 
-                background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%); 
-                color: white; padding: 30px; text-align: center; 
-            }
-            .header h1 { font-size: 2.2em; margin-bottom: 10px; }
-            .header p { opacity: 0.9; font-size: 1.1em; }
-            .content { padding: 40px; }
-            .form-group { margin-bottom: 25px; }
-            label { 
-                display: block; margin-bottom: 8px; 
-                font-weight: 600; color: #333; 
-            }
-            textarea, input { 
-                width: 100%; padding: 12px; border: 2px solid #e1e5e9; 
-                border-radius: 8px; font-size: 16px; 
-                transition: border-color 0.3s ease;
-            }
-            textarea:focus, input:focus { 
-                outline: none; border-color: #667eea; 
-                box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-            }
-            textarea { height: 120px; font-family: monospace; }
-            .btn { 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                color: white; border: none; padding: 15px 30px; 
-                border-radius: 8px; font-size: 16px; font-weight: 600; 
-                cursor: pointer; transition: transform 0.2s ease;
-                width: 100%;
-            }
-            .btn:hover { transform: translateY(-2px); }
-            .results { 
-                margin-top: 30px; padding: 20px; 
-                background: #f8f9fa; border-radius: 8px; 
-                border-left: 4px solid #667eea;
-            }
-            .result-item { 
-                margin: 15px 0; padding: 15px; 
-                border-radius: 8px; border: 1px solid #e1e5e9;
-                background: white;
-            }
-            .bvb { border-left: 4px solid #28a745; }
-            .lhb { border-left: 4px solid #17a2b8; }
-            .none { border-left: 4px solid #6c757d; }
-            .summary { 
-                background: linear-gradient(135deg, #28a745 0%, #20c997 100%); 
-                color: white; padding: 20px; border-radius: 8px; 
-                margin-bottom: 20px; text-align: center;
-            }
-            .loading { display: none; text-align: center; margin: 20px 0; }
-            .footer { 
-                text-align: center; padding: 20px; 
-                color: #6c757d; font-size: 14px; 
-                border-top: 1px solid #e1e5e9;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🏥 BVB Checker</h1>
-                <p>Heilmittel Verordnungsbedarf - Schnell und einfach prüfen</p>
-            </div>
-            
-            <div class="content">
-                <form id="bvbForm">
-                    <div class="form-group">
-                        <label for="icds">ICD-10 Codes eingeben:</label>
-                        <textarea id="icds" placeholder="Z.B.: I63.9, G35.0, R26.2&#10;Oder jeden Code in einer neuen Zeile"></textarea>
-                        <small style="color: #6c757d;">Komma-getrennt oder zeilenweise eingeben</small>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="acute_date">Datum des Akutereignisses (optional):</label>
-                        <input type="date" id="acute_date">
-                    </div>
-                    
-                    <button type="submit" class="btn">🔍 BVB/LHB prüfen</button>
-                </form>
-                
-                <div class="loading" id="loading">
-                    <p>🔄 Prüfe Verordnungsbedarf...</p>
-                </div>
-                
-                <div id="results"></div>
-            </div>
-            
-            <div class="footer">
-                <p>BVB Checker v1.0 | Diagnoseliste Stand: Juli 2025 | Für Arztpraxen</p>
-            </div>
-        </div>
-
-        <script>
-            document.getElementById('bvbForm').addEventListener('submit', async function(e) {
-                e.preventDefault();
-                
-                const loading = document.getElementById('loading');
-                const results = document.getElementById('results');
-                const icdsInput = document.getElementById('icds').value;
-                const acuteDate = document.getElementById('acute_date').value;
-                
-                if (!icdsInput.trim()) {
-                    alert('Bitte ICD-Codes eingeben');
-                    return;
-                }
-                
-                loading.style.display = 'block';
-                results.innerHTML = '';
-                
-                try {
-                    const response = await fetch('/check', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({
-                            icds: icdsInput,
-                            acute_event_date: acuteDate || null
-                        })
-                    });
-                    
-                    const data = await response.json();
-                    
-                    loading.style.display = 'none';
-                    displayResults(data);
-                    
-                } catch (error) {
-                    loading.style.display = 'none';
-                    results.innerHTML = '<div class="result-item" style="border-left-color: #dc3545;">❌ Fehler: ' + error.message + '</div>';
-                }
-            });
-            
-            function displayResults(data) {
-                const results = document.getElementById('results');
-                
-                const bvbCount = data.results.filter(r => r.kind === 'BVB').length;
-                const lhbCount = data.results.filter(r => r.kind === 'LHB').length;
-                
-                let html = '<div class="results">';
-                
-                // Summary
-                if (bvbCount > 0 || lhbCount > 0) {
-                    html += '<div class="summary">';
-                    html += '<h3>✅ Verordnungsbedarf qualifiziert!</h3>';
-                    if (bvbCount > 0) html += '<p><strong>BVB:</strong> ' + bvbCount + ' Code(s)</p>';
-                    if (lhbCount > 0) html += '<p><strong>LHB:</strong> ' + lhbCount + ' Code(s)</p>';
-                    html += '</div>';
-                } else {
-                    html += '<div style="background: #6c757d; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; text-align: center;">';
-                    html += '<h3>ℹ️ Kein besonderer Verordnungsbedarf</h3>';
-                    html += '<p>Normale Heilmittelverordnung möglich</p>';
-                    html += '</div>';
-                }
-                
-                // Individual results
-                data.results.forEach(result => {
-                    const className = result.kind ? result.kind.toLowerCase() : 'none';
-                    const badge = result.kind === 'BVB' ? '🟢 BVB' : result.kind === 'LHB' ? '🔵 LHB' : '⚪ NONE';
-                    
-                    html += '<div class="result-item ' + className + '">';
-                    html += '<h4>' + badge + ' ' + result.icd + '</h4>';
-                    html += '<p>' + result.explain + '</p>';
-                    if (result.missing.length > 0) {
-                        html += '<p style="color: #dc3545;"><strong>Fehlend:</strong> ' + result.missing.join(', ') + '</p>';
-                    }
-                    html += '</div>';
-                });
-                
-                html += '</div>';
-                results.innerHTML = html;
-            }
-        </script>
-    </body>
-    </html>
-    '''
-    return HTMLResponse(content=html_content)
-
-@app.post("/check")
-async def check_bvb(request: Request):
-    """Check BVB/LHB eligibility for given ICD codes"""
+async def root(request: Request):
+    """Main UI page (static/index.html; revalidated via ETag)"""
+    return asset_response(static_assets().index, request)
+
+@app.get("/static/{name}")
+async def static_file(name: str, request: Request):
+    """CSS/JS with content hash in the name; cacheable for a year"""
+    asset = static_assets().get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+    return asset_response(asset, request)
+
+def rules_export(index: IcdIndex) -> Asset:
+    """The active list as JSON, built and compressed once per loaded list"""
+    global _rules_export
+    cached_index, asset = _rules_export
+    if cached_index is index:
+        return asset
+    content = {
+        "source_version": index.version,
+        "rules": [asdict(index[icd]) for icd in sorted(index)],
+    }
+    body = orjson.dumps(content) if orjson is not None else json.dumps(content, ensure_ascii=False).encode("utf-8")
+    asset = make_asset(body, "application/json")
+    _rules_export = (index, asset)
+    return asset
+
+@app.get("/rules")
+async def rules_export_endpoint(request: Request):
+    """Read-only export of the active diagnosis list (ETag changes with the list)"""
+    asset = await run_in_threadpool(rules_export, rules_dict)
+    return asset_response(asset, request)
+
+
+@app.post("/check", response_model=Union[CheckResponse, KbvCheckResponse], response_class=FastJSONResponse)
+async def check_bvb(payload: CheckRequest, request: Request):
+    """Check BVB/LHB eligibility for given ICD codes, or a patient against rules.json"""
+    # Body lesen + validieren ist vor dem Handler passiert (Startzeit von MetricsMiddleware)
+    t0 = time.perf_counter()
+    started = getattr(request.state, "started", None)
+    if started is not None:
+        CHECK_STAGE.observe(t0 - started, "parse")
+    if payload.patient is not None:
+        return check_patient(payload, t0)
+    
+    # Parse ICDs
+    patient_icds, invalid_icds = parse_icds(payload.icds_text())
+    t1 = time.perf_counter()
+    CHECK_STAGE.observe(t1 - t0, "normalize")
+    
+    if not patient_icds:
+        detail = "Keine gültigen ICD-Codes eingegeben"
+        if invalid_icds:
+            detail += f" (ungültig: {', '.join(invalid_icds[:10])})"
+        raise HTTPException(status_code=400, detail=detail)
+    
+    # Liste wählen und Cache prüfen (gleiche ICDs + Monate seit Akutereignis + Version = gleiche Antwort)
+    today = date.today()
+    try:
+        rules = rules_dict if payload.as_of is None else rules_store.at(payload.as_of)
+    except LookupError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    generation = result_cache.generation
+    cache_key = result_cache_key(patient_icds, payload.acute_event_date, today, rules.version)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return serialize_check(audit_check({**cached, "invalid_icds": invalid_icds}, payload, rules.version))
+    
+    # Evaluate
+    t2 = time.perf_counter()
+    ctx = PatientContext(icds=patient_icds, acute_event_date=payload.acute_event_date)
+    if profiler.enabled:
+        results = profiler.call(evaluate_patient, ctx, rules, today)
+    else:
+        results = evaluate_patient(ctx, rules, today=today)
+    
+    # Format response und Zusammenfassung in einem Durchlauf
+    items = []
+    bvb_count = lhb_count = total_eligible = 0
+    for r in results:
+        items.append({
+            "icd": r.icd,
+            "eligible": r.eligible,
+            "kind": r.kind,
+            "explain": r.explain,
+            "conditions_met": r.conditions_met,
+            "missing": r.missing,
+            "source_version": r.source_version,
+            "secondary_icd": r.secondary_icd,
+            "suggestions": r.suggestions,
+        })
+        if r.kind == "BVB":
+            bvb_count += 1
+        elif r.kind == "LHB":
+            lhb_count += 1
+        if r.eligible:
+            total_eligible += 1
+    CHECK_STAGE.observe(time.perf_counter() - t2, "evaluate")
+    response_data = {
+        "icds_input": patient_icds,
+        "results": items,
+        "summary": {"bvb_count": bvb_count, "lhb_count": lhb_count, "total_eligible": total_eligible},
+    }
+    
+    result_cache.put(cache_key, response_data, generation)
+    return serialize_check(audit_check({**response_data, "invalid_icds": invalid_icds}, payload, rules.version))
+
+def audit_check(content: Dict[str, Any], payload: CheckRequest, source_version: str) -> Dict[str, Any]:
+    """Queue the /check answer for the audit log (no I/O here) and pass it through."""
+    audit_log.record("icds", content["icds_input"], source_version, content["summary"]["total_eligible"] > 0,
+                     content, payload.acute_event_date, payload.as_of)
+    return content
+
+def check_patient(payload: CheckRequest, t0: float) -> FastJSONResponse:
+    """/check with a "patient" object: match against the rules.json index"""
+    patient = payload.patient
+    patient_icds, invalid_icds = parse_icds(patient.icds_text())
+    t1 = time.perf_counter()
+    CHECK_STAGE.observe(t1 - t0, "normalize")
+    if not patient_icds:
+        raise HTTPException(status_code=400, detail="Keine gültigen ICD-Codes eingegeben")
+
+    profile = PatientProfile(
+        icd10_codes=patient_icds,
+        age=patient.age,
+        sex=patient.sex,
+        diagnosegruppe=patient.diagnosegruppe,
+        heilmittelbereich=patient.heilmittelbereich,
+        acute_event_date=patient.acute_event_date or payload.acute_event_date,
+    )
+    result = match_patient(profile, kbv_rules, date.today())
+    matched = [{
+        "rule_id": m.rule.id,
+        "title": m.rule.title,
+        "diagnosegruppe": m.rule.diagnosegruppe,
+        "heilmittelbereich": m.rule.heilmittelbereich,
+        "evidence": m.rule.evidence,
+        "icd": m.icd,
+        "secondary_icd": m.secondary_icd,
+    } for m in result.matched]
+    CHECK_STAGE.observe(time.perf_counter() - t1, "evaluate")
+    content = {
+        "eligible": result.eligible,
+        "matched": matched,
+        "kbv_version_date": result.kbv_version_date,
+        "missing_fields": result.missing_fields,
+        "warnings": result.warnings,
+        "icds_input": patient_icds,
+        "invalid_icds": invalid_icds,
+    }
+    # Ohne Alter/Geschlecht: nur die Angaben, die die Prüfung braucht, stehen in der Antwort
+    audit_log.record("patient", patient_icds, result.kbv_version_date, result.eligible, content,
+                     profile.acute_event_date)
+    return serialize_check(content)
+
+@app.get("/search", response_model=SearchResponse, response_class=FastJSONResponse)
+async def search_rules(q: str = "", k: int = Query(10, ge=1, le=100)):
+    """Typeahead search over ICD, title, group and notes of the current list"""
+    index = search_index
+    if index is None:
+        raise HTTPException(status_code=503, detail="Diagnoseliste noch nicht geladen")
+    hits, total = index.search(q, k)
+    return FastJSONResponse({
+        "query": q,
+        "total": total,
+        "results": [{
+            "icd": hit.rule.icd,
+            "title": hit.rule.title,
+            "group": hit.rule.group,
+            "eligibility": hit.rule.eligibility,
+            "notes": hit.rule.notes,
+            "score": hit.score,
+        } for hit in hits],
+        "source_version": index.version,
+    })
+
+@app.get("/audit", response_model=AuditResponse, response_class=FastJSONResponse)
+async def audit_query(request: Request, start: Optional[date] = Query(None, alias="from"),
+                      end: Optional[date] = Query(None, alias="to"), icd: str = "",
+                      limit: int = Query(100, ge=1, le=1000), before: str = ""):
+    """Logged /check answers from..to (inclusive), optionally for one ICD; newest first"""
+    require_admin(request)
+    if not audit_log.running:
+        raise HTTPException(status_code=404, detail="Prüfprotokoll ist nicht aktiv (AUDIT_DB)")
+    code = None
+    if icd:
+        codes, _ = parse_icds(icd)
+        if len(codes) != 1:
+            raise HTTPException(status_code=400, detail=f"Genau ein gültiger ICD-Code erwartet: {icd}")
+        code = codes[0]
+    try:
+        cursor = parse_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Ungültiger Wert für before: {before}")
+    # Noch wartende Einträge mitnehmen, dann lesen (blockierend, daher im Threadpool)
+    await run_in_threadpool(audit_log.flush)
+    records, next_cursor = await run_in_threadpool(audit_log.query, start, end, code, limit, cursor)
+    return FastJSONResponse({
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+        "icd": code,
+        "count": len(records),
+        "records": records,
+        # Für die nächste Seite als before übergeben
+        "next_before": format_cursor(next_cursor),
+    })
+
+def serialize_check(content) -> FastJSONResponse:
+    started = time.perf_counter()
+    # JSONResponse rendert bereits im Konstruktor
+    response = FastJSONResponse(content)
+    CHECK_STAGE.observe(time.perf_counter() - started, "serialize")
+    return response
+
+def parse_as_of(value):
+    """Optional as-of date (e.g. prescription date) for evaluating against an earlier list"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Ungültiges Datum für as_of: {value}")
+
+def parse_patient(entry: Dict[str, Any]) -> PatientContext:
+    """Build a PatientContext from one batch entry (ICDs as string or list)."""
+    icds = entry.get("icds", "")
+    if isinstance(icds, list):
+        icds = " ".join(str(i) for i in icds)
+    acute_event_date = None
+    if entry.get("acute_event_date"):
+        try:
+            acute_event_date = date.fromisoformat(entry["acute_event_date"])
+        except (TypeError, ValueError):
+            pass
+    return PatientContext(icds=normalize_icds(icds), acute_event_date=acute_event_date)
+
+@app.post("/check/batch")
+async def check_bvb_batch(request: Request):
+    """Check many patients in one request, results in column-oriented form"""
+    started = time.perf_counter()
+    # Bewusst ohne Pydantic-Modell (100 000 Patienten), aber ungültiges JSON ist wie bei /check ein 422
     try:
         data = await request.json()
-        icds_input = data.get("icds", "")
-        acute_event_date_str = data.get("acute_event_date")
-        
-        # Parse ICDs
-        patient_icds = normalize_icds(icds_input)
-        
-        if not patient_icds:
-            raise HTTPException(status_code=400, detail="Keine gültigen ICD-Codes eingegeben")
-        
-        # Parse acute event date
-        acute_event_date = None
-        if acute_event_date_str:
-            try:
-                acute_event_date = date.fromisoformat(acute_event_date_str)
-            except ValueError:
-                pass
-        
-        # Create patient context
-        ctx = PatientContext(
-            icds=patient_icds,
-            acute_event_date=acute_event_date
-        )
-        
-        # Evaluate
-        results = evaluate_patient(ctx, rules_dict, today=date.today())
-        
-        # Format response
-        response_data = {
-            "icds_input": patient_icds,
-            "results": [
-                {
-                    "icd": r.icd,
-                    "eligible": r.eligible,
-                    "kind": r.kind,
-                    "explain": r.explain,
-                    "conditions_met": r.conditions_met,
-                    "missing": r.missing,
-                    "source_version": r.source_version
-                }
-                for r in results
-            ],
-            "summary": {
-                "bvb_count": len([r for r in results if r.kind == "BVB"]),
-                "lhb_count": len([r for r in results if r.kind == "LHB"]),
-                "total_eligible": len([r for r in results if r.eligible])
-            }
-        }
-        
-        return response_data
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Ungültiges JSON: {e}")
+    patients = data.get("patients") if isinstance(data, dict) else None
+    if not isinstance(patients, list) or not patients:
+        raise HTTPException(status_code=400, detail="Feld 'patients' muss eine nicht-leere Liste sein")
+    if len(patients) > MAX_BATCH_PATIENTS:
+        raise HTTPException(status_code=413, detail=f"Maximal {MAX_BATCH_PATIENTS} Patienten pro Anfrage")
+
+    try:
+        ctxs = [parse_patient(p) for p in patients]
+    except AttributeError:
+        raise HTTPException(status_code=400, detail="Jeder Patient muss ein Objekt sein")
+    default_as_of = parse_as_of(data.get("as_of"))
+    as_of = [parse_as_of(p.get("as_of")) or default_as_of for p in patients]
+    parsed = time.perf_counter()
+
+    # Bis zu MAX_BATCH_PATIENTS Patienten: im Threadpool, damit die Event-Loop andere Anfragen weiter bedient
+    try:
+        if any(as_of):
+            batch = await run_in_threadpool(evaluate_patients, ctxs, rules_store, date.today(), as_of)
+        else:
+            batch = await run_in_threadpool(evaluate_patients, ctxs, rules_dict, date.today())
+    except LookupError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    ids = [p.get("id", i) for i, p in enumerate(patients)]
+
+    bvb_count = lhb_count = total_eligible = 0
+    for kind in batch.kind:
+        if kind == "BVB":
+            bvb_count += 1
+        elif kind == "LHB":
+            lhb_count += 1
+        if kind is not None:
+            total_eligible += 1
+
+    total_ms = (time.perf_counter() - started) * 1000.0
+    return FastJSONResponse({
+        "n_patients": batch.n_patients,
+        "n_results": len(batch),
+        "columns": {
+            "patient_id": [ids[i] for i in batch.patient],
+            "icd": batch.icd,
+            "eligible": batch.eligible,
+            "kind": batch.kind,
+            "conditions_met": [decode_conditions(c) for c in batch.conditions],
+            "missing": batch.missing,
+            "explain": batch.explain,
+            "source_version": batch.source_version,
+            "secondary_icd": batch.secondary_icd,
+        },
+        "summary": {
+            "bvb_count": bvb_count,
+            "lhb_count": lhb_count,
+            "total_eligible": total_eligible,
+        },
+        "timing": {
+            "parse_ms": round((parsed - started) * 1000.0, 3),
+            "evaluate_ms": round(batch.elapsed_ms, 3),
+            "total_ms": round(total_ms, 3),
+            "patients_per_second": round(batch.n_patients / (total_ms / 1000.0)) if total_ms > 0 else None,
+        },
+    })
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that may keep reading the request body while it sends.
+
+    Starlette's StreamingResponse listens for client disconnects via receive(),
+    which would swallow the upload chunks that /check/stream is still reading.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, (bytes, memoryview)):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+async def request_lines(request: Request):
+    """Yield the lines of a (chunked) upload as they arrive, grouped per received chunk."""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if lines:
+            yield [line.decode("utf-8", errors="replace") for line in lines]
+    if pending:
+        yield [pending.decode("utf-8", errors="replace")]
+
+@app.post("/check/stream")
+async def check_bvb_stream(request: Request, format: str = "", output_format: str = ""):
+    """Check an NDJSON/CSV upload line by line and stream the results back"""
+    content_type = request.headers.get("content-type", "")
+    in_fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    out_fmt = output_format or in_fmt
+    if in_fmt not in bvb_bulk.FORMATS or out_fmt not in bvb_bulk.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format muss eines von {bvb_bulk.FORMATS} sein")
+
+    parser = bvb_bulk.RowParser(in_fmt)
+    writer = bvb_bulk.make_writer(out_fmt)
+    today = date.today()
+    # Eine Liste für den ganzen Upload, auch wenn währenddessen neu geladen wird
+    rules = rules_dict
+
+    async def body():
+        yield writer.header()
+        async for lines in request_lines(request):
+            out = []
+            for line in lines:
+                parsed = bvb_bulk.read_row(parser, line)
+                if parsed is not None:
+                    out.append(writer.row(bvb_bulk.evaluate_row(parsed, rules, today)))
+            if out:
+                yield "".join(out)
+        tail = bvb_bulk.read_tail(parser)
+        if tail is not None:
+            yield writer.row(bvb_bulk.evaluate_row(tail, rules, today))
+
+    return DuplexStreamingResponse(body(), media_type=writer.media_type)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics (text format)"""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+def collect_app_metrics():
+    info = rules_info
+    yield from snapshot("bvb_rules_info", "Aktive Diagnoseliste (Version, Quelle)",
+                        [({"version": info.get("version", ""), "source": info.get("source", "")}, 1)])
+    yield from snapshot("bvb_rules_loaded", "Anzahl geladener ICD-Einträge", [({}, info.get("rules_loaded", 0))])
+    yield from snapshot("bvb_kbv_rules_loaded", "Regeln aus rules.json mit Primär-ICD",
+                        [({}, info.get("rules_json", {}).get("rules", 0))])
+    yield from snapshot("bvb_rules_versions", "Anzahl Listenversionen im Speicher", [({}, len(info.get("versions", [])))])
+    yield from snapshot("bvb_rules_load_duration_seconds", "Dauer des letzten Ladens der Diagnoseliste",
+                        [({}, info.get("load_seconds", 0.0))])
+    yield from snapshot("bvb_rules_loaded_timestamp_seconds", "Zeitpunkt des letzten Ladens (Unix-Zeit)",
+                        [({}, info.get("loaded_at_ts", 0.0))])
+    cache = result_cache.stats()
+    yield from snapshot("bvb_result_cache_size", "Einträge im /check-Cache", [({}, cache["size"])])
+    yield from snapshot("bvb_result_cache_maxsize", "Maximale Größe des /check-Caches", [({}, cache["maxsize"])])
+    for name in ("hits", "misses", "evictions"):
+        yield from snapshot(f"bvb_result_cache_{name}_total", f"/check-Cache: {name}", [({}, cache[name])], "counter")
+    audit = audit_log.stats()
+    yield from snapshot("bvb_audit_pending", "Wartende Einträge des Prüfprotokolls", [({}, audit["pending"])])
+    for name in ("written", "dropped", "errors"):
+        yield from snapshot(f"bvb_audit_{name}_total", f"Prüfprotokoll: {name}", [({}, audit[name])], "counter")
+    yield from snapshot("bvb_profiler_enabled", "Stichproben-Profiler aktiv", [({}, int(profiler.enabled))])
+
+metrics.add_collector(collect_app_metrics)
+
+@app.get("/admin/profile")
+async def admin_profile_report(request: Request, limit: int = 30, sort: ProfileSort = "cumulative",
+                               format: str = "text"):
+    """Profile of the sampled evaluate_patient calls (text, or raw pstats with format=pstats)"""
+    require_admin(request)
+    if format == "pstats":
+        if not profiler.samples:
+            raise HTTPException(status_code=404, detail="Noch keine Profildaten")
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "evaluate_patient.prof")
+            profiler.dump(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        return Response(data, media_type="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=evaluate_patient.prof"})
+    return Response(profiler.report(limit, sort), media_type="text/plain; charset=utf-8")
+
+@app.post("/admin/profile")
+async def admin_profile_toggle(request: Request, every: int = 100):
+    """Start sampling every n-th evaluate_patient call (every=0 stops, data stays readable)"""
+    require_admin(request)
+    if every > 0:
+        profiler.start(every)
+    else:
+        profiler.stop()
+    return {"enabled": profiler.enabled, "every": profiler.every, "samples": profiler.samples}
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    stats = {"BVB": 0, "LHB": 0, "NONE": 0}
-    for rule in rules_dict.values():
-        stats[rule.eligibility] = stats.get(rule.eligibility, 0) + 1
-    
+    info = rules_info
     return {
         "status": "healthy",
-        "rules_loaded": len(rules_dict),
-        "distribution": stats,
+        "rules_loaded": info.get("rules_loaded", 0),
+        "distribution": info.get("distribution", {}),
+        "rules_version": info.get("version"),
+        "rules_source": info.get("source"),
+        "rules_loaded_at": info.get("loaded_at"),
+        "rules_versions": info.get("versions", []),
+        "rules_json": info.get("rules_json", {}),
+        "search": info.get("search", {}),
+        "result_cache": result_cache.stats(),
+        "audit": audit_log.stats(),
         "version": "1.0.0"
     }
 
 def open_browser():
     """Open browser after short delay"""
+    import webbrowser
     time.sleep(2)
     webbrowser.open("http://127.0.0.1:8000")
 
 def run_server():
     """Run the FastAPI server"""
+    import uvicorn
+
     # Start browser in background
     threading.Thread(target=open_browser, daemon=True).start()
     
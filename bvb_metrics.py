@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Metriken und Profiling
+Zähler und Histogramme im Prometheus-Textformat (ohne prometheus_client),
+eine ASGI-Middleware für Anfragezahlen/-dauer und ein Profiler, der zur
+Laufzeit jeden n-ten Aufruf von evaluate_patient mit cProfile misst.
+
+Jeder Prozess zählt für sich; mit mehreren Workern (bvb_server.py) liefert
+/metrics die Werte des Workers, der die Anfrage beantwortet.
+"""
+
+import io
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Sekunden; /check liegt typischerweise im Bereich 50µs-5ms
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+# ----------------- Metrics -----------------
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # je Labelkombination: [Anzahl je Bucket (nicht kumuliert) + Überlauf, Summe]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+def snapshot(name: str, help: str, samples: Iterable[Tuple[Dict[str, str], float]], kind: str = "gauge") -> List[str]:
+    """Lines for a metric whose value is read at scrape time (gauge, or a counter kept elsewhere)."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+    return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[str]]) -> None:
+        """Register a callback that yields lines at scrape time (gauges)."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+# ----------------- ASGI middleware -----------------
+
+class MetricsMiddleware:
+    """Counts requests by path/status and observes their duration.
+
+    Stores the start time in scope["state"]["started"], so handlers can
+    measure the time spent before they run (body parsing and validation).
+    Paths outside known_paths are counted as "other" to bound the label set.
+    """
+
+    def __init__(self, app, requests: Counter, duration: Histogram, known_paths: Callable[[], Iterable[str]]):
+        self.app = app
+        self.requests = requests
+        self.duration = duration
+        self._known_paths = known_paths
+        self._paths: Optional[frozenset] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        scope.setdefault("state", {})["started"] = started
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if self._paths is None:
+                self._paths = frozenset(self._known_paths())
+            path = scope["path"] if scope["path"] in self._paths else "other"
+            self.requests.inc(path, scope["method"], str(status))
+            self.duration.observe(time.perf_counter() - started, path)
+
+# ----------------- Sampling profiler -----------------
+
+# Sortierschlüssel, die pstats annimmt (für /admin/profile?sort=)
+ProfileSort = Literal["calls", "cumtime", "cumulative", "filename", "line", "module", "name", "ncalls", "nfl",
+                      "pcalls", "stdname", "time", "tottime"]
+
+class SamplingProfiler:
+    """Profiles every n-th call with cProfile; off by default, switchable at runtime.
+
+    Only one sampled call runs under the profiler at a time; concurrent
+    calls are simply not sampled, so the hot path never waits for it.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.every = 0
+        self.calls = 0
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        # cProfile.Profile; cProfile/pstats werden erst beim Einschalten geladen
+        self._profile = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.active
+
+    def start(self, every: int) -> None:
+        import cProfile
+        self.every, self.calls, self.samples = max(1, every), 0, 0
+        self._profile = cProfile.Profile()
+        self.started_at = time.time()
+        self.active = True
+
+    def stop(self) -> None:
+        """Stop sampling; the collected profile stays available for report()/dump()."""
+        self.active = False
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs), profiled if this call is sampled."""
+        self.calls += 1
+        if not self.active or self.calls % self.every or not self._lock.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        try:
+            self.samples += 1
+            return self._profile.runcall(fn, *args, **kwargs)
+        finally:
+            self._lock.release()
+
+    def report(self, limit: int = 30, sort: ProfileSort = "cumulative") -> str:
+        if self._profile is None or not self.samples:
+            return "Keine Profildaten (Profiler aus oder noch keine Stichprobe)\n"
+        import pstats
+        out = io.StringIO()
+        with self._lock:
+            stats = pstats.Stats(self._profile, stream=out)
+        out.write(f"pid {os.getpid()}: {self.samples} von {self.calls} Aufrufen gemessen (jeder {self.every}.)\n")
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump(self, path: str) -> None:
+        """Write the raw profile (pstats format, e.g. for snakeviz)."""
+        with self._lock:
+            self._profile.dump_stats(path)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - API-Modelle
+Typisierte Anfrage- und Antwortmodelle für /check (ICD-Liste bzw. Patient
+nach rules.json-Schema) und /search. Die Anfrage wird von
+FastAPI validiert (ungültige Eingaben -> 422), die Antwortmodelle
+beschreiben das Schema in /docs; serialisiert wird direkt mit orjson.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field, field_validator
+
+def _empty_to_none(value):
+    # Leeres Feld aus dem Formular = nicht angegeben
+    return None if value == "" else value
+
+class PatientRequest(BaseModel):
+    """Patient for the rules.json engine (see API_Quicksheet.md)"""
+    icd10_codes: Union[str, List[str]] = []
+    age: Optional[int] = Field(None, ge=0, le=130)
+    sex: Optional[str] = None
+    diagnosegruppe: str = ""
+    heilmittelbereich: str = ""
+    acute_event_date: Optional[date] = None
+
+    _empty = field_validator("age", "sex", "acute_event_date", mode="before")(_empty_to_none)
+
+    def icds_text(self) -> str:
+        return self.icd10_codes if isinstance(self.icd10_codes, str) else " ".join(self.icd10_codes)
+
+class CheckRequest(BaseModel):
+    icds: Union[str, List[str]] = ""
+    acute_event_date: Optional[date] = None
+    # Verordnungsdatum für die Prüfung gegen eine frühere Diagnoseliste
+    as_of: Optional[date] = None
+    # Statt icds: Prüfung gegen rules.json mit Alter, Geschlecht, Heilmittelbereich
+    patient: Optional[PatientRequest] = None
+
+    _empty = field_validator("acute_event_date", "as_of", mode="before")(_empty_to_none)
+
+    def icds_text(self) -> str:
+        return self.icds if isinstance(self.icds, str) else " ".join(self.icds)
+
+class CheckResult(BaseModel):
+    icd: str
+    eligible: bool
+    kind: Optional[str]
+    explain: str
+    conditions_met: Dict[str, bool]
+    missing: List[str]
+    source_version: str
+    secondary_icd: Optional[str] = None
+    # Nur bei nicht gelisteten ICDs: ähnliche gelistete Codes (Tippfehler)
+    suggestions: List[str] = []
+
+class CheckSummary(BaseModel):
+    bvb_count: int
+    lhb_count: int
+    total_eligible: int
+
+class CheckResponse(BaseModel):
+    icds_input: List[str]
+    results: List[CheckResult]
+    summary: CheckSummary
+    invalid_icds: List[str] = []
+
+class KbvMatchResult(BaseModel):
+    rule_id: str
+    title: str
+    diagnosegruppe: str
+    heilmittelbereich: str
+    evidence: str
+    icd: str
+    secondary_icd: Optional[str] = None
+
+class KbvCheckResponse(BaseModel):
+    eligible: bool
+    matched: List[KbvMatchResult]
+    kbv_version_date: str
+    missing_fields: List[str]
+    warnings: List[str]
+    icds_input: List[str] = []
+    invalid_icds: List[str] = []
+
+class SearchHitResult(BaseModel):
+    icd: str
+    title: str
+    group: str
+    eligibility: str
+    notes: str
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    results: List[SearchHitResult]
+    source_version: str
+
+class AuditRecord(BaseModel):
+    id: int
+    ts: str
+    mode: str                       # "icds" oder "patient"
+    icds: List[str]
+    acute_event_date: Optional[str] = None
+    as_of: Optional[str] = None
+    source_version: str
+    eligible: bool
+    # Antwort von /check, wie sie ausgeliefert wurde
+    response: Dict[str, Any]
+
+class AuditResponse(BaseModel):
+    from_: Optional[str] = Field(None, alias="from")
+    to: Optional[str] = None
+    icd: Optional[str] = None
+    count: int
+    records: List[AuditRecord]
+    # Cursor (Zeitpunkt:id) für die nächste Seite
+    next_before: Optional[str] = None
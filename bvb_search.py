@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Volltextsuche
+Invertierter Index über ICD, Titel, Diagnosegruppe und Hinweis der
+Diagnoseliste für die Suche beim Tippen ("Hemipar" -> G81.x, "Huft" ->
+"Hüft..."). Wird einmal je geladener Liste in load_rules gebaut und danach
+nur gelesen; eine Anfrage kostet je Suchwort eine Bisektion in der
+sortierten Wortliste plus den Schnitt der Trefferlisten.
+
+Normalisierung: Kleinschreibung, ä/ö/ü -> ae/oe/ue, ß -> ss, übrige
+Akzente entfernt ("Hüfte", "Huefte" und "HÜFTE" finden dasselbe).
+"""
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from rule_engine import RuleRow
+
+# Gewicht je Feld; ein Wort zählt mit dem höchsten Feld, in dem es vorkommt
+FIELD_WEIGHTS = {"icd": 8.0, "title": 4.0, "related": 3.0, "group": 2.0, "notes": 1.0}
+# Vollständiges Wort vor Wortanfang vor Wortteil (Komposita: "parese" in "hemiparese")
+EXACT, PREFIX, INFIX = 1.0, 0.6, 0.3
+# Ab dieser Länge werden Suchwörter ohne Präfix-Treffer auch innerhalb von Wörtern gesucht
+INFIX_MIN = 4
+# Trefferlisten für Suchwörter bis zu dieser Länge werden je Index gemerkt (erste Tastendrücke)
+MEMO_MAX_LEN = 2
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+# "I63.9" bleibt ein Wort, "70. Lebensjahr" ergibt "70"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+def normalize(text: str) -> str:
+    """Lower-case, umlauts/ß spelled out, remaining accents stripped."""
+    text = (text or "").lower().translate(_UMLAUTS)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return text
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    rule: RuleRow
+    score: float
+
+class SearchIndex:
+    """Inverted index over the listed rules for ranked prefix search.
+
+    related optionally yields further texts per code (e.g. rules.json
+    titles such as "Hemiparese nach Schlaganfall"), indexed with their own
+    weight.
+    """
+
+    def __init__(self, rules: Mapping[str, RuleRow],
+                 related: Optional[Callable[[str], Iterable[str]]] = None):
+        self._rules: List[RuleRow] = [rules[icd] for icd in sorted(rules)]
+        # Listenversion (IcdIndex.version), damit Treffer und Version aus demselben Stand kommen
+        self.version: str = getattr(rules, "version", "")
+        postings: Dict[str, Dict[int, float]] = {}
+
+        def add(doc: int, text: str, weight: float) -> None:
+            for term in tokenize(text):
+                entry = postings.setdefault(term, {})
+                if entry.get(doc, 0.0) < weight:
+                    entry[doc] = weight
+
+        for doc, rule in enumerate(self._rules):
+            code = normalize(rule.icd)
+            add(doc, code, FIELD_WEIGHTS["icd"])
+            # "I639" ohne Punkt findet I63.9
+            add(doc, code.replace(".", ""), FIELD_WEIGHTS["icd"])
+            add(doc, rule.title, FIELD_WEIGHTS["title"])
+            add(doc, rule.group, FIELD_WEIGHTS["group"])
+            add(doc, rule.notes, FIELD_WEIGHTS["notes"])
+            if related is not None:
+                for text in related(rule.icd):
+                    add(doc, text, FIELD_WEIGHTS["related"])
+
+        self._postings: Dict[str, Tuple[Tuple[int, float], ...]] = {
+            term: tuple(entry.items()) for term, entry in postings.items()
+        }
+        self._terms: List[str] = sorted(self._postings)
+        self._memo: Dict[str, Dict[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    @property
+    def terms(self) -> int:
+        return len(self._terms)
+
+    def _token_hits(self, token: str) -> Dict[int, float]:
+        """doc -> best score of any indexed word starting with (or, as fallback, containing) token."""
+        memo = len(token) <= MEMO_MAX_LEN
+        if memo and token in self._memo:
+            return self._memo[token]
+        hits: Dict[int, float] = {}
+        terms = self._terms
+        for i in range(bisect_left(terms, token), len(terms)):
+            term = terms[i]
+            if not term.startswith(token):
+                break
+            factor = EXACT if term == token else PREFIX
+            for doc, weight in self._postings[term]:
+                score = weight * factor
+                if score > hits.get(doc, 0.0):
+                    hits[doc] = score
+        if not hits and len(token) >= INFIX_MIN:
+            for term in terms:
+                if token in term:
+                    for doc, weight in self._postings[term]:
+                        score = weight * INFIX
+                        if score > hits.get(doc, 0.0):
+                            hits[doc] = score
+        if memo:
+            self._memo[token] = hits
+        return hits
+
+    def search(self, query: str, k: int = 10) -> Tuple[List[SearchHit], int]:
+        """Top k rules containing every query word (as word prefix), and the number of matches."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or k <= 0:
+            return [], 0
+        scores: Optional[Dict[int, float]] = None
+        # Längste Wörter zuerst: wenigste Treffer, der Schnitt bleibt klein
+        for token in sorted(tokens, key=len, reverse=True):
+            hits = self._token_hits(token)
+            if scores is None:
+                scores = dict(hits)
+            else:
+                scores = {doc: score + hits[doc] for doc, score in scores.items() if doc in hits}
+            if not scores:
+                return [], 0
+        # Gleichstand: Listenreihenfolge (nach Code)
+        top = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [SearchHit(self._rules[doc], round(score, 3)) for doc, score in top], len(scores)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Serverbetrieb (headless, mehrere Worker)
+Für den zentralen Betrieb hinter nginx: kein Browser, Host/Port/Worker
+konfigurierbar. Die Diagnoseliste wird einmal im Supervisor geladen, danach
+werden die Worker per fork gestartet und teilen sich die Regeltabelle
+copy-on-write. SIGTERM/SIGINT beenden alle Worker geordnet, SIGHUP lädt die
+Diagnoseliste in allen Workern neu.
+
+Aufruf:
+    python bvb_server.py --host 0.0.0.0 --port 8000 --workers 4
+    BVB_WORKERS=4 python bvb_server.py
+"""
+
+import argparse
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+import bvb_main_app
+
+# nginx hält Upstream-Verbindungen bis zu 60s offen; der Worker muss länger warten
+DEFAULT_KEEP_ALIVE = 75
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
+def make_config(args) -> uvicorn.Config:
+    return uvicorn.Config(
+        bvb_main_app.app,
+        host=args.host,
+        port=args.port,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        backlog=args.backlog,
+        limit_concurrency=args.limit_concurrency,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        access_log=args.access_log,
+        log_level=args.log_level,
+    )
+
+# ----------------- Worker -----------------
+
+def _reload_in_worker(signum, frame):
+    # Nicht im Signal-Handler laden: der Hauptthread könnte gerade selbst die Sperre halten
+    threading.Thread(target=_reload_quietly, name="rules-reload", daemon=True).start()
+
+def _reload_quietly():
+    try:
+        bvb_main_app.reload_rules()
+    except Exception as e:
+        print(f"⚠️ [{os.getpid()}] Neue Diagnoseliste verworfen, alte bleibt aktiv: {e}")
+
+def run_worker(config: uvicorn.Config, sock, supervisor_pid: int) -> None:
+    """Body of a forked worker; never returns."""
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_DFL)
+    bvb_main_app.supervisor_pid = supervisor_pid
+    signal.signal(signal.SIGHUP, _reload_in_worker)
+    code = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        code = 1
+    finally:
+        os._exit(code)
+
+# ----------------- Supervisor -----------------
+
+class Supervisor:
+    """Forks the workers, replaces crashed ones and forwards signals."""
+
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+        self.sock = None
+
+    def spawn(self) -> None:
+        # Die Reload-Sperre beim fork halten, damit kein Worker eine gesperrte Kopie erbt
+        with bvb_main_app._reload_lock:
+            pid = os.fork()
+        if pid == 0:
+            run_worker(self.config, self.sock, os.getppid())
+        self.children[pid] = time.monotonic()
+
+    def signal_children(self, sig: int) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def reload_all(self) -> None:
+        """Reload in the supervisor (for future workers), then in every worker."""
+        try:
+            bvb_main_app.reload_rules()
+        except Exception as e:
+            print(f"⚠️ Neue Diagnoseliste verworfen, alte bleibt aktiv: {e}")
+            return
+        self.signal_children(signal.SIGHUP)
+
+    def _on_stop(self, signum, frame):
+        if not self.stopping:
+            print(f"🛑 Beende {len(self.children)} Worker (max. {self.config.timeout_graceful_shutdown}s)...")
+        self.stopping = True
+        self.signal_children(signal.SIGTERM)
+
+    def _on_hup(self, signum, frame):
+        threading.Thread(target=self.reload_all, name="rules-reload", daemon=True).start()
+
+    def run(self) -> int:
+        self.sock = self.config.bind_socket()
+        # Vorhandene Objekte (Regeltabelle) aus der GC nehmen: sonst berührt jeder
+        # GC-Lauf in den Workern die geteilten Seiten und kopiert sie
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+
+        watcher = None
+        if bvb_main_app.RULES_WATCH_INTERVAL > 0:
+            watcher = bvb_main_app.RulesWatcher(bvb_main_app.RULES_WATCH_INTERVAL, on_change=self.reload_all)
+            watcher.start()
+
+        print(f"🌐 {self.workers} Worker auf http://{self.config.host}:{self.config.port} (Supervisor {os.getpid()})")
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"⚠️ Worker {pid} beendet (Status {status}), starte neu")
+            # Sofort abstürzende Worker nicht im Kreis neu starten
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0)
+            self.spawn()
+
+        if watcher is not None:
+            watcher.stop()
+        self.sock.close()
+        print("👋 Server beendet")
+        return 0
+
+# ----------------- CLI -----------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    env = os.environ.get
+    p = argparse.ArgumentParser(description="BVB Checker ohne Browser mit mehreren Worker-Prozessen")
+    p.add_argument("--host", default=env("BVB_HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(env("BVB_PORT", "8000")))
+    p.add_argument("--workers", type=int, default=int(env("BVB_WORKERS", str(os.cpu_count() or 1))))
+    p.add_argument("--keep-alive", type=int, default=int(env("BVB_KEEP_ALIVE", str(DEFAULT_KEEP_ALIVE))),
+                   help="Sekunden, die eine Keep-Alive-Verbindung offen bleibt")
+    p.add_argument("--graceful-timeout", type=int,
+                   default=int(env("BVB_GRACEFUL_TIMEOUT", str(DEFAULT_GRACEFUL_TIMEOUT))),
+                   help="Sekunden für laufende Anfragen beim Beenden")
+    p.add_argument("--backlog", type=int, default=2048)
+    p.add_argument("--limit-concurrency", type=int, help="Max. gleichzeitige Verbindungen pro Worker (503 darüber)")
+    p.add_argument("--forwarded-allow-ips", default=env("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                   help="Proxies, deren X-Forwarded-* übernommen wird (nginx)")
+    p.add_argument("--access-log", action="store_true", help="Jede Anfrage protokollieren")
+    p.add_argument("--log-level", default=env("LOG_LEVEL", "info").lower())
+    p.add_argument("--rules", help="Pfad zur Diagnoseliste (Standard: eingebettete CSV)")
+    args = p.parse_args(argv)
+    if args.workers < 1:
+        p.error("--workers muss >= 1 sein")
+
+    print("🏥 BVB Checker (Serverbetrieb) wird gestartet...")
+    # Vor dem fork laden: alle Worker erben dieselbe Regeltabelle
+    bvb_main_app.load_rules(args.rules)
+    config = make_config(args)
+
+    if args.workers == 1 or not hasattr(os, "fork"):
+        if args.workers > 1:
+            print("⚠️ Mehrere Worker benötigen fork (Linux/macOS) – starte einen Worker")
+        uvicorn.Server(config).run()
+        return 0
+    return Supervisor(config, args.workers).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
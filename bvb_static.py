@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BVB Checker - Statische Oberfläche
+Liest static/ einmal ein, hängt an CSS/JS einen Inhalts-Hash an
+(app.css -> app.3f2a9c1e.css, in index.html ersetzt) und legt jede Datei
+roh, gzip- und (falls das Paket brotli installiert ist) brotli-komprimiert
+im Speicher ab. Ausgeliefert wird die kleinste Fassung, die der Browser
+annimmt, mit starkem ETag; bei passendem If-None-Match kommt 304 ohne Inhalt.
+
+Dateien mit Hash im Namen ändern sich nie und dürfen ein Jahr im Cache
+bleiben; index.html und /rules haben einen festen Namen und werden bei
+jedem Aufruf per ETag nachgefragt (ein 304 kostet nur die Kopfzeilen).
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Tuple
+
+# Mit Hash im Namen: darf unbegrenzt im Cache bleiben
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Fester Name: Browser fragt jedes Mal per If-None-Match nach
+REVALIDATE = "no-cache"
+FINGERPRINTED = (".css", ".js")
+# Kleinere Dateien lohnen die Kompression nicht
+MIN_COMPRESS = 256
+
+@dataclass(frozen=True, slots=True)
+class Asset:
+    """One file with its precompressed variants: encoding -> (body, strong ETag)."""
+    content_type: str
+    cache_control: str
+    variants: Mapping[str, Tuple[bytes, str]]
+
+    @property
+    def etags(self) -> frozenset:
+        return frozenset(etag for _, etag in self.variants.values())
+
+def _brotli():
+    """The optional brotli module (15-20 % smaller than gzip), imported on first use; None if not installed."""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+def make_asset(body: bytes, content_type: str, cache_control: str = REVALIDATE) -> Asset:
+    """Compress once; each encoding gets its own strong ETag derived from the content hash."""
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+    if len(body) >= MIN_COMPRESS:
+        # mtime=0: gleiche Eingabe, gleiche Bytes (reproduzierbar)
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gz) < len(body):
+            variants["gzip"] = (gz, f'"{digest}-gz"')
+        brotli = _brotli()
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                variants["br"] = (br, f'"{digest}-br"')
+    return Asset(content_type, cache_control, variants)
+
+# ----------------- Negotiation -----------------
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}; "*" stands for codings not named."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def choose_encoding(asset: Asset, header: str) -> str:
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*")
+    # Kleinste Fassung zuerst; identity ist erlaubt, solange nicht ausdrücklich q=0
+    for coding in ("br", "gzip"):
+        if coding in asset.variants and accepted.get(coding, wildcard or 0.0) > 0:
+            return coding
+    return "identity"
+
+def not_modified(asset: Asset, if_none_match: Optional[str]) -> bool:
+    """If-None-Match matches any variant (same content, only the encoding differs)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Vergleich wie RFC 9110 (schwach): W/-Präfix zählt nicht
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return not tags.isdisjoint(asset.etags)
+
+def response_parts(asset: Asset, headers: Mapping[str, str]) -> Tuple[int, bytes, Dict[str, str]]:
+    """(status, body, headers) for a GET with the given request headers."""
+    coding = choose_encoding(asset, headers.get("accept-encoding", ""))
+    body, etag = asset.variants[coding]
+    out = {"ETag": etag, "Cache-Control": asset.cache_control}
+    if len(asset.variants) > 1:
+        out["Vary"] = "Accept-Encoding"
+    if not_modified(asset, headers.get("if-none-match")):
+        return 304, b"", out
+    out["Content-Type"] = asset.content_type
+    if coding != "identity":
+        out["Content-Encoding"] = coding
+    return 200, body, out
+
+# ----------------- Bundle -----------------
+
+def _content_type(name: str) -> str:
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+class StaticBundle:
+    """The files of a directory, fingerprinted and precompressed, addressed by URL name."""
+
+    def __init__(self, directory: str, index: str = "index.html"):
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+        renamed: Dict[str, str] = {}
+        pages: Dict[str, bytes] = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path) or name.startswith("."):
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            stem, ext = os.path.splitext(name)
+            if ext in FINGERPRINTED:
+                hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:8]}{ext}"
+                renamed[name] = hashed
+                self.assets[hashed] = make_asset(body, _content_type(name), IMMUTABLE)
+            else:
+                pages[name] = body
+        for name, body in pages.items():
+            if name.endswith(".html"):
+                # Verweise auf die umbenannten Dateien; ändert sich CSS/JS, ändert sich auch der ETag der Seite
+                text = body.decode("utf-8")
+                for original, hashed in renamed.items():
+                    text = text.replace(f'"{original}"', f'"/static/{hashed}"')
+                body = text.encode("utf-8")
+            self.assets[name] = make_asset(body, _content_type(name), REVALIDATE)
+        if index not in self.assets:
+            raise FileNotFoundError(f"{os.path.join(directory, index)} fehlt")
+        self.index = self.assets[index]
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.assets.get(name)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: {coding: len(body) for coding, (body, _) in asset.variants.items()}
+                for name, asset in self.assets.items()}
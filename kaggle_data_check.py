@@ -24,27 +24,19 @@ def export_for_production():
     df.to_csv("/kaggle/working/diagnoseliste_for_docker.csv", index=False)
     print(f"\n✅ Exportiert nach: /kaggle/working/diagnoseliste_for_docker.csv")
     
-    # Zusätzlich: JSON-Format für Rule Engine
-    rules_data = []
-    for _, row in df.iterrows():
-        rule_dict = {
-            "icd": row.get('icd', ''),
-            "title": row.get('title', ''),
-            "group": row.get('group', ''),
-            "eligibility": row.get('eligibility', 'NONE'),
-            "requires_second_icd": row.get('requires_second_icd', False),
-            "second_icd_hint": row.get('second_icd_hint', ''),
-            "acute_window_months": row.get('acute_window_months'),
-            "notes": row.get('notes', ''),
-            "source_url": row.get('source_url', ''),
-            "source_version": row.get('source_version', '2025-01-01')
-        }
-        rules_data.append(rule_dict)
-    
-    import json
-    with open("/kaggle/working/rules.json", "w", encoding="utf-8") as f:
-        json.dump(rules_data, f, ensure_ascii=False, indent=2)
-    print(f"✅ JSON exportiert nach: /kaggle/working/rules.json")
+    # Zusätzlich: rules.json für die Rule Engine (Schema-Prüfung und Umwandlung über rules_convert.py)
+    try:
+        from rules_convert import convert
+    except ImportError:
+        print("⚠️ rules_convert.py nicht gefunden – rules.json lokal erzeugen: python rules_convert.py diagnoseliste_for_docker.csv rules.json")
+    else:
+        report = convert("/kaggle/working/diagnoseliste_for_docker.csv", "/kaggle/working/rules.json")
+        for problem in report.errors[:20]:
+            print(f"  ❌ {problem}")
+        if report.errors:
+            print(f"❌ rules.json nicht geschrieben: {len(report.errors)} Fehler")
+        else:
+            print(f"✅ JSON exportiert nach: /kaggle/working/rules.json ({report.written} Regeln)")
     
     return df
 
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vorkompilierte Diagnoseliste (Binärartefakt)
+Wandelt die Diagnoseliste-CSV (und optional rules.json) zur Build-Zeit in eine
+kompakte, versionierte Binärdatei um, die zur Laufzeit ohne pandas per mmap
+geladen wird.
+
+Aufbau (little endian):
+    Header   magic "BVBR", Formatversion, Anzahl Regeln, Offsets, SHA-256 der CSV
+    Tabelle  eine Zeile fester Länge pro Regel (String-Referenzen + Flags)
+    Pool     UTF-8-String-Pool, jeder String nur einmal
+    JSON     rules.json in kompakter Form (optional)
+
+Aufruf:
+    python rules_artifact.py build --csv diagnoseliste_extracted.csv --json rules.json -o data/diagnoseliste.bvbr
+    python rules_artifact.py info data/diagnoseliste.bvbr
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from rule_engine import RuleRow
+
+MAGIC = b"BVBR"
+FORMAT_VERSION = 1
+ARTIFACT_NAME = "diagnoseliste.bvbr"
+DEFAULT_SOURCE_VERSION = "2025-07-01"
+
+# magic, format, flags, n_rules, rows_offset, pool_offset, pool_size, json_offset, json_size, csv_sha256
+HEADER = struct.Struct("<4sHHIIIIII32s")
+STRING_FIELDS = ("icd", "title", "group", "eligibility", "second_icd_hint", "notes", "source_url", "source_version")
+# (offset, length) je String, requires_second_icd, Füllbyte, acute_window_months (-1 = keiner)
+ROW = struct.Struct("<" + "II" * len(STRING_FIELDS) + "?xh")
+NO_WINDOW = -1
+
+class ArtifactError(ValueError):
+    """Artifact is missing, truncated, of a different format version or stale."""
+
+# ----------------- CSV (ohne pandas) -----------------
+
+def _clean(value: Optional[str]) -> str:
+    return "" if value is None else value
+
+def _to_window(value: str) -> Optional[int]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else int(number)
+
+def rules_from_csv(csv_path: str) -> Dict[str, RuleRow]:
+    """Parse the Diagnoseliste CSV with the same cleaning rules as load_rules."""
+    rules: Dict[str, RuleRow] = {}
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            rule = RuleRow(
+                icd=_clean(row.get("icd")).upper().strip(),
+                title=_clean(row.get("title")),
+                group=_clean(row.get("group")),
+                eligibility=(_clean(row.get("eligibility")) or "NONE").upper(),
+                requires_second_icd=_clean(row.get("requires_second_icd")).strip().lower() in ("true", "1", "yes"),
+                second_icd_hint=_clean(row.get("second_icd_hint")),
+                acute_window_months=_to_window(_clean(row.get("acute_window_months"))),
+                notes=_clean(row.get("notes")),
+                source_url=_clean(row.get("source_url")),
+                source_version=_clean(row.get("source_version")) or DEFAULT_SOURCE_VERSION,
+            )
+            rules[rule.icd] = rule
+    return rules
+
+def file_sha256(path: str) -> bytes:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.digest()
+
+# ----------------- Build -----------------
+
+def build_artifact(csv_path: str, out_path: str, json_path: Optional[str] = None) -> Dict[str, Any]:
+    """Compile csv_path (and json_path) into out_path; returns a short summary."""
+    rules = rules_from_csv(csv_path)
+    json_bytes = b""
+    if json_path:
+        with open(json_path, encoding="utf-8") as f:
+            json_bytes = json.dumps(json.load(f), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    pool = bytearray()
+    offsets: Dict[str, Tuple[int, int]] = {}
+
+    def intern(text: str) -> Tuple[int, int]:
+        if text not in offsets:
+            data = text.encode("utf-8")
+            offsets[text] = (len(pool), len(data))
+            pool.extend(data)
+        return offsets[text]
+
+    rows = bytearray()
+    for rule in rules.values():
+        refs: List[int] = []
+        for field in STRING_FIELDS:
+            refs.extend(intern(getattr(rule, field) or ""))
+        window = NO_WINDOW if rule.acute_window_months is None else int(rule.acute_window_months)
+        rows.extend(ROW.pack(*refs, bool(rule.requires_second_icd), window))
+
+    rows_offset = HEADER.size
+    pool_offset = rows_offset + len(rows)
+    json_offset = pool_offset + len(pool)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(rules), rows_offset, pool_offset, len(pool),
+                         json_offset, len(json_bytes), file_sha256(csv_path))
+    with open(out_path, "wb") as f:
+        f.write(header)
+        f.write(rows)
+        f.write(pool)
+        f.write(json_bytes)
+    return {"rules": len(rules), "bytes": json_offset + len(json_bytes), "pool_bytes": len(pool),
+            "json_bytes": len(json_bytes)}
+
+# ----------------- Load -----------------
+
+@contextmanager
+def _mapped(path: str):
+    """mmap the artifact; decode errors (empty file, broken UTF-8/JSON, short rows) become ArtifactError."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+    except ArtifactError:
+        raise
+    except (ValueError, UnicodeDecodeError, struct.error) as e:
+        raise ArtifactError(f"Artefakt beschädigt: {e}") from e
+
+def _read_header(buf) -> Tuple:
+    if len(buf) < HEADER.size:
+        raise ArtifactError("Artefakt zu kurz")
+    header = HEADER.unpack_from(buf, 0)
+    if header[0] != MAGIC:
+        raise ArtifactError("Kein BVB-Regelartefakt (magic)")
+    if header[1] != FORMAT_VERSION:
+        raise ArtifactError(f"Formatversion {header[1]} nicht unterstützt (erwartet {FORMAT_VERSION})")
+    n_rules, rows_offset, pool_offset, pool_size, json_offset, json_size = header[3:9]
+    if rows_offset + n_rules * ROW.size > pool_offset or pool_offset + pool_size > json_offset \
+            or json_offset + json_size > len(buf):
+        raise ArtifactError("Artefakt ist abgeschnitten oder beschädigt")
+    return header
+
+def load_artifact(path: str, expected_csv_sha256: Optional[bytes] = None) -> Dict[str, RuleRow]:
+    """Load the rule table from an artifact; optionally reject it if the CSV changed since the build."""
+    with _mapped(path) as buf:
+        _, _, _, n_rules, rows_offset, pool_offset, pool_size, _, _, csv_sha256 = _read_header(buf)
+        if expected_csv_sha256 is not None and csv_sha256 != expected_csv_sha256:
+            raise ArtifactError("Artefakt ist veraltet (CSV wurde seit dem Build geändert)")
+        pool = buf[pool_offset:pool_offset + pool_size]
+        strings: Dict[Tuple[int, int], str] = {}
+        rules: Dict[str, RuleRow] = {}
+        for values in struct.iter_unpack(ROW.format, buf[rows_offset:rows_offset + n_rules * ROW.size]):
+            fields = {}
+            for i, name in enumerate(STRING_FIELDS):
+                ref = (values[2 * i], values[2 * i + 1])
+                text = strings.get(ref)
+                if text is None:
+                    text = strings[ref] = pool[ref[0]:ref[0] + ref[1]].decode("utf-8")
+                fields[name] = text
+            requires_second_icd, window = values[-2], values[-1]
+            rule = RuleRow(requires_second_icd=requires_second_icd,
+                           acute_window_months=None if window == NO_WINDOW else window, **fields)
+            rules[rule.icd] = rule
+    return rules
+
+def load_artifact_json(path: str) -> List[Dict[str, Any]]:
+    """rules.json content embedded in the artifact ([] if it was built without)."""
+    with _mapped(path) as buf:
+        header = _read_header(buf)
+        json_offset, json_size = header[7], header[8]
+        return json.loads(buf[json_offset:json_offset + json_size].decode("utf-8")) if json_size else []
+
+def artifact_info(path: str) -> Dict[str, Any]:
+    with _mapped(path) as buf:
+        header = _read_header(buf)
+        size = len(buf)
+    return {"format_version": header[1], "rules": header[3], "pool_bytes": header[6], "json_bytes": header[8],
+            "csv_sha256": header[9].hex(), "bytes": size}
+
+# ----------------- CLI -----------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Diagnoseliste in ein Binärartefakt kompilieren")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="CSV (+ rules.json) kompilieren")
+    b.add_argument("--csv", required=True)
+    b.add_argument("--json", help="rules.json zusätzlich einbetten")
+    b.add_argument("-o", "--output", default=ARTIFACT_NAME)
+    i = sub.add_parser("info", help="Header eines Artefakts anzeigen")
+    i.add_argument("path")
+    args = p.parse_args(argv)
+
+    if args.cmd == "build":
+        summary = build_artifact(args.csv, args.output, args.json)
+        print(f"✅ {args.output}: {summary['rules']} Regeln, {summary['bytes']} Bytes "
+              f"(Pool {summary['pool_bytes']}, JSON {summary['json_bytes']})")
+    else:
+        for key, value in artifact_info(args.path).items():
+            print(f"{key}: {value}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
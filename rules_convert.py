@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diagnoseliste-CSV <-> rules.json umwandeln
+Liest die Eingabe zeilen- bzw. eintragsweise (ohne pandas), prüft jeden
+Eintrag gegen das deklarierte Schema und meldet Fehler mit Datei, Zeile und
+Feld. Platzhalter ohne Primär-ICD ("Unbenannt") werden gezählt und gemeldet
+statt still übernommen, mit --strict sind sie Fehler.
+
+Richtung nach Dateiendung: .csv -> .json (nur BVB/LHB-Einträge, eine Regel
+je ICD) bzw. .json -> .csv (eine Zeile je Primär-ICD). Die Kennung trägt die
+Art (KBV-BVB-G81.1), so dass der Weg zurück verlustfrei bleibt; Alter,
+Geschlecht und Heilmittelbereich kennt das CSV-Schema nicht.
+
+Neben der Ausgabe liegt ein Manifest (<ausgabe>.manifest.json) mit einem
+SHA-256 je Eingabezeile und ihrem umgewandelten Text. Beim nächsten Lauf
+werden nur geänderte Zeilen geprüft und umgewandelt; ist die Eingabe
+unverändert, bleibt die Ausgabe unangetastet.
+
+Aufruf:
+    python rules_convert.py diagnoseliste_extracted.csv rules.json
+    python rules_convert.py rules.json diagnoseliste_from_rules.csv --strict
+    python rules_convert.py rules.json --check
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from rule_engine import parse_icds, parse_secondary
+from rules_json import SEXES
+
+# Bei Änderungen an Schema oder Umwandlung erhöhen: verwirft die Manifeste
+CONVERTER_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+CSV_FIELDS = ("icd", "title", "group", "eligibility", "requires_second_icd", "second_icd_hint",
+              "acute_window_months", "notes", "source_url", "source_version")
+JSON_FIELDS = ("id", "title", "heilmittelbereich", "diagnosegruppe", "icd10_primary", "icd10_secondary_any",
+               "requires_secondary_icd", "age_min", "age_max", "sex", "months_since_event_max", "notes", "evidence",
+               "kbv_version_date")
+# Listeneintrag (I63.9), Stamm (G35) oder Bereich (C00-C97), wie ihn IcdIndex erwartet
+_ICD_KEY_RE = re.compile(r"^[A-Z]\d{2}(?:\.\d{1,2})?(?:-[A-Z]\d{2}(?:\.\d{1,2})?)?$")
+_ID_KIND_RE = re.compile(r"(?:^|-)(BVB|LHB)(?:-|$)")
+
+class ConvertError(ValueError):
+    """Input cannot be read at all (not a JSON array, missing CSV header)."""
+
+# ----------------- Schema -----------------
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        raise ValueError("Text erwartet")
+    return str(value).strip()
+
+def _icd_key(value: Any) -> str:
+    code = _text(value).upper()
+    if not _ICD_KEY_RE.match(code):
+        raise ValueError(f"kein ICD-10-Code oder Bereich: {value!r}")
+    return code
+
+def _icd_list(value: Any) -> List[str]:
+    items = [value] if isinstance(value, str) else (value or [])
+    if not isinstance(items, list):
+        raise ValueError("Liste von ICD-Codes erwartet")
+    codes, invalid = parse_icds(" ".join(_text(v) for v in items))
+    if invalid:
+        raise ValueError(f"ungültige ICD-Codes: {', '.join(invalid)}")
+    return codes
+
+def _secondary(value: Any) -> List[str]:
+    items = [value] if isinstance(value, str) else (value or [])
+    if not isinstance(items, list):
+        raise ValueError("Liste von ICD-Codes/Bereichen erwartet")
+    items = [_text(v) for v in items if _text(v)]
+    for item in items:
+        if parse_secondary([item]) is None:
+            raise ValueError(f"keine ICD-Codes oder Bereiche in {item!r}")
+    return items
+
+def _bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in ("true", "1", "yes", "ja"):
+        return True
+    if text in ("false", "0", "no", "nein", ""):
+        return False
+    raise ValueError(f"true/false erwartet: {value!r}")
+
+def _optional_int(low: int, high: int) -> Callable[[Any], Optional[int]]:
+    def parse(value: Any) -> Optional[int]:
+        if value is None or _text(value) == "":
+            return None
+        if isinstance(value, bool):
+            raise ValueError(f"ganze Zahl erwartet: {value!r}")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"ganze Zahl erwartet: {value!r}")
+        # pandas schreibt 12 als "12.0"
+        if number != int(number):
+            raise ValueError(f"ganze Zahl erwartet: {value!r}")
+        if not low <= number <= high:
+            raise ValueError(f"{int(number)} liegt nicht zwischen {low} und {high}")
+        return int(number)
+    return parse
+
+def _iso_date(value: Any) -> str:
+    text = _text(value)
+    try:
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise ValueError(f"Datum JJJJ-MM-TT erwartet: {value!r}")
+
+def _choice(*choices: str, default: Optional[str] = None) -> Callable[[Any], Optional[str]]:
+    def parse(value: Any) -> Optional[str]:
+        text = _text(value).upper()
+        if not text:
+            return default
+        if text not in choices:
+            raise ValueError(f"erlaubt: {', '.join(choices)} – nicht {value!r}")
+        return text
+    return parse
+
+def _sex(value: Any) -> Optional[str]:
+    text = _text(value).lower()
+    if not text:
+        return None
+    if text not in SEXES:
+        raise ValueError(f"Geschlecht m/w/d erwartet: {value!r}")
+    return SEXES[text]
+
+@dataclass(frozen=True, slots=True)
+class FieldSpec:
+    name: str
+    parse: Callable[[Any], Any]     # Rohwert -> geprüfter Wert, ValueError mit Meldung
+    required: bool = False
+
+CSV_SCHEMA: Tuple[FieldSpec, ...] = (
+    FieldSpec("icd", _icd_key, required=True),
+    FieldSpec("title", _text),
+    FieldSpec("group", _text),
+    FieldSpec("eligibility", _choice("BVB", "LHB", "NONE", default="NONE")),
+    FieldSpec("requires_second_icd", _bool),
+    FieldSpec("second_icd_hint", _text),
+    FieldSpec("acute_window_months", _optional_int(1, 120)),
+    FieldSpec("notes", _text),
+    FieldSpec("source_url", _text),
+    FieldSpec("source_version", _iso_date, required=True),
+)
+
+JSON_SCHEMA: Tuple[FieldSpec, ...] = (
+    FieldSpec("id", _text, required=True),
+    FieldSpec("title", _text),
+    FieldSpec("heilmittelbereich", lambda v: _text(v).upper()),
+    FieldSpec("diagnosegruppe", lambda v: _text(v).upper()),
+    FieldSpec("icd10_primary", _icd_list),
+    FieldSpec("icd10_secondary_any", _secondary),
+    FieldSpec("requires_secondary_icd", _bool),
+    FieldSpec("age_min", _optional_int(0, 130)),
+    FieldSpec("age_max", _optional_int(0, 130)),
+    FieldSpec("sex", _sex),
+    FieldSpec("months_since_event_max", _optional_int(1, 120)),
+    FieldSpec("notes", _text),
+    FieldSpec("evidence", _text),
+    FieldSpec("kbv_version_date", _iso_date, required=True),
+    # Nicht im ursprünglichen Schema; sonst aus der Kennung (KBV-BVB-...)
+    FieldSpec("eligibility", _choice("BVB", "LHB")),
+)
+
+@dataclass(slots=True)
+class Problem:
+    location: str                   # "datei:zeile" bzw. "datei:zeile [index]"
+    field: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.field}: {self.message}" if self.field else f"{self.location}: {self.message}"
+
+def validate(raw: Dict[str, Any], schema: Tuple[FieldSpec, ...], location: str) -> Tuple[Dict[str, Any], List[Problem]]:
+    """Parsed values of one row/entry and the problems found, each with its location and field."""
+    values: Dict[str, Any] = {}
+    problems: List[Problem] = []
+    for spec in schema:
+        value = raw.get(spec.name)
+        if spec.required and (value is None or _text(value) == ""):
+            problems.append(Problem(location, spec.name, "Pflichtfeld fehlt"))
+            continue
+        try:
+            values[spec.name] = spec.parse(value)
+        except ValueError as e:
+            problems.append(Problem(location, spec.name, str(e)))
+    if values.get("age_min") is not None and values.get("age_max") is not None \
+            and values["age_min"] > values["age_max"]:
+        problems.append(Problem(location, "age_min", f"größer als age_max ({values['age_min']} > {values['age_max']})"))
+    return values, problems
+
+# ----------------- Streaming input -----------------
+
+def iter_csv(f: TextIO, name: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(location, raw text for hashing, row) per data row."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        raise ConvertError(f"{name}: leere Datei")
+    missing = [c for c in ("icd", "eligibility") if c not in header]
+    if missing:
+        raise ConvertError(f"{name}:1: Spalten fehlen: {', '.join(missing)}")
+    line = reader.line_num
+    for values in reader:
+        location, line = f"{name}:{line + 1}", reader.line_num
+        if not any(v.strip() for v in values):
+            continue
+        row = dict(zip(header, values))
+        if len(values) != len(header):
+            row["__width__"] = f"{len(values)} statt {len(header)} Spalten"
+        yield location, "\x1f".join(values), row
+
+def iter_json_array(f: TextIO, name: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(location, canonical text for hashing, entry) per element of a top-level JSON array, read in chunks."""
+    decoder = json.JSONDecoder()
+    buf, pos, line, index = "", 0, 1, 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos
+        chunk = f.read(chunk_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        return bool(chunk)
+
+    def skip_ws() -> None:
+        nonlocal pos, line, eof
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                line += buf[pos] == "\n"
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            eof = not fill()
+
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ConvertError(f"{name}:{line}: rules.json muss eine Liste von Regeln enthalten")
+    pos += 1
+    while True:
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        if index:
+            if pos >= len(buf) or buf[pos] != ",":
+                raise ConvertError(f"{name}:{line}: ',' oder ']' erwartet")
+            pos += 1
+            skip_ws()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError as e:
+                # Eintrag reicht über das Ende des Puffers: nachladen, sonst echter Fehler
+                if eof or not fill():
+                    eof = True
+                    raise ConvertError(f"{name}:{line + buf.count(chr(10), pos, e.pos)}: ungültiges JSON: {e.msg}")
+        location = f"{name}:{line} [{index}]"
+        line += buf.count("\n", pos, end)
+        pos = end
+        if not isinstance(item, dict):
+            raise ConvertError(f"{location}: Objekt erwartet")
+        yield location, json.dumps(item, ensure_ascii=False, sort_keys=True), item
+        index += 1
+
+# ----------------- Conversion -----------------
+
+@dataclass(slots=True)
+class Converted:
+    keys: List[str]                 # ICDs bzw. Regel-Kennungen (für die Dublettenprüfung)
+    out: List[Any]                  # CSV-Zeilen (Listen) bzw. rules.json-Einträge
+    skipped: str = ""               # Grund, warum der Eintrag nicht übernommen wurde
+
+def csv_row_to_rule(v: Dict[str, Any]) -> Converted:
+    """CSV row -> rules.json entry; NONE rows are not rules."""
+    if v["eligibility"] == "NONE":
+        return Converted([v["icd"]], [], "eligibility NONE")
+    if "-" in v["icd"]:
+        # rules_json liest icd10_primary über parse_icds: Bereiche gingen verloren
+        return Converted([v["icd"]], [], "Bereich nicht als icd10_primary abbildbar")
+    hint = v["second_icd_hint"]
+    entry = {
+        "id": f"KBV-{v['eligibility']}-{v['icd']}",
+        "title": v["title"],
+        "heilmittelbereich": "",
+        "diagnosegruppe": v["group"],
+        "icd10_primary": [v["icd"]],
+        # Freitext ohne Codes bleibt leer: dann zählt wie bisher jeder weitere ICD
+        "icd10_secondary_any": [hint] if hint and parse_secondary([hint]) is not None else [],
+        "requires_secondary_icd": v["requires_second_icd"],
+        "age_min": None,
+        "age_max": None,
+        "months_since_event_max": v["acute_window_months"],
+        "notes": v["notes"],
+        "evidence": v["source_url"],
+        "kbv_version_date": v["source_version"],
+        "eligibility": v["eligibility"],
+    }
+    return Converted([v["icd"]], [entry])
+
+def rule_to_csv_rows(v: Dict[str, Any]) -> Converted:
+    """rules.json entry -> one CSV row per primary ICD; placeholders yield none."""
+    if not v["icd10_primary"]:
+        return Converted([v["id"]], [], "Platzhalter ohne icd10_primary")
+    kind = v["eligibility"]
+    if kind is None:
+        m = _ID_KIND_RE.search(v["id"].upper())
+        if m is None:
+            raise ValueError("BVB/LHB weder in eligibility noch in der Kennung")
+        kind = m.group(1)
+    window = v["months_since_event_max"]
+    rows = [[icd, v["title"], v["diagnosegruppe"], kind, str(v["requires_secondary_icd"]),
+             ", ".join(v["icd10_secondary_any"]), "" if window is None else str(window), v["notes"],
+             v["evidence"], v["kbv_version_date"]] for icd in v["icd10_primary"]]
+    return Converted(list(v["icd10_primary"]), rows)
+
+def _lost_fields(v: Dict[str, Any]) -> List[str]:
+    """rules.json fields the CSV schema cannot hold."""
+    return [name for name in ("age_min", "age_max", "sex", "heilmittelbereich") if v.get(name) not in (None, "")]
+
+# ----------------- Output -----------------
+
+def _json_fragment(entry: Dict[str, Any]) -> str:
+    # Wie json.dump(..., indent=2) für die ganze Liste: Einträge um zwei Stellen eingerückt
+    return "\n".join("  " + line for line in json.dumps(entry, ensure_ascii=False, indent=2).split("\n"))
+
+def _csv_fragment(rows: List[List[str]]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+def _write_output(path: str, fragments: List[str], to_json: bool) -> str:
+    tmp = f"{path}.tmp"
+    h = hashlib.sha256()
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        parts = (["[\n", ",\n".join(fragments), "\n]" if fragments else "]"] if to_json
+                 else [_csv_fragment([list(CSV_FIELDS)]), *fragments])
+        for part in parts:
+            f.write(part)
+            h.update(part.encode("utf-8"))
+    os.replace(tmp, path)
+    return h.hexdigest()
+
+def _file_sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+# ----------------- Manifest -----------------
+
+def manifest_path(output: str) -> str:
+    return output + MANIFEST_SUFFIX
+
+def _load_manifest(path: str, direction: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("converter_version") != CONVERTER_VERSION or manifest.get("direction") != direction:
+        return {}
+    return manifest
+
+def _save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+# ----------------- Driver -----------------
+
+@dataclass
+class Report:
+    direction: str
+    rows: int = 0
+    written: int = 0                # Regeln bzw. CSV-Zeilen in der Ausgabe
+    converted: int = 0              # neu geprüft und umgewandelt
+    reused: int = 0                 # aus dem Manifest übernommen
+    skipped: List[Problem] = field(default_factory=list)
+    warnings: List[Problem] = field(default_factory=list)
+    errors: List[Problem] = field(default_factory=list)
+    unchanged: bool = False         # Eingabe und Ausgabe wie beim letzten Lauf: nichts geschrieben
+    seconds: float = 0.0
+
+def direction_of(input_path: str, output_path: Optional[str]) -> str:
+    if input_path.lower().endswith(".json"):
+        return "json2csv"
+    if output_path is not None and not output_path.lower().endswith(".json"):
+        raise ConvertError("CSV wird nach rules.json (.json) umgewandelt")
+    return "csv2json"
+
+def convert(input_path: str, output_path: Optional[str], strict: bool = False, force: bool = False) -> Report:
+    """Validate input_path and, if output_path is given and no errors occur, write the other format."""
+    started = time.perf_counter()
+    direction = direction_of(input_path, output_path)
+    to_json = direction == "csv2json"
+    report = Report(direction)
+    name = os.path.basename(input_path)
+
+    input_sha = _file_sha256(input_path)
+    if input_sha is None:
+        raise ConvertError(f"{input_path}: Datei nicht lesbar")
+    manifest_file = manifest_path(output_path) if output_path else None
+    manifest = {} if force or manifest_file is None else _load_manifest(manifest_file, direction)
+    if manifest and manifest.get("input_sha256") == input_sha and not strict \
+            and manifest.get("output_sha256") == _file_sha256(output_path):
+        report.unchanged = True
+        report.rows = report.reused = manifest.get("input_rows", 0)
+        report.written = manifest.get("output_rows", 0)
+        report.seconds = time.perf_counter() - started
+        return report
+
+    cached: Dict[str, Dict[str, Any]] = manifest.get("rows", {})
+    rows: Dict[str, Dict[str, Any]] = {}
+    fragments: List[str] = []
+    seen: Dict[str, str] = {}
+    schema = CSV_SCHEMA if to_json else JSON_SCHEMA
+    with open(input_path, encoding="utf-8", newline="") as f:
+        source = iter_csv(f, name) if to_json else iter_json_array(f, name)
+        for location, raw, row in source:
+            report.rows += 1
+            key = hashlib.sha256(f"{CONVERTER_VERSION}:{raw}".encode("utf-8")).hexdigest()
+            entry = cached.get(key)
+            if entry is not None:
+                report.reused += 1
+            else:
+                if "__width__" in row:
+                    report.errors.append(Problem(location, "", row.pop("__width__")))
+                    continue
+                values, problems = validate(row, schema, location)
+                if problems:
+                    report.errors.extend(problems)
+                    continue
+                try:
+                    result = csv_row_to_rule(values) if to_json else rule_to_csv_rows(values)
+                except ValueError as e:
+                    report.errors.append(Problem(location, "id", str(e)))
+                    continue
+                lost = [] if to_json or result.skipped else _lost_fields(values)
+                text = "" if result.skipped else (_json_fragment(result.out[0]) if to_json else _csv_fragment(result.out))
+                entry = {"keys": result.keys, "text": text, "skipped": result.skipped, "lost": lost}
+                report.converted += 1
+            rows[key] = entry
+            if entry["skipped"]:
+                problem = Problem(location, "", f"übersprungen: {entry['skipped']}")
+                if strict and not entry["skipped"].startswith("eligibility NONE"):
+                    report.errors.append(problem)
+                else:
+                    report.skipped.append(problem)
+                continue
+            if entry["lost"]:
+                report.warnings.append(Problem(location, ", ".join(entry["lost"]), "im CSV-Schema nicht abbildbar"))
+            for k in entry["keys"]:
+                if k in seen:
+                    report.errors.append(Problem(location, "icd" if to_json else "icd10_primary",
+                                                 f"{k} doppelt (zuerst {seen[k]})"))
+                seen.setdefault(k, location)
+            fragments.append(entry["text"])
+            report.written += len(entry["keys"])
+
+    if report.errors or output_path is None:
+        report.seconds = time.perf_counter() - started
+        return report
+    output_sha = _write_output(output_path, fragments, to_json)
+    _save_manifest(manifest_file, {
+        "converter_version": CONVERTER_VERSION,
+        "direction": direction,
+        "input_sha256": input_sha,
+        "output_sha256": output_sha,
+        "input_rows": report.rows,
+        "output_rows": report.written,
+        "rows": rows,
+    })
+    report.seconds = time.perf_counter() - started
+    return report
+
+# ----------------- CLI -----------------
+
+def print_problems(title: str, problems: List[Problem], limit: int) -> None:
+    if not problems:
+        return
+    print(title)
+    for problem in problems[:limit]:
+        print(f"  {problem}")
+    if len(problems) > limit:
+        print(f"  … {len(problems) - limit} weitere")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Diagnoseliste-CSV und rules.json prüfen und ineinander umwandeln")
+    p.add_argument("input", help="Diagnoseliste (.csv) oder rules.json (.json)")
+    p.add_argument("output", nargs="?", help="Ziel im jeweils anderen Format (fehlt es, wird nur geprüft)")
+    p.add_argument("--check", action="store_true", help="Nur prüfen, nichts schreiben")
+    p.add_argument("--strict", action="store_true", help="Platzhalter ohne Primär-ICD sind Fehler")
+    p.add_argument("--force", action="store_true", help="Manifest ignorieren und alles neu umwandeln")
+    p.add_argument("--limit", type=int, default=50, help="Höchstens so viele Meldungen je Art anzeigen")
+    args = p.parse_args(argv)
+
+    output = None if args.check else args.output
+    try:
+        report = convert(args.input, output, strict=args.strict, force=args.force)
+    except ConvertError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    print_problems(f"❌ {len(report.errors)} Fehler:", report.errors, args.limit)
+    print_problems(f"⏭️ {len(report.skipped)} übersprungen:", report.skipped, args.limit)
+    print_problems(f"⚠️ {len(report.warnings)} Warnungen:", report.warnings, args.limit)
+    target = "Regeln" if report.direction == "csv2json" else "CSV-Zeilen"
+    if report.errors:
+        print(f"❌ {report.rows} Einträge geprüft, {len(report.errors)} Fehler" + (f" – {output} nicht geschrieben" if output else ""))
+        return 1
+    if output is None:
+        print(f"✅ {report.rows} Einträge gültig ({report.written} {target}) – {report.seconds:.3f}s")
+    elif report.unchanged:
+        print(f"✅ {output} ist aktuell ({report.written} {target}, Eingabe unverändert) – {report.seconds:.3f}s")
+    else:
+        print(f"✅ {output}: {report.written} {target} aus {report.rows} Einträgen "
+              f"({report.converted} umgewandelt, {report.reused} aus dem Manifest) – {report.seconds:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
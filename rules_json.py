@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regelwerk im rules.json-Schema
+Regeln mit Primär-ICD-Liste, optionalen Zweit-ICDs, Alters-/Geschlechts-
+grenzen, Heilmittelbereich, Diagnosegruppe und Frist nach Akutereignis.
+
+Die Regeln werden nach Primär-ICD indiziert; Zweit-ICDs (Codes, Stämme,
+Bereiche) stehen als SecondarySpec in der Regel. Ein Patient mit k ICDs
+braucht so O(k) Nachschlagen statt eines Durchlaufs über alle Regeln.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from rule_engine import SecondarySpec, icd_stems, months_between, parse_icds, parse_secondary
+
+SEXES = {"m": "m", "männlich": "m", "w": "w", "f": "w", "weiblich": "w", "d": "d", "divers": "d", "x": "d"}
+
+# ----------------- Data models -----------------
+
+@dataclass(frozen=True, slots=True)
+class KbvRule:
+    id: str
+    title: str
+    heilmittelbereich: str
+    diagnosegruppe: str
+    icd10_primary: Tuple[str, ...]
+    icd10_secondary_any: Optional[SecondarySpec]
+    requires_secondary_icd: bool
+    age_min: Optional[int]
+    age_max: Optional[int]
+    sex: Optional[str]               # "m" | "w" | "d" | None (alle)
+    months_since_event_max: Optional[int]
+    notes: str
+    evidence: str
+    kbv_version_date: str
+
+@dataclass(slots=True)
+class PatientProfile:
+    icd10_codes: List[str]
+    age: Optional[int] = None
+    sex: Optional[str] = None
+    diagnosegruppe: str = ""
+    heilmittelbereich: str = ""
+    acute_event_date: Optional[date] = None
+
+@dataclass(slots=True)
+class KbvMatch:
+    rule: KbvRule
+    icd: str                         # Patienten-ICD, über die die Regel gefunden wurde
+    secondary_icd: Optional[str]     # Zweit-ICD, die die Anforderung erfüllt
+
+@dataclass(slots=True)
+class KbvResult:
+    eligible: bool
+    matched: List[KbvMatch]
+    missing_fields: List[str]
+    warnings: List[str]
+    kbv_version_date: str
+
+# ----------------- Loading -----------------
+
+def _as_list(values: Any) -> List[str]:
+    if isinstance(values, str):
+        return [values]
+    return [str(v) for v in (values or [])]
+
+def _codes(values: Any) -> List[str]:
+    return parse_icds(" ".join(_as_list(values)))[0]
+
+def _int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def normalize_sex(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return SEXES.get(str(value).strip().lower())
+
+def rule_from_entry(entry: Dict[str, Any]) -> Optional[KbvRule]:
+    """One rules.json entry -> KbvRule; None for placeholders without primary ICDs."""
+    primary = _codes(entry.get("icd10_primary"))
+    if not primary:
+        return None
+    return KbvRule(
+        id=str(entry.get("id") or ""),
+        title=str(entry.get("title") or ""),
+        heilmittelbereich=str(entry.get("heilmittelbereich") or "").strip().upper(),
+        diagnosegruppe=str(entry.get("diagnosegruppe") or "").strip().upper(),
+        icd10_primary=tuple(primary),
+        icd10_secondary_any=parse_secondary(_as_list(entry.get("icd10_secondary_any"))),
+        requires_secondary_icd=bool(entry.get("requires_secondary_icd")),
+        age_min=_int(entry.get("age_min")),
+        age_max=_int(entry.get("age_max")),
+        sex=normalize_sex(entry.get("sex")),
+        months_since_event_max=_int(entry.get("months_since_event_max")),
+        notes=str(entry.get("notes") or ""),
+        evidence=str(entry.get("evidence") or ""),
+        kbv_version_date=str(entry.get("kbv_version_date") or ""),
+    )
+
+def load_rules_json(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: rules.json muss eine Liste von Regeln enthalten")
+    return entries
+
+# ----------------- Index -----------------
+
+class KbvRuleIndex:
+    """rules.json rules indexed by primary ICD (a rule listing 'G81' also covers G81.1)."""
+
+    def __init__(self, entries: Iterable[Dict[str, Any]]):
+        self.rules: List[KbvRule] = []
+        self.skipped = 0
+        by_primary: Dict[str, List[KbvRule]] = {}
+        for entry in entries:
+            rule = rule_from_entry(entry)
+            if rule is None:
+                self.skipped += 1
+                continue
+            self.rules.append(rule)
+            for icd in rule.icd10_primary:
+                by_primary.setdefault(icd, []).append(rule)
+        self._by_primary: Dict[str, Tuple[KbvRule, ...]] = {k: tuple(v) for k, v in by_primary.items()}
+        self.version: str = max((r.kbv_version_date for r in self.rules), default="")
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def candidates(self, icd: str) -> Iterable[KbvRule]:
+        """Rules whose primary list contains icd or one of its parents."""
+        for key in icd_stems(icd):
+            yield from self._by_primary.get(key, ())
+
+    def secondary_index(self) -> Dict[str, SecondarySpec]:
+        """Primary ICD -> allowed second ICDs of all rules listing it (for IcdIndex)."""
+        index: Dict[str, SecondarySpec] = {}
+        for primary, rules in self._by_primary.items():
+            for rule in rules:
+                spec = rule.icd10_secondary_any
+                if spec is not None:
+                    index[primary] = index[primary] | spec if primary in index else spec
+        return index
+
+# ----------------- Matching -----------------
+
+def match_patient(profile: PatientProfile, index: KbvRuleIndex, today: date) -> KbvResult:
+    """All rules the patient qualifies for; missing_fields lists data that would decide further rules."""
+    codes = profile.icd10_codes
+    # Stämme der Patientencodes einmal je Patient (für die Zweit-ICD-Prüfung)
+    stems = [icd_stems(code) for code in codes]
+    sex = normalize_sex(profile.sex)
+    bereich = (profile.heilmittelbereich or "").strip().upper()
+    gruppe = (profile.diagnosegruppe or "").strip().upper()
+
+    matched: List[KbvMatch] = []
+    missing = set()
+    warnings: List[str] = []
+    seen = set()
+    for code in codes:
+        for rule in index.candidates(code):
+            if rule.id in seen:
+                continue
+            if bereich and rule.heilmittelbereich and rule.heilmittelbereich != bereich:
+                continue
+            if gruppe and rule.diagnosegruppe and rule.diagnosegruppe != gruppe:
+                continue
+            rule_missing = []
+            if rule.age_min is not None or rule.age_max is not None:
+                if profile.age is None:
+                    rule_missing.append("age")
+                elif (rule.age_min is not None and profile.age < rule.age_min) or \
+                        (rule.age_max is not None and profile.age > rule.age_max):
+                    continue
+            if rule.sex is not None:
+                if sex is None:
+                    rule_missing.append("sex")
+                elif sex != rule.sex:
+                    continue
+            if rule.months_since_event_max is not None:
+                if profile.acute_event_date is None:
+                    rule_missing.append("acute_event_date")
+                elif months_between(today, profile.acute_event_date) > rule.months_since_event_max:
+                    continue
+            spec = rule.icd10_secondary_any
+            secondary = None
+            if spec is not None:
+                secondary = spec.find(code, codes, stems)
+            elif rule.requires_secondary_icd:
+                secondary = next((c for c in codes if c != code), None)
+            if secondary is None and rule.requires_secondary_icd:
+                warnings.append(f"{rule.id}: Zweit-ICD erforderlich ({spec.describe() if spec else 'beliebig'})")
+                continue
+            if rule_missing:
+                missing.update(rule_missing)
+                continue
+            seen.add(rule.id)
+            matched.append(KbvMatch(rule, code, secondary))
+
+    if not len(index):
+        warnings.append("rules.json enthält keine Regeln mit Primär-ICD")
+    return KbvResult(bool(matched), matched, sorted(missing), warnings, index.version)
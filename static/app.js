@@ -0,0 +1,112 @@
+// Suche beim Tippen: Klick übernimmt den Code ins ICD-Feld
+let searchTimer = null;
+document.getElementById('search').addEventListener('input', function() {
+    clearTimeout(searchTimer);
+    const q = this.value.trim();
+    searchTimer = setTimeout(async function() {
+        const box = document.getElementById('searchResults');
+        if (!q) { box.innerHTML = ''; return; }
+        const response = await fetch('/search?k=8&q=' + encodeURIComponent(q));
+        const data = await response.json();
+        box.innerHTML = '';
+        data.results.forEach(hit => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'search-hit';
+            item.textContent = hit.icd + ' – ' + hit.title + (hit.eligibility !== 'NONE' ? ' (' + hit.eligibility + ')' : '');
+            item.addEventListener('click', function() {
+                const icds = document.getElementById('icds');
+                icds.value = icds.value.trim() ? icds.value.trim() + ', ' + hit.icd : hit.icd;
+                box.innerHTML = '';
+            });
+            box.appendChild(item);
+        });
+    }, 80);
+});
+
+document.getElementById('bvbForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const loading = document.getElementById('loading');
+    const results = document.getElementById('results');
+    const icdsInput = document.getElementById('icds').value;
+    const acuteDate = document.getElementById('acute_date').value;
+
+    if (!icdsInput.trim()) {
+        alert('Bitte ICD-Codes eingeben');
+        return;
+    }
+
+    loading.style.display = 'block';
+    results.innerHTML = '';
+
+    try {
+        const response = await fetch('/check', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                icds: icdsInput,
+                acute_event_date: acuteDate || null
+            })
+        });
+
+        const data = await response.json();
+
+        loading.style.display = 'none';
+        displayResults(data);
+
+    } catch (error) {
+        loading.style.display = 'none';
+        results.innerHTML = '<div class="result-item" style="border-left-color: #dc3545;">❌ Fehler: ' + error.message + '</div>';
+    }
+});
+
+function displayResults(data) {
+    const results = document.getElementById('results');
+
+    const bvbCount = data.results.filter(r => r.kind === 'BVB').length;
+    const lhbCount = data.results.filter(r => r.kind === 'LHB').length;
+
+    let html = '<div class="results">';
+
+    // Summary
+    if (bvbCount > 0 || lhbCount > 0) {
+        html += '<div class="summary">';
+        html += '<h3>✅ Verordnungsbedarf qualifiziert!</h3>';
+        if (bvbCount > 0) html += '<p><strong>BVB:</strong> ' + bvbCount + ' Code(s)</p>';
+        if (lhbCount > 0) html += '<p><strong>LHB:</strong> ' + lhbCount + ' Code(s)</p>';
+        html += '</div>';
+    } else {
+        html += '<div style="background: #6c757d; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; text-align: center;">';
+        html += '<h3>ℹ️ Kein besonderer Verordnungsbedarf</h3>';
+        html += '<p>Normale Heilmittelverordnung möglich</p>';
+        html += '</div>';
+    }
+
+    // Individual results
+    data.results.forEach(result => {
+        const className = result.kind ? result.kind.toLowerCase() : 'none';
+        const badge = result.kind === 'BVB' ? '🟢 BVB' : result.kind === 'LHB' ? '🔵 LHB' : '⚪ NONE';
+
+        html += '<div class="result-item ' + className + '">';
+        html += '<h4>' + badge + ' ' + result.icd + '</h4>';
+        html += '<p>' + result.explain + '</p>';
+        if (result.secondary_icd) {
+            html += '<p><strong>Zweit-ICD:</strong> ' + result.secondary_icd + '</p>';
+        }
+        if (result.missing.length > 0) {
+            html += '<p style="color: #dc3545;"><strong>Fehlend:</strong> ' + result.missing.join(', ') + '</p>';
+        }
+        if (result.suggestions && result.suggestions.length > 0) {
+            html += '<p><strong>Meinten Sie:</strong> ' + result.suggestions.join(', ') + '</p>';
+        }
+        html += '</div>';
+    });
+
+    if (data.invalid_icds && data.invalid_icds.length > 0) {
+        html += '<p style="color: #dc3545;"><strong>Nicht erkannt:</strong> ' + data.invalid_icds.join(', ') + '</p>';
+    }
+
+    html += '</div>';
+    results.innerHTML = html;
+}
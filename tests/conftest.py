@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures: the repo root on sys.path (flat modules), a small synthetic list and the app."""
+
+import csv
+import os
+import shutil
+import sys
+from datetime import date
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from rule_engine import RuleRow  # noqa: E402
+
+EXTRACTED_CSV = os.path.join(ROOT, "diagnoseliste_extracted.csv")
+# rules.json mit echten Einträgen (das ausgelieferte enthält nur Platzhalter)
+KBV_JSON = os.path.join(ROOT, "tests", "data", "rules_kbv.json")
+TODAY = date(2025, 9, 30)
+
+def row(icd, eligibility="BVB", requires_second_icd=False, second_icd_hint="", acute_window_months=None,
+        title="", group="", notes="", source_version="2025-07-01"):
+    return RuleRow(icd, title or f"Titel {icd}", group, eligibility, requires_second_icd, second_icd_hint,
+                   acute_window_months, notes, "", source_version)
+
+def csv_rules(path=EXTRACTED_CSV):
+    """The rules of a Diagnoseliste CSV, read without the app."""
+    with open(path, encoding="utf-8") as f:
+        return {r["icd"]: RuleRow(r["icd"], r["title"], r["group"], r["eligibility"],
+                                  r["requires_second_icd"].lower() in ("true", "1", "yes"), r["second_icd_hint"],
+                                  int(float(r["acute_window_months"])) if r["acute_window_months"] else None,
+                                  r["notes"], r["source_url"], r["source_version"])
+                for r in csv.DictReader(f)}
+
+@pytest.fixture
+def small_rules():
+    # Exakte Codes, ein Stamm, ein Bereich, Zweit-ICD mit/ohne Codes, Frist
+    return {r.icd: r for r in (
+        row("I63.9", "BVB", acute_window_months=12, title="Hirninfarkt", group="ZN"),
+        row("G81.1", "LHB", True, "I69.3, I60-I64", title="Spastische Hemiparese"),
+        row("G35", "LHB", title="Multiple Sklerose"),
+        row("C00-C97", "BVB", notes="Bösartige Neubildungen"),
+        row("M54.5", "NONE"),
+        row("R26.2", "BVB", True, "siehe Diagnoseliste"),
+    )}
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    # Die App sucht data/diagnoseliste_corrected.csv relativ zum Arbeitsverzeichnis
+    (tmp_path / "data").mkdir()
+    shutil.copy(EXTRACTED_CSV, tmp_path / "data" / "diagnoseliste_corrected.csv")
+    # ... und die Oberfläche unter ./static
+    (tmp_path / "static").symlink_to(os.path.join(ROOT, "static"), target_is_directory=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def client(app_dir, monkeypatch):
+    from fastapi.testclient import TestClient
+    import bvb_main_app
+    # Ohne Prüfprotokoll (auch wenn AUDIT_DB in der Umgebung gesetzt ist), außer ein Test schaltet es selbst ein
+    monkeypatch.setattr(bvb_main_app, "AUDIT_DB", "")
+    # Jeder Test mit frischer Liste aus app_dir, auch wenn der Startup-Hook eine geladene Liste behält
+    bvb_main_app.load_rules()
+    with TestClient(bvb_main_app.app) as c:
+        yield c
+
+@pytest.fixture
+def admin(client, monkeypatch):
+    import bvb_main_app
+    monkeypatch.setattr(bvb_main_app, "ADMIN_TOKEN", "geheim")
+    return {"X-Admin-Token": "geheim"}
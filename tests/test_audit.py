@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import random
+import sqlite3
+
+import pytest
+
+from bvb_audit import AuditLog, format_cursor, parse_cursor, resolve_db_path
+
+@pytest.fixture
+def audit(tmp_path):
+    log = AuditLog(str(tmp_path / "audit" / "bvb_audit.sqlite3"), flush_interval=0.05)
+    log.start()
+    yield log
+    log.stop()
+
+def _fill(log, n):
+    for i in range(n):
+        icds = ["I63.9", f"G81.{i % 3}"] if i % 2 else [f"G81.{i % 3}"]
+        assert log.record("icd", icds, "2025-07-01", bool(i % 2), {"i": i})
+    assert log.flush()
+    # Mehrere Worker schreiben verzahnt: ts nicht in id-Reihenfolge, dazu gleiche ts
+    conn = sqlite3.connect(log.path)
+    with conn:
+        rng = random.Random(7)
+        stamps = [1_750_000_000 + rng.randrange(20) for _ in range(n)]
+        for check_id, ts in enumerate(stamps, start=1):
+            conn.execute("UPDATE checks SET ts = ? WHERE id = ?", (ts, check_id))
+            conn.execute("UPDATE check_icds SET ts = ? WHERE check_id = ?", (ts, check_id))
+    conn.close()
+
+def _pages(log, **kwargs):
+    seen, before = [], None
+    while True:
+        records, before = log.query(limit=7, before=before, **kwargs)
+        seen.extend(records)
+        if before is None:
+            return seen
+        before = parse_cursor(format_cursor(before))
+
+@pytest.mark.parametrize("icd, expected", [(None, 50), ("I63.9", 25), ("G81.1", 17)])
+def test_cursor_pages_without_gaps_or_duplicates(audit, icd, expected):
+    _fill(audit, 50)
+    records = _pages(audit, icd=icd)
+    ids = [r["id"] for r in records]
+    assert len(ids) == len(set(ids)) == expected
+    everything, _ = audit.query(icd=icd, limit=1000)
+    assert ids == [r["id"] for r in everything]
+
+def test_record_is_written(audit):
+    audit.record("icd", ["I63.9"], "2025-07-01", True, {"results": []})
+    assert audit.flush()
+    (record,), cursor = audit.query()
+    assert cursor is None
+    assert record["icds"] == ["I63.9"] and record["eligible"] and record["response"] == {"results": []}
+    assert audit.stats()["written"] == 1
+
+def test_parse_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_cursor("12345")
+
+def test_resolve_db_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert resolve_db_path("") == resolve_db_path(None) == ""
+    assert resolve_db_path("audit.sqlite3") == str(tmp_path / "audit.sqlite3")
+    assert resolve_db_path("default").endswith("bvb_audit.sqlite3")
+
+# ----------------- App -----------------
+
+@pytest.fixture
+def app_audit(client, tmp_path, monkeypatch):
+    import bvb_main_app
+    log = AuditLog(str(tmp_path / "app_audit.sqlite3"), flush_interval=0.05)
+    log.start()
+    monkeypatch.setattr(bvb_main_app, "audit_log", log)
+    yield log
+    log.stop()
+
+def test_audit_endpoint(client, admin, app_audit):
+    for body in ({"icds": "C70.0"}, {"icds": "B94.1, C70.0", "acute_event_date": "2025-08-01"}, {"icds": "C70.0"}):
+        assert client.post("/check", json=body).status_code == 200
+    assert client.get("/audit").status_code == 403
+    data = client.get("/audit", params={"icd": "B94.1"}, headers=admin).json()
+    assert data["count"] == 1 and data["records"][0]["acute_event_date"] == "2025-08-01"
+    # Auch Antworten aus dem Cache werden protokolliert
+    first = client.get("/audit", params={"limit": 2}, headers=admin).json()
+    rest = client.get("/audit", params={"limit": 2, "before": first["next_before"]}, headers=admin).json()
+    assert first["count"] + rest["count"] == 3 and rest["next_before"] is None
+    assert client.get("/audit", params={"before": "gestern"}, headers=admin).status_code == 400
+
+def test_audit_endpoint_off(client, admin):
+    assert client.get("/audit", headers=admin).status_code == 404
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from conftest import TODAY
+from rule_engine import PatientContext, evaluate_patient, evaluate_patients
+
+PATIENTS = [
+    PatientContext(["I63.9"], TODAY - timedelta(days=30)),
+    PatientContext(["G81.1", "I61.0"]),
+    PatientContext(["M54.5", "Z99.9"]),
+    PatientContext([]),
+    PatientContext(["R26.2"]),
+]
+
+def test_evaluate_patients_matches_single_evaluation(small_rules):
+    batch = evaluate_patients(PATIENTS, small_rules, TODAY)
+    expected = [(idx, r) for idx, ctx in enumerate(PATIENTS) for r in evaluate_patient(ctx, small_rules, TODAY)]
+    assert batch.n_patients == len(PATIENTS)
+    assert len(batch) == len(expected)
+    assert batch.patient == [idx for idx, _ in expected]
+    assert batch.icd == [r.icd for _, r in expected]
+    assert batch.eligible == [r.eligible for _, r in expected]
+    assert batch.kind == [r.kind for _, r in expected]
+    assert batch.explain == [r.explain for _, r in expected]
+    assert batch.elapsed_ms >= 0
+
+def test_check_batch_columns(client):
+    response = client.post("/check/batch", json={"patients": [
+        {"id": "a", "icds": "I63.9 G81.1", "acute_event_date": "2000-01-01"},
+        {"id": "b", "icds": ["C70.0"]},
+        {"icds": "M54.5"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["n_patients"] == 3
+    columns = data["columns"]
+    assert columns["patient_id"] == ["a", "a", "b", 2]
+    assert columns["icd"] == ["I63.9", "G81.1", "C70.0", "M54.5"]
+    assert len(columns["kind"]) == data["n_results"] == 4
+    assert data["summary"]["total_eligible"] == sum(kind is not None for kind in columns["kind"])
+
+def test_check_batch_rejects_bad_input(client, monkeypatch):
+    import bvb_main_app
+    assert client.post("/check/batch", json={"patients": []}).status_code == 400
+    assert client.post("/check/batch", json={"patients": ["I63.9"]}).status_code == 400
+    monkeypatch.setattr(bvb_main_app, "MAX_BATCH_PATIENTS", 2)
+    assert client.post("/check/batch", json={"patients": [{"icds": "I63.9"}] * 3}).status_code == 413
+
+def test_check_batch_evaluates_off_the_event_loop(client, monkeypatch):
+    import asyncio
+    import bvb_main_app
+    calls = []
+
+    def evaluate(*args):
+        # Im Threadpool läuft keine Event-Loop
+        try:
+            asyncio.get_running_loop()
+            calls.append("loop")
+        except RuntimeError:
+            calls.append("thread")
+        return evaluate_patients(*args)
+
+    monkeypatch.setattr(bvb_main_app, "evaluate_patients", evaluate)
+    assert client.post("/check/batch", json={"patients": [{"icds": "C70.0"}]}).status_code == 200
+    assert calls == ["thread"]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import json
+
+import bvb_bench
+from bvb_bench import REFERENCE_DATE, SUITE_VERSION, bench_suite, compare_results, main, synthetic_patients
+
+def test_synthetic_patients_are_reproducible():
+    first = list(synthetic_patients(200, seed=7, today=REFERENCE_DATE))
+    assert first == list(synthetic_patients(200, seed=7, today=REFERENCE_DATE))
+    assert first != list(synthetic_patients(200, seed=8, today=REFERENCE_DATE))
+    assert all(1 <= len(p["icds"].split(", ")) <= 8 for p in first)
+
+def _doc(**mins):
+    return {"suite_version": SUITE_VERSION, "meta": {}, "results": {name: {"min": m} for name, m in mins.items()}}
+
+def test_compare_results_flags_only_slower_cases():
+    baseline = _doc(check_rule=1.0, normalize_icds=10.0, load_rules=100.0)
+    current = _doc(check_rule=1.1, normalize_icds=12.0, load_rules=50.0, neu=1.0)
+    assert compare_results(current, baseline, 0.15) == ["normalize_icds"]
+
+def test_bench_suite_exit_code(tmp_path, monkeypatch):
+    monkeypatch.setattr(bvb_bench, "run_suite", lambda patients, repeat: _doc(check_rule=2.0))
+    baseline, out = tmp_path / "baseline.json", tmp_path / "out.json"
+    baseline.write_text(json.dumps(_doc(check_rule=1.0)), encoding="utf-8")
+    assert bench_suite(10, 1, str(out), str(baseline), 0.15) == 1
+    assert json.loads(out.read_text(encoding="utf-8"))["results"] == {"check_rule": {"min": 2.0}}
+    assert bench_suite(10, 1, None, str(baseline), 1.5) == 0
+    # Andere Suite-Version oder keine Baseline: kein Vergleich
+    baseline.write_text(json.dumps({**_doc(check_rule=1.0), "suite_version": SUITE_VERSION + 1}), encoding="utf-8")
+    assert bench_suite(10, 1, None, str(baseline), 0.15) == 0
+    assert bench_suite(10, 1, None, str(tmp_path / "fehlt.json"), 0.15) == 0
+
+def test_memory_subcommand_runs(capsys):
+    assert main(["memory", "--results", "200"]) == 0
+    assert "Ersparnis" in capsys.readouterr().out
+
+def test_parallel_subcommand_uses_one_list_for_all_worker_counts(tmp_path, monkeypatch, capsys):
+    # Ohne --rules und ohne data/ im Arbeitsverzeichnis: beide Zweige laden die eingebettete CSV
+    monkeypatch.chdir(tmp_path)
+    assert main(["parallel", "--patients", "200", "--workers", "1", "2", "--chunk-size", "50"]) == 0
+    rows = [line.split() for line in capsys.readouterr().out.splitlines() if line.split()[:1] in (["1"], ["2"])]
+    assert [row[0] for row in rows] == ["1", "2"]
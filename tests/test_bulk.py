@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import EXTRACTED_CSV, TODAY
+from bvb_bulk import guess_format, read_rows, run_bulk
+
+NDJSON = (
+    '{"patient_id": "p1", "icds": "I63.9", "acute_event_date": "2025-08-01"}\n'
+    '\n'
+    '{"patient_id": "p2", "icds": ["G81.1", "I61.0"]}\n'
+    'kein json\n'
+    '{"patient_id": "p3", "icds": "I63.9", "acute_event_date": "gestern"}\n'
+)
+
+def test_run_bulk_ndjson_reports_bad_rows_inline(small_rules):
+    out = io.StringIO()
+    stats = run_bulk(io.StringIO(NDJSON), out, small_rules, "ndjson", "ndjson", today=TODAY)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["patient_id"] for r in records] == ["p1", "p2", "line:4", "p3"]
+    assert records[0]["eligible"] and records[0]["results"][0]["kind"] == "BVB"
+    assert records[1]["results"][0]["icd"] == "G81.1"
+    assert "Zeile 4" in records[2]["error"] and "Zeile 5" in records[3]["error"]
+    assert (stats["patients"], stats["errors"]) == (4, 2)
+
+def test_run_bulk_csv_one_row_per_icd(small_rules):
+    text = "patient_id,icds,acute_event_date\np1,I63.9 M54.5,2025-08-01\np2,\"G81.1, I61.0\",\n"
+    out = io.StringIO()
+    run_bulk(io.StringIO(text), out, small_rules, "csv", "csv", today=TODAY)
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert [(r["patient_id"], r["icd"]) for r in rows] == [("p1", "I63.9"), ("p1", "M54.5"),
+                                                           ("p2", "G81.1"), ("p2", "I61.0")]
+    assert rows[0]["eligible"] == "True" and rows[1]["eligible"] == "False"
+
+QUOTED_NEWLINE = 'patient_id,icds\n"p1","I63.9\nM54.5"\n\n"p2","C70.0"\n"p3","B94.1\n'
+
+def test_read_rows_csv_quoted_newline():
+    rows = list(read_rows(io.StringIO(QUOTED_NEWLINE), "csv"))
+    assert [(pid, ctx.icds if ctx else None) for pid, ctx, _ in rows] == [
+        ("p1", ["I63.9", "M54.5"]), ("p2", ["C70.0"]), ("line:6", None)]
+    assert "Zeile 6" in rows[2][2]
+    # Anführungszeichen mitten im Feld sind Text und verschlucken keine Folgezeilen
+    rows = list(read_rows(io.StringIO('patient_id,icds\np1,I63.9"\np2,C70.0\n'), "csv"))
+    assert [pid for pid, _, _ in rows] == ["p1", "p2"]
+
+def test_read_rows_is_lazy():
+    def lines():
+        yield '{"patient_id": 1, "icds": "I63.9"}\n'
+        raise AssertionError("zu früh gelesen")
+    assert next(read_rows(lines(), "ndjson"))[0] == 1
+
+def test_guess_format():
+    assert guess_format("quartal.CSV") == "csv"
+    assert guess_format("quartal.jsonl") == "ndjson"
+    assert guess_format("-", "csv") == "csv"
+
+def test_check_stream(client):
+    response = client.post("/check/stream", content=NDJSON.encode("utf-8"),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["patient_id"] for r in records] == ["p1", "p2", "line:4", "p3"]
+
+def test_check_stream_csv_to_ndjson(client):
+    response = client.post("/check/stream?output_format=ndjson", content=b"patient_id,icds\nx,C70.0\n",
+                           headers={"Content-Type": "text/csv"})
+    record, = [json.loads(line) for line in response.text.splitlines()]
+    assert record["patient_id"] == "x" and record["results"][0]["icd"] == "C70.0"
+    response = client.post("/check/stream?output_format=ndjson", content=QUOTED_NEWLINE.encode("utf-8"),
+                           headers={"Content-Type": "text/csv"})
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["patient_id"] for r in records] == ["p1", "p2", "line:6"]
+    assert [r["icd"] for r in records[0]["results"]] == ["I63.9", "M54.5"]
+    assert client.post("/check/stream?format=xml", content=b"").status_code == 400
+
+# ----------------- Parallel -----------------
+
+def _cohort(n):
+    codes = ["C70.0", "G81.1 I61.0", "B94.1", "M54.5", "Z99.9", "kaputt!"]
+    lines = ["patient_id,icds,acute_event_date\n"]
+    lines += [f"p{i},{codes[i % len(codes)]},{'2025-0%d-01' % (i % 9 + 1) if i % 2 else ''}\n" for i in range(n)]
+    return "".join(lines)
+
+def test_parallel_output_matches_sequential():
+    import bvb_main_app
+    from bvb_bulk import run_bulk_parallel
+    rules = bvb_main_app.load_rules(EXTRACTED_CSV)
+    text = _cohort(200)
+    sequential, parallel = io.StringIO(), io.StringIO()
+    run_bulk(io.StringIO(text), sequential, rules, "csv", "ndjson", today=TODAY)
+    stats = run_bulk_parallel(io.StringIO(text), parallel, EXTRACTED_CSV, "csv", "ndjson", workers=2,
+                              chunk_size=32, today=TODAY)
+    assert parallel.getvalue() == sequential.getvalue()
+    assert stats["patients"] == 200
+
+def test_parallel_names_list_the_workers_failed_to_load(tmp_path):
+    from concurrent.futures.process import BrokenProcessPool
+    from bvb_bulk import run_bulk_parallel
+    missing = str(tmp_path / "fehlt.csv")
+    with pytest.raises(BrokenProcessPool, match="fehlt.csv"):
+        run_bulk_parallel(io.StringIO(_cohort(10)), io.StringIO(), missing, "csv", "ndjson", workers=2, chunk_size=4)
+
+def test_parallel_keeps_multiline_records_together():
+    import bvb_main_app
+    from bvb_bulk import run_bulk_parallel
+    rules = bvb_main_app.load_rules(EXTRACTED_CSV)
+    sequential, parallel = io.StringIO(), io.StringIO()
+    run_bulk(io.StringIO(QUOTED_NEWLINE), sequential, rules, "csv", "ndjson", today=TODAY)
+    run_bulk_parallel(io.StringIO(QUOTED_NEWLINE), parallel, EXTRACTED_CSV, "csv", "ndjson", workers=1,
+                      chunk_size=1, today=TODAY)
+    assert parallel.getvalue() == sequential.getvalue()
+    assert [json.loads(line)["patient_id"] for line in parallel.getvalue().splitlines()] == ["p1", "p2", "line:6"]
+
+def test_iter_chunks_keeps_header_and_line_numbers():
+    from bvb_bulk import iter_chunks
+    chunks = list(iter_chunks(io.StringIO(_cohort(5)), "csv", 2))
+    assert [(header, line_no, len(lines)) for header, line_no, lines in chunks] == [
+        (["patient_id", "icds", "acute_event_date"], 1, 2),
+        (["patient_id", "icds", "acute_event_date"], 3, 2),
+        (["patient_id", "icds", "acute_event_date"], 5, 1),
+    ]
+    assert [(line_no, len(lines)) for _, line_no, lines in iter_chunks(io.StringIO(QUOTED_NEWLINE), "csv", 1)] == [
+        (1, 2), (3, 1), (4, 1), (5, 1)]
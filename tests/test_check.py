@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+def test_check_reports_invalid_tokens(client):
+    data = client.post("/check", json={"icds": "c700G, Hemiparese; C70.0"}).json()
+    assert [r["icd"] for r in data["results"]] == ["C70.0"]
+    assert data["invalid_icds"] == ["HEMIPARESE"]
+
+def test_check_without_valid_codes(client):
+    response = client.post("/check", json={"icds": "Hemiparese links"})
+    assert response.status_code == 400
+    assert "HEMIPARESE" in response.json()["detail"]
+
+def test_check_response_shape(client):
+    data = client.post("/check", json={"icds": ["C70.0", "B94.1"], "acute_event_date": "2025-08-01"}).json()
+    assert set(data) == {"icds_input", "results", "summary", "invalid_icds"}
+    assert set(data["results"][0]) >= {"icd", "eligible", "kind", "explain", "conditions_met", "missing",
+                                       "source_version"}
+    summary = data["summary"]
+    assert summary["total_eligible"] == summary["bvb_count"] + summary["lhb_count"]
+    # Leeres Datum heißt: kein Akutereignis angegeben
+    assert client.post("/check", json={"icds": "C70.0", "acute_event_date": ""}).status_code == 200
+
+@pytest.mark.parametrize("body", [
+    b"{nicht json",
+    b'{"icds": 42}',
+    b'{"icds": "C70.0", "acute_event_date": "gestern"}',
+])
+def test_check_rejects_malformed_bodies(client, body):
+    response = client.post("/check", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+def test_batch_rejects_malformed_json(client):
+    response = client.post("/check/batch", content=b'{"patients": [', headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert "Ungültiges JSON" in response.json()["detail"]
+
+def test_check_suggests_listed_codes_for_typos(client):
+    data = client.post("/check", json={"icds": "C07.0, C70.0"}).json()
+    typo, listed = data["results"]
+    assert not typo["eligible"] and typo["suggestions"][0] == "C70.0"
+    assert listed["suggestions"] == []
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import timedelta
+
+import pytest
+
+from conftest import TODAY, csv_rules, row
+from rule_engine import IcdIndex, PatientContext, evaluate_cohort, evaluate_patient
+
+pd = pytest.importorskip("pandas")
+
+def _cohort(rules, n_patients=300, seed=3):
+    rng = random.Random(seed)
+    codes = sorted(rules) + ["Z99.9", "C70.01", "G81.95"]
+    patients = []
+    for pid in range(n_patients):
+        icds = rng.sample(codes, rng.choice([1, 1, 2, 3]))
+        acute = rng.choice([None, TODAY - timedelta(days=rng.randrange(900))])
+        patients.append((f"p{pid}", icds, acute))
+    return patients
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_cohort_matches_evaluate_patient(indexed):
+    rules = csv_rules()
+    rules["G81.0-G81.9"] = row("G81.0-G81.9", "LHB", True, "I60-I64")
+    rules["I63.9"] = row("I63.9", "BVB", True, "I69.3", acute_window_months=6)
+    table = IcdIndex(rules) if indexed else rules
+    patients = _cohort(rules)
+    cohort = pd.DataFrame([{"patient_id": pid, "icd": icd, "acute_event_date": acute}
+                           for pid, icds, acute in patients for icd in icds])
+    result = evaluate_cohort(cohort, table, TODAY)
+
+    expected = [r for pid, icds, acute in patients for r in evaluate_patient(PatientContext(icds, acute), table, TODAY)]
+    assert len(result) == len(expected)
+    for got, want in zip(result.itertuples(index=False), expected):
+        assert got.icd == want.icd
+        assert bool(got.eligible) == want.eligible
+        assert got.kind == want.kind
+        assert got.explain == want.explain
+        assert got.source_version == want.source_version
+        conds = want.conditions_met
+        for column in ("second_icd_present", "acute_window_ok"):
+            value = getattr(got, column)
+            assert (None if pd.isna(value) else bool(value)) == conds.get(column)
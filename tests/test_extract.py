@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from conftest import ROOT
+from bvb_extract import diff_rules, parse_page, read_csv, rows_from_pages, write_csv
+
+# Textstücke (x, y, text) dreier Seiten des KBV-PDF (Stand 1. Juli 2025): Titelzeile, S. 5 und S. 15
+PAGES_JSON = os.path.join(ROOT, "tests", "data", "extract_pages.json")
+
+@pytest.fixture(scope="module")
+def pages():
+    with open(PAGES_JSON, encoding="utf-8") as f:
+        return [parse_page([tuple(fragment) for fragment in page]) for page in json.load(f)]
+
+@pytest.fixture(scope="module")
+def rows(pages):
+    rows, warnings = rows_from_pages(pages, "kbv.pdf")
+    assert warnings == []
+    return {r["icd"]: r for r in rows}
+
+def test_parse_page_kind_and_version(pages):
+    cover, first, second = pages
+    assert (cover["kind"], cover["version"], cover["blocks"]) == (None, "2025-07-01", [])
+    assert first["kind"] == second["kind"] == "bedarf"
+    block = first["blocks"][0]
+    assert [r["icd"] for r in block["rows"]] == ["B94.1"]
+    assert block["groups"][:2] == ["ZN/SO3", "EN1"]
+    assert " ".join(block["hint"]) == "längstens 1 Jahr nach Akutereignis"
+
+def test_parse_page_shared_cells_and_wrapped_groups(pages):
+    meningen = pages[1]["blocks"][1]
+    # Ein Block mit gemeinsamen Gruppen/Hinweis über 21 Zeilen; "ZN/" läuft in der nächsten Zeile weiter
+    assert len(meningen["rows"]) == 21 and meningen["groups"][:3] == ["ZN/", "EN1/", "EN2"]
+    assert [r["icd"] for r in meningen["rows"][:3]] == ["C70.0", "C70.1", "C70.9"]
+
+def test_rows_from_pages(rows):
+    assert len(rows) == 49
+    assert rows["B94.1"] == {
+        "icd": "B94.1", "title": "Folgezustände der Virusenzephalitis", "group": "ZN/SO3", "eligibility": "BVB",
+        "requires_second_icd": "False", "second_icd_hint": "", "acute_window_months": "12",
+        "notes": "Längstens 1 Jahr nach Akutereignis", "source_url": "kbv.pdf", "source_version": "2025-07-01",
+    }
+    assert (rows["G10"]["eligibility"], rows["G10"]["acute_window_months"]) == ("LHB", "")
+    # Bereich und Zweit-ICD mit Frist in Monaten
+    assert rows["C00-C97"]["title"] == "Bösartige Neubildungen"
+    # Kommas im Titel bleiben erhalten (write_csv quotet sie)
+    assert rows["C70.9"]["title"] == "Meningen, nicht näher bezeichnet"
+    assert rows["G11.3"]["title"] == "Zerebellare Ataxie mit defektem DNA-Reparatursystem"
+    knee = rows["M23.5"]
+    assert (knee["requires_second_icd"], knee["second_icd_hint"], knee["acute_window_months"]) == ("True", "Z98.8", "6")
+
+def test_diff_rules(rows, tmp_path):
+    path = str(tmp_path / "neu.csv")
+    write_csv(list(rows.values()), path)
+    new = read_csv(path)
+    assert new["C70.9"]["title"] == "Meningen, nicht näher bezeichnet"
+    assert diff_rules(new, new) == {"added": [], "removed": [], "changed": {}}
+
+    old = {icd: dict(r) for icd, r in new.items() if icd != "G10"}
+    old["X00.0"] = dict(new["G10"], icd="X00.0")
+    # Gleichwertige Schreibweisen sind keine Änderung
+    old["B94.1"].update(requires_second_icd="false", acute_window_months="12.0", title=" Folgezustände  der Virusenzephalitis")
+    old["C70.0"].update(eligibility="LHB", acute_window_months="")
+    diff = diff_rules(old, new)
+    assert (diff["added"], diff["removed"]) == (["G10"], ["X00.0"])
+    assert diff["changed"] == {"C70.0": {"eligibility": ["LHB", "BVB"], "acute_window_months": ["", "12"]}}
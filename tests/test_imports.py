@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Wird erst bei Bedarf geladen (Kohorten-Auswertung, Server-Start, Profiler, Prüfprotokoll, Kompression,
+# Suche beim Laden der Liste; rules_convert nur als Build-Werkzeug)
+LAZY = ("pandas", "numpy", "uvicorn", "webbrowser", "cProfile", "pstats", "sqlite3", "brotli", "bvb_search",
+        "rules_convert")
+
+def test_app_import_stays_light():
+    code = "import sys, bvb_main_app; print(' '.join(sorted(sys.modules)))"
+    loaded = set(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.split())
+    assert "rule_engine" in loaded
+    assert not loaded & set(LAZY)
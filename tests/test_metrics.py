@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from bvb_metrics import Registry, SamplingProfiler, snapshot
+
+# ----------------- bvb_metrics -----------------
+
+def test_counter_and_histogram_render():
+    registry = Registry()
+    requests = registry.counter("t_requests_total", "Anfragen", ("path",))
+    duration = registry.histogram("t_duration_seconds", "Dauer", buckets=(0.1, 1.0))
+    requests.inc("/check")
+    requests.inc("/check", amount=2)
+    requests.inc('/a"b')
+    for value in (0.05, 0.5, 5.0):
+        duration.observe(value)
+    registry.add_collector(lambda: snapshot("t_rules", "Regeln", [({"kind": "BVB"}, 3)]))
+    lines = registry.render().splitlines()
+    assert "# TYPE t_requests_total counter" in lines
+    assert 't_requests_total{path="/check"} 3' in lines
+    assert 't_requests_total{path="/a\\"b"} 1' in lines
+    # Buckets kumuliert, +Inf = Anzahl
+    assert 't_duration_seconds_bucket{le="0.1"} 1' in lines
+    assert 't_duration_seconds_bucket{le="1.0"} 2' in lines
+    assert 't_duration_seconds_bucket{le="+Inf"} 3' in lines
+    assert "t_duration_seconds_count 3" in lines and "t_duration_seconds_sum 5.55" in lines
+    assert 't_rules{kind="BVB"} 3' in lines
+
+def test_sampling_profiler_measures_every_nth_call():
+    profiler = SamplingProfiler()
+    assert "Keine Profildaten" in profiler.report()
+    assert profiler.call(sum, [1, 2]) == 3 and profiler.samples == 0
+    profiler.start(every=3)
+    for i in range(9):
+        assert profiler.call(sorted, [i, 1]) == sorted([i, 1])
+    assert (profiler.calls, profiler.samples) == (9, 3)
+    profiler.stop()
+    profiler.call(sorted, [])
+    assert profiler.samples == 3 and not profiler.enabled
+    assert "3 von 10 Aufrufen" in profiler.report(limit=5, sort="ncalls")
+
+# ----------------- App -----------------
+
+def test_metrics_endpoint_has_request_and_stage_series(client):
+    assert client.post("/check", json={"icds": "C70.0"}).status_code == 200
+    text = client.get("/metrics").text
+    assert 'bvb_http_requests_total{path="/check",method="POST",status="200"}' in text
+    for stage in ("parse", "normalize", "evaluate", "serialize"):
+        assert f'bvb_check_stage_seconds_count{{stage="{stage}"}}' in text
+    assert "bvb_profiler_enabled 0" in text
+
+@pytest.fixture
+def profiling(client, admin):
+    yield admin
+    import bvb_main_app
+    bvb_main_app.profiler.stop()
+
+def test_admin_profile_toggle_and_report(client, profiling):
+    assert client.post("/admin/profile?every=1").status_code == 403
+    assert client.post("/admin/profile?every=1", headers=profiling).json()["enabled"]
+    for icds in ("C70.0", "B94.1", "C70.0, B94.1"):
+        client.post("/check", json={"icds": icds, "acute_event_date": "2025-01-15"})
+    report = client.get("/admin/profile?limit=5", headers=profiling)
+    assert report.status_code == 200 and "evaluate_patient" in report.text
+    raw = client.get("/admin/profile?format=pstats", headers=profiling)
+    assert raw.status_code == 200 and raw.content
+    stopped = client.post("/admin/profile?every=0", headers=profiling).json()
+    assert not stopped["enabled"] and stopped["samples"] >= 1
+
+def test_admin_profile_rejects_unknown_sort(client, profiling):
+    assert client.get("/admin/profile?sort=bogus", headers=profiling).status_code == 422
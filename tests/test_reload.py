@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import time
+
+def _edit_csv(app_dir, old, new):
+    path = app_dir / "data" / "diagnoseliste_corrected.csv"
+    path.write_text(path.read_text(encoding="utf-8").replace(old, new), encoding="utf-8")
+
+def test_admin_reload_swaps_list(client, admin, app_dir):
+    import bvb_main_app
+    before = bvb_main_app.rules_dict
+    _edit_csv(app_dir, "2025-07-01", "2025-10-01")
+    response = client.post("/admin/reload", headers=admin)
+    assert response.status_code == 200 and response.json()["version"] == "2025-10-01"
+    assert bvb_main_app.rules_dict is not before
+    assert client.get("/health").json()["rules_version"] == "2025-10-01"
+
+def test_invalid_list_keeps_old_one(client, admin, app_dir):
+    import bvb_main_app
+    before = bvb_main_app.rules_dict
+    _edit_csv(app_dir, ",BVB,", ",XYZ,")
+    response = client.post("/admin/reload", headers=admin)
+    assert response.status_code == 422 and "alte bleibt aktiv" in response.json()["detail"]
+    assert bvb_main_app.rules_dict is before
+
+def test_admin_reload_needs_token(client, admin):
+    assert client.post("/admin/reload").status_code == 403
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "falsch"}).status_code == 403
+
+def test_admin_reload_only_local_without_token(client):
+    # TestClient meldet sich als Host "testclient", nicht als localhost
+    assert client.post("/admin/reload").status_code == 403
+
+def test_watcher_reloads_after_stable_change(client, app_dir):
+    import bvb_main_app
+    watcher = bvb_main_app.RulesWatcher(0.05)
+    watcher.start()
+    try:
+        # Erst den Ausgangsstand erfassen lassen
+        time.sleep(0.2)
+        _edit_csv(app_dir, "2025-07-01", "2025-10-01")
+        deadline = time.monotonic() + 5
+        while bvb_main_app.rules_info["version"] != "2025-10-01" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+    assert bvb_main_app.rules_info["version"] == "2025-10-01"
+
+def test_cache_hits_and_reload_clears_it(client, admin, app_dir):
+    body = {"icds": "C70.0 B94.1", "acute_event_date": "2025-08-01"}
+    first = client.post("/check", json=body).json()
+    assert client.post("/check", json=body).json() == first
+    assert client.get("/health").json()["result_cache"]["hits"] >= 1
+    _edit_csv(app_dir, "Hirnhäute", "Hirnhäute (neu)")
+    assert client.post("/admin/reload", headers=admin).status_code == 200
+    assert "Hirnhäute (neu)" in client.post("/check", json=body).json()["results"][0]["explain"]
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+import dataclasses
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import TODAY, csv_rules, row
+from rule_engine import (
+    Conditions, IcdIndex, PatientContext, ResultCache, RuleStore, SuggestIndex, check_compiled, check_rule,
+    compile_rule, decode_conditions, edit_distance, encode_conditions, evaluate_patient, icd_neighbors, icd_stems,
+    normalize_icds, parse_icds, parse_secondary, result_cache_key,
+)
+
+# ----------------- IcdIndex -----------------
+
+def test_lookup_exact_prefix_and_range(small_rules):
+    index = IcdIndex(small_rules)
+    assert index.lookup("I63.9").icd == "I63.9"
+    # Stamm: G35 gilt für G35.0 und G35.11
+    assert index.lookup("G35.0").icd == "G35"
+    assert index.lookup("G35.11").icd == "G35"
+    # Bereich inklusive Ende und dessen Unterkodes
+    assert index.lookup("C00.0").icd == "C00-C97"
+    assert index.lookup("C50.9").icd == "C00-C97"
+    assert index.lookup("C97").icd == "C00-C97"
+    assert index.lookup("D00.0") is None
+    assert index.lookup("I63.8") is None
+
+def test_nested_ranges():
+    index = IcdIndex({r.icd: r for r in (row("G80-G83"), row("G81.0-G81.9", "LHB"))})
+    assert index.lookup("G81.95").icd == "G81.0-G81.9"
+    assert index.lookup("G82.4").icd == "G80-G83"
+    assert index.lookup("G84") is None
+
+def test_stem_hit_refers_to_entered_code(small_rules):
+    result, = evaluate_patient(PatientContext(["G35.0"]), IcdIndex(small_rules), TODAY)
+    assert result.icd == "G35.0" and result.kind == "LHB"
+    assert "Listeneintrag G35" in result.explain
+    # Ohne Index bleibt es beim exakten Vergleich
+    unlisted, = evaluate_patient(PatientContext(["G35.0"]), small_rules, TODAY)
+    assert not unlisted.eligible
+
+def test_neighbors_match_plain_list():
+    codes = list(csv_rules())
+    index = IcdIndex({code: row(code) for code in codes})
+    for icd in ("G81.1", "C70", "R26.2", "Z99"):
+        assert icd_neighbors(icd, index, k=5) == icd_neighbors(icd, codes, k=5)
+
+def test_lookup_compiled_refers_to_entered_code(small_rules):
+    index = IcdIndex(small_rules)
+    compiled = index.lookup_compiled("G35.0")
+    assert compiled.icd == "G35.0"
+    assert "Listeneintrag G35" in compiled.explain_eligible
+
+# ----------------- check_compiled == check_rule -----------------
+
+def _contexts():
+    acute = [None, TODAY - timedelta(days=20), TODAY - timedelta(days=400), TODAY - timedelta(days=800)]
+    icd_sets = [["{icd}"], ["{icd}", "I69.3"], ["{icd}", "I61.0"], ["{icd}", "Z99.9"], ["I69.3", "{icd}"]]
+    for icds in icd_sets:
+        for date_ in acute:
+            yield icds, date_
+
+def _rules_for_equivalence(small_rules):
+    rules = dict(small_rules)
+    rules.update(csv_rules())
+    rules["G81.0"] = row("G81.0", "BVB", True, "I60.- bis I64.-", acute_window_months=6)
+    return rules
+
+def test_check_compiled_matches_check_rule(small_rules):
+    for rule in _rules_for_equivalence(small_rules).values():
+        compiled = compile_rule(rule)
+        for icds, acute in _contexts():
+            ctx = PatientContext([i.format(icd=rule.icd) for i in icds], acute)
+            assert check_compiled(compiled, ctx, TODAY) == check_rule(rule, ctx, TODAY), (rule.icd, ctx)
+
+def test_evaluate_patient_index_matches_plain_dict(small_rules):
+    rules = {icd: r for icd, r in _rules_for_equivalence(small_rules).items() if "-" not in icd}
+    index = IcdIndex(rules)
+    for icd in rules:
+        for icds, acute in _contexts():
+            ctx = PatientContext([i.format(icd=icd) for i in icds], acute)
+            assert evaluate_patient(ctx, index, TODAY) == evaluate_patient(ctx, rules, TODAY)
+
+# ----------------- Compact models -----------------
+
+def test_rule_row_is_frozen_and_slotted():
+    rule = row("I63.9")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        rule.icd = "I63.8"
+    assert not hasattr(rule, "__dict__")
+
+@pytest.mark.parametrize("conds", [
+    {"is_listed": False},
+    {"is_listed": True, "second_icd_present": False},
+    {"is_listed": True, "acute_window_ok": True},
+    {"is_listed": True, "second_icd_present": True, "acute_window_ok": False},
+])
+def test_conditions_bitmask_round_trip(conds):
+    bits = encode_conditions(conds)
+    assert list(decode_conditions(bits).items()) == list(conds.items())
+
+def test_results_share_interned_messages(small_rules):
+    index = IcdIndex(small_rules)
+    first, = evaluate_patient(PatientContext(["I63.9"]), index, TODAY)
+    second, = evaluate_patient(PatientContext(["I63.9"]), index, TODAY)
+    assert first.missing == ("Datum des Akutereignisses erforderlich",)
+    assert first.missing[0] is second.missing[0]
+    unlisted = evaluate_patient(PatientContext(["Z99.9", "Z99.8"]), index, TODAY)
+    assert unlisted[0].missing is unlisted[1].missing
+    assert first.conditions == Conditions.IS_LISTED | Conditions.ACUTE_WINDOW_CHECKED
+    assert first.conditions_met == {"is_listed": True, "acute_window_ok": False}
+
+# ----------------- RuleStore -----------------
+
+def test_rule_store_as_of():
+    store = RuleStore()
+    old = store.add({"I63.9": row("I63.9", "LHB", source_version="2024-01-01")})
+    new = store.add({"I63.9": row("I63.9", "BVB", source_version="2025-07-01"),
+                     "G35": row("G35", "LHB", source_version="2025-07-01")})
+    assert store.at(date(2024, 1, 1)) is old
+    assert store.at(date(2025, 6, 30)) is old
+    assert store.at(date(2025, 7, 1)) is new
+    assert store.latest is new
+    with pytest.raises(LookupError):
+        store.at(date(2023, 12, 31))
+    ctx = PatientContext(["I63.9"])
+    assert evaluate_patient(ctx, store, TODAY, as_of=date(2024, 6, 1))[0].kind == "LHB"
+    assert evaluate_patient(ctx, store, TODAY)[0].kind == "BVB"
+    assert [v for _, v in store.versions()] == ["2024-01-01", "2025-07-01"]
+
+def test_rule_store_replaces_same_date_and_needs_a_date():
+    store = RuleStore()
+    store.add({"I63.9": row("I63.9", "LHB")})
+    replaced = store.add({"I63.9": row("I63.9", "BVB")})
+    assert len(store) == 1 and store.latest is replaced
+    with pytest.raises(ValueError):
+        store.add({"I63.9": row("I63.9", source_version="Juli")})
+
+def test_rule_store_shares_unchanged_rows():
+    store = RuleStore()
+    first = store.add({"I63.9": row("I63.9", source_version="2024-01-01")})
+    second = store.add({"I63.9": row("I63.9", source_version="2025-07-01")})
+    assert second["I63.9"].source_version == "2025-07-01"
+    assert second["I63.9"].title is first["I63.9"].title
+
+# ----------------- ResultCache -----------------
+
+def test_result_cache_key_uses_whole_months():
+    key = result_cache_key(["I63.9"], TODAY - timedelta(days=40), TODAY, "v1")
+    assert key == (("I63.9",), 1, "v1")
+    assert result_cache_key(["I63.9"], TODAY - timedelta(days=45), TODAY, "v1") == key
+    assert result_cache_key(["I63.9"], None, TODAY, "v1") == (("I63.9",), None, "v1")
+
+def test_result_cache_lru_and_generation():
+    cache = ResultCache(2)
+    key = result_cache_key(["I63.9"], None, TODAY, "v1")
+    generation = cache.generation
+    cache.put(key, "a", generation)
+    assert cache.get(key) == "a"
+    cache.put(("b",), "b")
+    cache.put(("c",), "c")
+    assert cache.get(key) is None
+    assert cache.stats()["evictions"] == 1
+    # Nach clear() (Reload) darf eine ältere Anfrage nichts mehr ablegen
+    cache.clear()
+    cache.put(key, "stale", generation)
+    assert cache.get(key) is None
+    cache.put(key, "fresh", cache.generation)
+    assert cache.get(key) == "fresh"
+
+def test_result_cache_disabled():
+    cache = ResultCache(0)
+    cache.put(("a",), 1)
+    assert cache.get(("a",)) is None
+
+# ----------------- parse_icds -----------------
+
+@pytest.mark.parametrize("text, codes, invalid", [
+    ("I63.9, G81.1", ["I63.9", "G81.1"], []),
+    ("i639", ["I63.9"], []),
+    ("I63.9G; G81.1R\nR26.2 L", ["I63.9", "G81.1", "R26.2"], []),
+    ("G35.0*  M54.5!", ["G35.0", "M54.5"], []),
+    ("I63.9 I639 i63.9", ["I63.9"], []),
+    ("Hemiparese I63.9 12345", ["I63.9"], ["HEMIPARESE", "12345"]),
+    ("", [], []),
+    (None, [], []),
+])
+def test_parse_icds_canonicalises_and_dedupes(text, codes, invalid):
+    assert parse_icds(text) == (codes, invalid)
+    assert normalize_icds(text) == codes
+
+# ----------------- SecondarySpec -----------------
+
+def test_icd_stems():
+    assert icd_stems("I63.91") == ("I63.91", "I63.9", "I63")
+    assert icd_stems("G35") == ("G35",)
+
+def test_parse_secondary_codes_stems_and_ranges():
+    spec = parse_secondary(["I69.3, I63.-", "I60-I62", "G81.0 bis G81.9"])
+    assert spec.codes == frozenset({"I69.3", "I63"})
+    assert spec.ranges == (("G81.0", "G81.9"), ("I60", "I62"))
+    assert spec.matches("I63.9", icd_stems("I63.9"))
+    assert spec.matches("I61.5", icd_stems("I61.5"))
+    assert spec.matches("G81.1", icd_stems("G81.1"))
+    assert not spec.matches("I64", icd_stems("I64"))
+    assert not spec.matches("I69.4", icd_stems("I69.4"))
+
+def test_parse_secondary_without_codes():
+    assert parse_secondary(["siehe Diagnoseliste"]) is None
+    assert parse_secondary([]) is None
+
+def test_secondary_find_skips_primary():
+    spec = parse_secondary(["I60-I69"])
+    icds = ["I63.9", "G81.1", "I69.3"]
+    assert spec.find("I63.9", icds, [icd_stems(i) for i in icds]) == "I69.3"
+
+def test_second_icd_rule(small_rules):
+    index = IcdIndex(small_rules)
+    ok, = evaluate_patient(PatientContext(["G81.1", "I61.0"]), index, TODAY)[:1]
+    assert ok.eligible and ok.secondary_icd == "I61.0"
+    missing, = evaluate_patient(PatientContext(["G81.1", "M54.5"]), index, TODAY)[:1]
+    assert not missing.eligible and missing.secondary_icd is None
+    # Hinweis ohne Codes: jeder weitere ICD zählt
+    any_second, = evaluate_patient(PatientContext(["R26.2", "M54.5"]), index, TODAY)[:1]
+    assert any_second.eligible and any_second.secondary_icd == "M54.5"
+
+def test_second_icd_from_rules_json_lists(small_rules):
+    # Hinweis ohne Codes: Zweit-ICDs aus rules.json (Stamm R26 deckt R26.2 ab)
+    index = IcdIndex(small_rules, secondary={"R26": parse_secondary(["I60-I64"])})
+    ok, = evaluate_patient(PatientContext(["R26.2", "I63.9"]), index, TODAY)[:1]
+    assert ok.eligible and ok.secondary_icd == "I63.9"
+    other, = evaluate_patient(PatientContext(["R26.2", "M54.5"]), index, TODAY)[:1]
+    assert not other.eligible
+    # Codes im Hinweis gehen vor
+    hinted, = evaluate_patient(PatientContext(["G81.1", "I69.3"]), IcdIndex(small_rules, secondary={
+        "G81": parse_secondary(["Z99"])}), TODAY)[:1]
+    assert hinted.eligible
+
+# ----------------- Suggestions -----------------
+
+def test_edit_distance_counts_swaps_once():
+    assert edit_distance("I369", "I639") == 1
+    assert edit_distance("G53", "G35") == 1
+    assert edit_distance("I639", "I639") == 0
+    assert edit_distance("I63", "I6391") == 2
+
+def test_suggest_index():
+    index = SuggestIndex(["I63.9", "I63.8", "G35.0", "G35.1", "M54.5"])
+    assert index.suggest("I36.9")[0] == "I63.9"
+    # Kurze Codes: nur ein Tippfehler; G53.0 -> G35.1 wären zwei
+    assert index.suggest("G53.0", k=2) == ["G35.0"]
+    assert set(index.suggest("G35.2", k=2)) == {"G35.0", "G35.1"}
+    assert index.suggest("Z99.9") == []
+    assert index.suggest("I63.9", accept=lambda code: code != "I63.9") == ["I63.8"]
+
+def test_suggestions_only_for_unlisted_codes(small_rules):
+    index = IcdIndex(small_rules)
+    listed, unlisted = evaluate_patient(PatientContext(["I63.9", "I36.9"]), index, TODAY)
+    assert listed.suggestions == ()
+    assert unlisted.suggestions[0] == "I63.9"
+    # NONE-Einträge werden nicht vorgeschlagen; das Ergebnis wird je Liste gemerkt
+    assert "M54.5" not in index.suggest("M45.5")
+    assert index.suggest("I36.9") is index.suggest("I36.9")
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from conftest import EXTRACTED_CSV, KBV_JSON, csv_rules
+from rules_artifact import (ARTIFACT_NAME, HEADER, ArtifactError, artifact_info, build_artifact, file_sha256,
+                            load_artifact, load_artifact_json, rules_from_csv)
+
+def test_artifact_round_trip(tmp_path):
+    out = str(tmp_path / ARTIFACT_NAME)
+    summary = build_artifact(EXTRACTED_CSV, out)
+    loaded = load_artifact(out, expected_csv_sha256=file_sha256(EXTRACTED_CSV))
+    expected = rules_from_csv(EXTRACTED_CSV)
+    assert summary["rules"] == len(expected)
+    assert list(loaded) == list(expected)
+    assert loaded == expected == csv_rules()
+
+def test_artifact_rejects_other_csv(tmp_path):
+    out = str(tmp_path / ARTIFACT_NAME)
+    build_artifact(EXTRACTED_CSV, out)
+    with pytest.raises(ArtifactError):
+        load_artifact(out, expected_csv_sha256=b"\0" * 32)
+
+def test_artifact_rejects_truncated_pool(tmp_path):
+    out = tmp_path / ARTIFACT_NAME
+    build_artifact(EXTRACTED_CSV, str(out))
+    out.write_bytes(out.read_bytes()[:-10])
+    with pytest.raises(ArtifactError):
+        load_artifact(str(out))
+
+@pytest.mark.parametrize("size", [0, 10])
+def test_artifact_rejects_empty_or_cut_file(tmp_path, size):
+    out = tmp_path / ARTIFACT_NAME
+    build_artifact(EXTRACTED_CSV, str(out))
+    out.write_bytes(out.read_bytes()[:size])
+    for load in (load_artifact, load_artifact_json, artifact_info):
+        with pytest.raises(ArtifactError):
+            load(str(out))
+
+def test_artifact_wraps_broken_pool_and_json(tmp_path):
+    out = tmp_path / ARTIFACT_NAME
+    build_artifact(EXTRACTED_CSV, str(out), str(KBV_JSON))
+    data = bytearray(out.read_bytes())
+    header = HEADER.unpack_from(data, 0)
+    pool_offset, json_offset = header[5], header[7]
+    data[pool_offset:pool_offset + 4] = b"\xff" * 4
+    data[json_offset] = ord("]")
+    out.write_bytes(bytes(data))
+    with pytest.raises(ArtifactError, match="beschädigt"):
+        load_artifact(str(out))
+    with pytest.raises(ArtifactError, match="beschädigt"):
+        load_artifact_json(str(out))
+
+def test_app_prefers_artifact_and_ignores_stale_one(app_dir, capsys):
+    import bvb_main_app
+    csv_path = app_dir / "data" / "diagnoseliste_corrected.csv"
+    build_artifact(str(csv_path), str(app_dir / "data" / ARTIFACT_NAME))
+    assert dict(bvb_main_app.load_rules()) == rules_from_csv(EXTRACTED_CSV)
+    assert bvb_main_app.rules_info["source"] == "Artefakt"
+    # CSV geändert: Artefakt veraltet, es gilt die CSV
+    csv_path.write_text(csv_path.read_text(encoding="utf-8").replace("Hirnhäute", "Hirnhäute (neu)"),
+                        encoding="utf-8")
+    rules = bvb_main_app.load_rules()
+    assert "Artefakt ignoriert" in capsys.readouterr().out
+    assert rules["C70.0"].title == "Hirnhäute (neu)"
+    assert bvb_main_app.rules_info["source"] == "CSV"
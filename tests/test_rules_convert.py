@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import shutil
+
+import pytest
+
+from conftest import EXTRACTED_CSV, KBV_JSON
+from rules_artifact import rules_from_csv
+from rules_convert import ConvertError, convert, iter_json_array, manifest_path
+
+def test_csv_json_csv_round_trip(tmp_path):
+    rules_json, back = str(tmp_path / "rules.json"), str(tmp_path / "back.csv")
+    forward = convert(EXTRACTED_CSV, rules_json)
+    assert not forward.errors
+    backward = convert(rules_json, back)
+    assert not backward.errors and not backward.warnings
+    expected = {icd: rule for icd, rule in rules_from_csv(EXTRACTED_CSV).items() if rule.eligibility != "NONE"}
+    # NONE-Zeilen gibt es in rules.json nicht; alles andere kommt unverändert zurück
+    assert forward.written == backward.written == len(expected)
+    assert len(forward.skipped) == forward.rows - len(expected)
+    assert rules_from_csv(back) == expected
+
+def test_second_run_is_unchanged_and_edit_converts_one_row(tmp_path):
+    source, rules_json = tmp_path / "liste.csv", str(tmp_path / "rules.json")
+    shutil.copy(EXTRACTED_CSV, source)
+    first = convert(str(source), rules_json)
+    assert first.converted == first.rows
+    again = convert(str(source), rules_json)
+    assert again.unchanged and again.written == first.written
+
+    lines = source.read_text(encoding="utf-8").splitlines(keepends=True)
+    lines[1] = lines[1].replace("Virusenzephalitis", "Virusenzephalitis (geändert)")
+    source.write_text("".join(lines), encoding="utf-8")
+    edited = convert(str(source), rules_json)
+    assert not edited.unchanged
+    assert (edited.converted, edited.reused) == (1, first.rows - 1)
+    with open(rules_json, encoding="utf-8") as f:
+        assert json.load(f)[0]["title"] == "Folgezustände der Virusenzephalitis (geändert)"
+
+def test_manifest_ignored_when_output_changed(tmp_path):
+    rules_json = tmp_path / "rules.json"
+    convert(EXTRACTED_CSV, str(rules_json))
+    rules_json.write_text("[]", encoding="utf-8")
+    report = convert(EXTRACTED_CSV, str(rules_json))
+    assert not report.unchanged
+    assert len(json.loads(rules_json.read_text(encoding="utf-8"))) == report.written
+    assert manifest_path(str(rules_json)).endswith(".manifest.json")
+
+def test_errors_name_row_and_field(tmp_path):
+    source = tmp_path / "liste.csv"
+    lines = open(EXTRACTED_CSV, encoding="utf-8").read().splitlines()
+    lines[1] = lines[1].replace(",BVB,", ",XYZ,", 1)
+    lines[4] = "I63.9,nur drei,Spalten"
+    source.write_text("\n".join(lines[:6]) + "\n", encoding="utf-8")
+    out = tmp_path / "rules.json"
+    report = convert(str(source), str(out))
+    assert [(p.location, p.field) for p in report.errors] == [("liste.csv:2", "eligibility"), ("liste.csv:5", "")]
+    # Bei Fehlern wird nichts geschrieben
+    assert not out.exists()
+
+def test_json_error_location(tmp_path):
+    source = tmp_path / "rules.json"
+    source.write_text('[{"id": "KBV-BVB-I63.9", "icd10_primary": ["I63.9"], "title": "x", '
+                      '"eligibility": "BVB", "kbv_version_date": "2025-07-01", "months_since_event_max": "viele"}]',
+                      encoding="utf-8")
+    report = convert(str(source), str(tmp_path / "out.csv"))
+    assert [(p.location, p.field) for p in report.errors] == [("rules.json:1 [0]", "months_since_event_max")]
+
+def test_iter_json_array_small_chunks():
+    text = '[ {"a": "x,]}"} ,\n {"b": [1, {"c": 2}]} ]'
+    items = [row for _, _, row in iter_json_array(io.StringIO(text), "t.json", chunk_size=3)]
+    assert items == [{"a": "x,]}"}, {"b": [1, {"c": 2}]}]
+
+def test_csv_output_must_be_json(tmp_path):
+    with pytest.raises(ConvertError):
+        convert(EXTRACTED_CSV, str(tmp_path / "out.csv"))
+
+def test_json_to_csv_warns_about_lost_fields(tmp_path):
+    out = tmp_path / "liste.csv"
+    report = convert(KBV_JSON, str(out))
+    assert not report.errors and report.written == 4
+    assert [(p.location, p.field) for p in report.warnings] == [
+        ("rules_kbv.json:2 [0]", "heilmittelbereich"),
+        ("rules_kbv.json:17 [1]", "age_min, age_max, heilmittelbereich"),
+        ("rules_kbv.json:32 [2]", "sex, heilmittelbereich"),
+    ]
+    rules = rules_from_csv(str(out))
+    assert list(rules) == ["G81", "F83", "N81.1", "N81.2"]
+    assert rules["G81"].second_icd_hint == "I60, I61, I63, I69.3" and rules["G81"].acute_window_months == 12
+    # Platzhalter: sonst übersprungen, mit strict ein Fehler
+    assert [p.location for p in report.skipped] == ["rules_kbv.json:48 [3]"]
+    assert [p.location for p in convert(KBV_JSON, str(tmp_path / "strict.csv"), strict=True).errors] == [
+        "rules_kbv.json:48 [3]"]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import shutil
+from datetime import timedelta
+
+import pytest
+
+from conftest import KBV_JSON, TODAY
+from rules_json import KbvRuleIndex, PatientProfile, load_rules_json, match_patient
+
+@pytest.fixture
+def kbv_index():
+    return KbvRuleIndex(load_rules_json(KBV_JSON))
+
+def _ids(result):
+    return [m.rule.id for m in result.matched]
+
+def test_index_skips_placeholders(kbv_index):
+    assert (len(kbv_index), kbv_index.skipped) == (3, 1)
+    assert kbv_index.version == "2025-07-01"
+    # Stamm G81 deckt G81.1 ab
+    assert [r.id for r in kbv_index.candidates("G81.1")] == ["KBV-BVB-ZN-G81"]
+
+def test_secondary_icd_and_event_window(kbv_index):
+    recent = TODAY - timedelta(days=60)
+    ok = match_patient(PatientProfile(["G81.1", "I63.9"], acute_event_date=recent), kbv_index, TODAY)
+    assert ok.eligible and _ids(ok) == ["KBV-BVB-ZN-G81"]
+    assert (ok.matched[0].icd, ok.matched[0].secondary_icd) == ("G81.1", "I63.9")
+
+    # Zweit-ICD nicht in der Liste der Regel
+    wrong = match_patient(PatientProfile(["G81.1", "I64"], acute_event_date=recent), kbv_index, TODAY)
+    assert not wrong.eligible and "Zweit-ICD erforderlich" in wrong.warnings[0]
+
+    # Frist: 12 Monate nach dem Akutereignis
+    edge = match_patient(PatientProfile(["G81.1", "I69.3"], acute_event_date=TODAY.replace(year=TODAY.year - 1)),
+                         kbv_index, TODAY)
+    assert edge.eligible
+    late = match_patient(PatientProfile(["G81.1", "I69.3"], acute_event_date=TODAY - timedelta(days=400)),
+                         kbv_index, TODAY)
+    assert not late.eligible and not late.missing_fields
+
+    undated = match_patient(PatientProfile(["G81.1", "I69.3"]), kbv_index, TODAY)
+    assert not undated.eligible and undated.missing_fields == ["acute_event_date"]
+
+@pytest.mark.parametrize("age, eligible, missing", [
+    (4, True, []),
+    (17, True, []),
+    (18, False, []),
+    (None, False, ["age"]),
+])
+def test_age_limits(kbv_index, age, eligible, missing):
+    result = match_patient(PatientProfile(["F83"], age=age), kbv_index, TODAY)
+    assert (result.eligible, result.missing_fields) == (eligible, missing)
+
+@pytest.mark.parametrize("sex, eligible, missing", [
+    ("w", True, []),
+    ("weiblich", True, []),
+    ("F", True, []),
+    ("m", False, []),
+    (None, False, ["sex"]),
+])
+def test_sex(kbv_index, sex, eligible, missing):
+    result = match_patient(PatientProfile(["N81.2"], sex=sex), kbv_index, TODAY)
+    assert (result.eligible, result.missing_fields) == (eligible, missing)
+
+def test_bereich_and_gruppe_filter(kbv_index):
+    profile = PatientProfile(["F83", "N81.1"], age=8, sex="w")
+    assert _ids(match_patient(profile, kbv_index, TODAY)) == ["KBV-BVB-SP-F83", "KBV-BVB-PT-N81"]
+    profile.heilmittelbereich = "pt"
+    assert _ids(match_patient(profile, kbv_index, TODAY)) == ["KBV-BVB-PT-N81"]
+    profile.diagnosegruppe = "ZN"
+    assert _ids(match_patient(profile, kbv_index, TODAY)) == []
+
+def test_empty_index_warns():
+    result = match_patient(PatientProfile(["F83"]), KbvRuleIndex([]), TODAY)
+    assert not result.eligible and result.warnings == ["rules.json enthält keine Regeln mit Primär-ICD"]
+
+# ----------------- App -----------------
+
+@pytest.fixture
+def kbv_json(app_dir):
+    # Neben der CSV gefunden, beim Laden der Liste mitgeladen
+    shutil.copy(KBV_JSON, app_dir / "data" / "rules.json")
+
+def test_check_patient(kbv_json, client):
+    body = {"patient": {"icd10_codes": ["F83"], "age": 6, "heilmittelbereich": "SP"}}
+    data = client.post("/check", json=body).json()
+    assert data["eligible"] and data["kbv_version_date"] == "2025-07-01"
+    assert [m["rule_id"] for m in data["matched"]] == ["KBV-BVB-SP-F83"]
+    missing = client.post("/check", json={"patient": {"icd10_codes": "N81.1"}}).json()
+    assert not missing["eligible"] and missing["missing_fields"] == ["sex"]
+    assert client.get("/health").json()["rules_json"]["rules"] == 3
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from conftest import row
+from bvb_search import SearchIndex, normalize, tokenize
+
+@pytest.fixture
+def index(small_rules):
+    rules = dict(small_rules)
+    rules.update({r.icd: r for r in (
+        row("G81.0", "LHB", title="Schlaffe Hemiparese und Hemiplegie"),
+        row("G80.1", "LHB", title="Spastische diplegische Zerebralparese"),
+        row("M16.1", "LHB", title="Sonstige primäre Koxarthrose (Hüftgelenk)", group="EX"),
+        row("S72.0", "BVB", title="Schenkelhalsfraktur", notes="längstens 1 Jahr nach Akutereignis"),
+    )})
+    return SearchIndex(rules, related=lambda icd: ["Schlaganfall"] if icd == "I63.9" else [])
+
+def _codes(index, query, k=10):
+    hits, total = index.search(query, k)
+    return [hit.rule.icd for hit in hits], total
+
+def test_normalize_and_tokenize():
+    assert normalize("HÜFTE Straße Ménière") == "huefte strasse meniere"
+    assert tokenize("Hirninfarkt (I63.9), 70. Lebensjahr") == ["hirninfarkt", "i63.9", "70", "lebensjahr"]
+
+@pytest.mark.parametrize("query", ["Hüft", "huef", "HÜFTGELENK"])
+def test_umlaut_spellings_find_the_same_row(index, query):
+    assert _codes(index, query) == (["M16.1"], 1)
+
+def test_code_with_and_without_dot(index):
+    assert _codes(index, "I63.9")[0] == ["I63.9"]
+    assert _codes(index, "i639")[0] == ["I63.9"]
+    assert _codes(index, "G81")[0] == ["G81.0", "G81.1"]
+
+def test_all_words_must_match_and_ranking(index):
+    assert _codes(index, "schlaff hemi") == (["G81.0"], 1)
+    assert _codes(index, "hemiparese fraktur") == ([], 0)
+    # Gleichstand nach Code
+    assert _codes(index, "spast") == (["G80.1", "G81.1"], 2)
+    # Code vor Titel vor Hinweis; exaktes Wort vor Wortanfang
+    assert index.search("I63.9", 1)[0][0].score == 8.0
+    assert index.search("hemiparese", 1)[0][0].score == 4.0
+    assert index.search("hemipar", 1)[0][0].score == 2.4
+    assert _codes(index, "akutereignis") == (["S72.0"], 1) and index.search("akutereignis", 1)[0][0].score == 1.0
+
+def test_infix_fallback_for_compounds(index):
+    assert _codes(index, "parese") == (["G80.1", "G81.0", "G81.1"], 3)
+    # Kurze Wörter nur als Wortanfang
+    assert _codes(index, "ese") == ([], 0)
+
+def test_related_texts_and_k(index):
+    assert _codes(index, "schlaganfall") == (["I63.9"], 1)
+    codes, total = _codes(index, "g", k=2)
+    assert len(codes) == 2 and total > 2
+    assert index.search("", 5) == ([], 0)
+    assert index.search("hemi", 0) == ([], 0)
+
+# ----------------- App -----------------
+
+def test_search_endpoint(client):
+    data = client.get("/search", params={"q": "Zerebralparese spast", "k": 3}).json()
+    assert data["total"] == 2 and [r["icd"] for r in data["results"]] == ["G80.0", "G80.1"]
+    assert data["source_version"] == "2025-07-01"
+    assert client.get("/search", params={"q": "x", "k": 0}).status_code == 422
+    assert client.get("/health").json()["search"]["rules"] == 130
+
+def test_search_before_rules_loaded(client, monkeypatch):
+    import bvb_main_app
+    monkeypatch.setattr(bvb_main_app, "search_index", None)
+    assert client.get("/search", params={"q": "Hirn"}).status_code == 503
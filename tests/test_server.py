@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import EXTRACTED_CSV, ROOT
+
+def test_reload_under_supervisor_only_signals(client, monkeypatch):
+    import bvb_main_app
+    sent = []
+    monkeypatch.setattr(bvb_main_app, "supervisor_pid", 4242)
+    monkeypatch.setattr(bvb_main_app.os, "kill", lambda pid, sig: sent.append((pid, sig)))
+    monkeypatch.setattr(bvb_main_app, "ADMIN_TOKEN", "geheim")
+    before = bvb_main_app.rules_dict
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "geheim"})
+    assert response.json() == {"status": "reload_requested", "rules_version": "2025-07-01"}
+    assert sent == [(4242, signal.SIGHUP)]
+    # Der Worker lädt nicht selbst; das übernimmt der Supervisor per SIGHUP an alle
+    assert bvb_main_app.rules_dict is before
+
+def test_supervisor_signals_workers_only_after_good_reload(app_dir, monkeypatch):
+    import bvb_main_app
+    import bvb_server
+    bvb_main_app.load_rules()
+    supervisor = bvb_server.Supervisor(config=None, workers=2)
+    sent = []
+    monkeypatch.setattr(supervisor, "signal_children", sent.append)
+    supervisor.reload_all()
+    assert sent == [signal.SIGHUP]
+    csv_path = app_dir / "data" / "diagnoseliste_corrected.csv"
+    csv_path.write_text(csv_path.read_text(encoding="utf-8").replace(",BVB,", ",XYZ,"), encoding="utf-8")
+    supervisor.reload_all()
+    assert sent == [signal.SIGHUP]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for(predicate, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Supervisor braucht fork")
+def test_admin_reload_loads_once_per_process(tmp_path):
+    httpx = pytest.importorskip("httpx")
+    port = _free_port()
+    log = tmp_path / "server.log"
+    env = {**os.environ, "ADMIN_TOKEN": "", "RULES_WATCH_INTERVAL": "0"}
+    with open(log, "w") as out:
+        proc = subprocess.Popen([sys.executable, "-u", "bvb_server.py", "--host", "127.0.0.1", "--port", str(port),
+                                 "--workers", "2", "--rules", EXTRACTED_CSV, "--log-level", "warning"],
+                                cwd=ROOT, env=env, stdout=out, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+
+    def healthy():
+        try:
+            return httpx.get(f"{url}/health", timeout=1).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    try:
+        assert _wait_for(healthy), log.read_text()
+        response = httpx.post(f"{url}/admin/reload", timeout=5)
+        assert response.json()["status"] == "reload_requested"
+        # Supervisor + zwei Worker, jeder genau einmal
+        assert _wait_for(lambda: log.read_text().count("neu geladen") >= 3), log.read_text()
+        time.sleep(0.5)
+        assert log.read_text().count("neu geladen") == 3
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    assert proc.returncode == 0
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+
+import pytest
+
+from conftest import ROOT
+from bvb_static import IMMUTABLE, REVALIDATE, StaticBundle, choose_encoding, make_asset, not_modified, response_parts
+
+# ----------------- bvb_static -----------------
+
+BODY = ("<p>Heilmittel</p>\n" * 50).encode("utf-8")
+
+def test_make_asset_variants_and_etags():
+    asset = make_asset(BODY, "text/html; charset=utf-8")
+    assert "identity" in asset.variants and "gzip" in asset.variants
+    assert gzip.decompress(asset.variants["gzip"][0]) == BODY
+    assert len(asset.etags) == len(asset.variants)
+    # Gleicher Inhalt, gleicher ETag (reproduzierbar über Neustarts)
+    assert make_asset(BODY, "text/html").variants == asset.variants
+    assert list(make_asset(b"kurz", "text/plain").variants) == ["identity"]
+
+def test_choose_encoding():
+    asset = make_asset(BODY, "text/html")
+    assert choose_encoding(asset, "") == "identity"
+    assert choose_encoding(asset, "gzip, deflate") == "gzip"
+    assert choose_encoding(asset, "gzip;q=0") == "identity"
+    assert choose_encoding(asset, "*") in asset.variants
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ('"anders"', False),
+])
+def test_not_modified_special_values(header, expected):
+    assert not_modified(make_asset(BODY, "text/html"), header) is expected
+
+def test_not_modified_matches_any_variant_weakly():
+    asset = make_asset(BODY, "text/html")
+    identity, gz = asset.variants["identity"][1], asset.variants["gzip"][1]
+    assert not_modified(asset, identity)
+    assert not_modified(asset, f'"anders", W/{gz}')
+
+def test_response_parts_304_keeps_validators():
+    asset = make_asset(BODY, "text/html")
+    status, body, headers = response_parts(asset, {"accept-encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip" and headers["Vary"] == "Accept-Encoding"
+    status, body, again = response_parts(asset, {"accept-encoding": "gzip", "if-none-match": headers["ETag"]})
+    assert (status, body) == (304, b"")
+    assert again["ETag"] == headers["ETag"] and "Content-Type" not in again
+
+def test_bundle_fingerprints_css_and_js():
+    bundle = StaticBundle(os.path.join(ROOT, "static"))
+    hashed = [name for name in bundle.assets if name != "index.html"]
+    assert hashed and all(bundle.get(name).cache_control == IMMUTABLE for name in hashed)
+    assert bundle.index.cache_control == REVALIDATE
+    page = bundle.index.variants["identity"][0].decode("utf-8")
+    assert all(f'"/static/{name}"' in page for name in hashed)
+
+# ----------------- App -----------------
+
+@pytest.mark.parametrize("path", ["/", "/rules"])
+def test_app_revalidates_with_etag(client, path):
+    first = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200 and first.headers["cache-control"] == REVALIDATE
+    again = client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+
+def test_app_static_assets_immutable(client):
+    page = client.get("/").text
+    name = page.split('"/static/', 1)[1].split('"', 1)[0]
+    asset = client.get(f"/static/{name}")
+    assert asset.status_code == 200 and asset.headers["cache-control"] == IMMUTABLE
+    assert client.get(f"/static/{name}", headers={"If-None-Match": asset.headers["etag"]}).status_code == 304
+    assert client.get("/static/gibtsnicht.js").status_code == 404
+
+def test_rules_etag_changes_with_list(client, app_dir):
+    import bvb_main_app
+    etag = client.get("/rules").headers["etag"]
+    assert client.get("/rules").headers["etag"] == etag
+    rules = client.get("/rules").json()
+    assert len(rules["rules"]) == len(bvb_main_app.rules_dict)
+    bvb_main_app.load_rules()
+    # Neu geladen = neue Liste; gleicher Inhalt ergibt aber denselben ETag
+    assert client.get("/rules", headers={"If-None-Match": etag}).status_code == 304
+    # Gleicher Stand, anderer Inhalt: neuer ETag
+    path = app_dir / "data" / "diagnoseliste_corrected.csv"
+    path.write_text(path.read_text(encoding="utf-8").replace("Hirnhäute", "Hirnhäute (geändert)"), encoding="utf-8")
+    bvb_main_app.load_rules()
+    changed = client.get("/rules", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+@pytest.fixture
+def versioned(app_dir):
+    # Ältere Liste in data/versions/: C70.0 dort noch LHB
+    current = (app_dir / "data" / "diagnoseliste_corrected.csv").read_text(encoding="utf-8")
+    (app_dir / "data" / "versions").mkdir()
+    old = current.replace("2025-07-01", "2024-01-01").replace("C70.0,Hirnhäute,,BVB", "C70.0,Hirnhäute,,LHB")
+    (app_dir / "data" / "versions" / "2024-01-01.csv").write_text(old, encoding="utf-8")
+    return app_dir
+
+@pytest.fixture
+def versioned_client(versioned):
+    from fastapi.testclient import TestClient
+    import bvb_main_app
+    bvb_main_app.load_rules()
+    with TestClient(bvb_main_app.app) as c:
+        yield c
+
+def test_check_as_of_picks_version(versioned_client):
+    def version(as_of):
+        body = {"icds": "C70.0", "acute_event_date": "2023-12-01"}
+        if as_of:
+            body["as_of"] = as_of
+        return versioned_client.post("/check", json=body).json()["results"][0]["source_version"]
+    assert version(None) == "2025-07-01"
+    assert version("2024-03-01") == "2024-01-01"
+    assert version("2025-07-01") == "2025-07-01"
+
+def test_check_as_of_before_first_version(versioned_client):
+    response = versioned_client.post("/check", json={"icds": "C70.0", "as_of": "2020-01-01"})
+    assert response.status_code == 422
+    assert versioned_client.post("/check", json={"icds": "C70.0", "as_of": "gestern"}).status_code == 422
+
+def test_batch_as_of_per_patient(versioned_client):
+    response = versioned_client.post("/check/batch", json={"as_of": "2024-02-01", "patients": [
+        {"id": 1, "icds": "C70.0"},
+        {"id": 2, "icds": "C70.0", "as_of": "2025-08-01"},
+    ]})
+    assert response.json()["columns"]["source_version"] == ["2024-01-01", "2025-07-01"]